@@ -4,9 +4,11 @@ parameters into instances of objects, injected to request handlers.
 """
 
 from blacksheep import FromHeader, Request
+from blacksheep.exceptions import BadRequest
 from blacksheep.server.bindings import Binder
+from pydantic import ValidationError
 
-from xcov19.domain.common import PageOptions
+from xcov19.domain.common import PageOptions, SortOrder
 
 
 class IfNoneMatchHeader(FromHeader[str | None]):
@@ -20,7 +22,8 @@ class PageOptionsBinder(Binder):
 
     - page, for page number
     - limit, for results per page
-    - continuation_id, the last numeric ID that was read
+    - continuation_id, opaque token of the last page that was read
+    - sort_order, ASC or DESC
     """
 
     handle = PageOptions
@@ -29,6 +32,7 @@ class PageOptionsBinder(Binder):
         page = request.query.get("page")
         limit = request.query.get("limit")
         continuation_id = request.query.get("continuation_id")
+        sort_order = request.query.get("sort_order")
         if page is None:
             page = 1
         else:
@@ -38,5 +42,20 @@ class PageOptionsBinder(Binder):
         else:
             limit = limit[0]
         if continuation_id is not None:
-            continuation_id = int(continuation_id[0])
-        return PageOptions(page=page, limit=limit, continuation_id=continuation_id)
+            continuation_id = continuation_id[0]
+        if sort_order is None:
+            sort_order = SortOrder.ASC
+        else:
+            try:
+                sort_order = SortOrder(sort_order[0].upper())
+            except ValueError:
+                raise BadRequest(f"Invalid sort_order: {sort_order[0]}")
+        try:
+            return PageOptions(
+                page=page,
+                limit=limit,
+                continuation_id=continuation_id,
+                sort_order=sort_order,
+            )
+        except ValidationError as error:
+            raise BadRequest(f"Invalid pagination options: {error}")
@@ -1,9 +1,11 @@
 """Controller API routes for case diagnosis."""
 
-from blacksheep import Response, FromJSON, json
+from blacksheep import Response, FromJSON, accepted
 from blacksheep.server.controllers import APIController
 from xcov19.app.controllers import post
 
+from xcov19.domain.models.patient import Patient
+from xcov19.domain.repository_interface import IPatientStore
 from xcov19.dto import DiagnosisQueryJSON
 from xcov19.app.settings import FromOriginMatchHeader
 
@@ -21,13 +23,15 @@ class DiagnosisController(APIController):
     async def diagnose(
         self,
         diagnosis_query: FromJSON[DiagnosisQueryJSON],
+        patient_store: IPatientStore,
         _from_origin_header: FromOriginMatchHeader,
     ) -> Response:
         # TODO: Impl DiagnoseService
-        # Enqueue diagnosis
         # fetch splty of diagnosis via external API
         # filter by splty the rows with query_id in aux table
         # async save this result to diagnosis table
-        # return result
-        print(diagnosis_query.value)
-        return json({"response": "ok"})
+        query = diagnosis_query.value
+        job_id = await patient_store.enqueue_diagnosis_query(
+            Patient(cust_id="", query=query.query, query_id=query.query_id.query_id)
+        )
+        return accepted({"job_id": job_id})
@@ -1,14 +1,16 @@
 """Controller API routes for geolocation."""
 
-from blacksheep import Response, ok, FromJSON
+from blacksheep import FromJSON, FromQuery, Request, Response, accepted, not_found
 from blacksheep.server.controllers import APIController
 
-from xcov19.app.controllers import post
+from xcov19.app.controllers import get, post
+from xcov19.domain.models.patient import Patient
+from xcov19.domain.repository_interface import IPatientStore
 from xcov19.dto import LocationQueryJSON
+from xcov19.app.responses import JSONResponder
+from xcov19.infra.result_store import FacilitiesResultStore
 from xcov19.app.settings import FromOriginMatchHeader
 
-from xcov19.services.geolocation import LocationQueryServiceInterface
-
 
 class GeolocationController(APIController):
     @classmethod
@@ -23,12 +25,44 @@ class GeolocationController(APIController):
     async def location_query(
         self,
         location_query: FromJSON[LocationQueryJSON],
-        geo_service: LocationQueryServiceInterface,
+        patient_store: IPatientStore,
         _from_origin_header: FromOriginMatchHeader,
     ) -> Response:
-        # TODO: Implement Geolocation application service GeoLocationService
-        # Service should Enqueue request, filter matching rows by geolocation,
-        #   store in a temp row in aux sheet/table.
-        # dummy impl
-        print(location_query.value)
-        return ok()
+        """Accepts a location query for background processing.
+
+        Workers store the query and look up facilities around the location
+        matching the query's filters.
+        Responds 202 with the job id, or 429 when the work queue is full.
+        """
+        query = location_query.value
+        job_id = await patient_store.enqueue_geolocation_query(
+            Patient(
+                cust_id=query.cust_id.cust_id,
+                query="",
+                geo_location=(query.location.lat, query.location.lng),
+                query_id=query.query_id.query_id,
+            ),
+            query.filters.model_dump(mode="json", exclude_defaults=True),
+        )
+        return accepted({"job_id": job_id})
+
+    @get("{query_id}")
+    async def location_query_results(
+        self,
+        request: Request,
+        query_id: str,
+        cust_id: FromQuery[str],
+        result_store: FacilitiesResultStore,
+        responder: JSONResponder,
+        _from_origin_header: FromOriginMatchHeader,
+    ) -> Response:
+        """Returns facilities found for a location query.
+
+        Responds 404 until workers have processed the query or once its
+        results have expired. Results are sent as stored, without being
+        parsed and serialized again.
+        """
+        results = await result_store.get_json(cust_id.value, query_id)
+        if results is None:
+            return not_found("No results yet")
+        return responder.json_bytes(request, results)
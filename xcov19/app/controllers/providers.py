@@ -0,0 +1,58 @@
+"""Controller API routes for listing providers."""
+
+from blacksheep import Request, Response
+from blacksheep.server.controllers import APIController
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.app.controllers import get
+from xcov19.app.responses import JSONResponder
+from xcov19.app.settings import FromOriginMatchHeader
+from xcov19.domain.common import PageOptions
+from xcov19.dto import ProvidersPage
+from xcov19.infra import models
+from xcov19.infra.pagination import fetch_page
+from xcov19.infra.repository import provider_result_from_row
+
+providers_page_adapter = TypeAdapter(ProvidersPage)
+
+
+class ProvidersController(APIController):
+    @classmethod
+    def route(cls) -> str | None:
+        return "providers"
+
+    @classmethod
+    def version(cls) -> str:
+        return "v1"
+
+    @get()
+    async def list_providers(
+        self,
+        request: Request,
+        options: PageOptions,
+        session_factory: async_sessionmaker[AsyncSessionWrapper],
+        responder: JSONResponder,
+        _from_origin_header: FromOriginMatchHeader,
+    ) -> Response:
+        """Lists providers by provider_id, `limit` at a time.
+
+        Pass the continuation_id of a page to get the next one.
+        """
+        async with session_factory() as session:
+            page = await fetch_page(
+                session,
+                select(models.Provider),
+                (col(models.Provider.provider_id),),
+                options,
+            )
+        return responder.json(
+            request,
+            providers_page_adapter,
+            ProvidersPage(
+                items=[provider_result_from_row(row) for row in page],
+                continuation_id=page.continuation_id,
+            ),
+        )
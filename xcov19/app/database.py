@@ -1,23 +1,27 @@
 import asyncio
 from collections.abc import AsyncGenerator
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack, asynccontextmanager
 import sys
+from typing import List
 import aiosqlite
 from rodi import Container
-from xcov19.infra.models import SQLModel
+from xcov19.infra.models import GEOPOINT_SRID, SQLModel, utc_now
 from sqlmodel import text
-from xcov19.app.settings import Settings
+from xcov19.app.settings import Database, Settings
 from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
+    AsyncConnection,
     AsyncEngine,
     async_sessionmaker,
 )
 from sqlalchemy.dialects.sqlite.aiosqlite import AsyncAdapt_aiosqlite_connection
 
 import logging
-from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from xcov19.app.metrics import InstrumentedQueuePool, instrument_engine
 
 db_logger = logging.getLogger(__name__)
 db_fmt = logging.Formatter(
@@ -29,6 +33,10 @@ stream_handler.setFormatter(db_fmt)
 db_logger.setLevel(logging.INFO)
 db_logger.addHandler(stream_handler)
 
+# (table, geometry column, geometry type) registered with SpatiaLite and indexed
+# with an R-tree named idx_<table>_<column>.
+SPATIAL_COLUMNS = (("provider", "geopoint", "POINT"),)
+
 
 class SessionFactory:
     """Class to remember sessionmaker factory constructor for DI container.
@@ -49,54 +57,220 @@ class SessionFactory:
         )
 
 
-async def _load_spatialite(dbapi_conn: AsyncAdapt_aiosqlite_connection) -> None:
+async def _load_spatialite(conn: aiosqlite.Connection) -> None:
     """Loads spatialite sqlite extension."""
-    conn: aiosqlite.Connection = dbapi_conn.driver_connection
     await conn.enable_load_extension(True)
-    await conn.load_extension("mod_spatialite")
-    db_logger.info("======= PRAGMA load_extension successful =======")
     try:
-        async with conn.execute("SELECT spatialite_version() as version") as cursor:
-            result = await cursor.fetchone()
-            db_logger.info(f"==== Spatialite Version: {result} ====")
-            db_logger.info("===== mod_spatialite loaded =====")
-    except (AttributeError, aiosqlite.OperationalError) as e:
-        db_logger.error(e)
-        raise (e)
+        await conn.load_extension("mod_spatialite")
+    finally:
+        # Extensions are loaded through the C API only, not from SQL.
+        await conn.enable_load_extension(False)
+
+
+def connection_pragmas(profile: Database) -> List[str]:
+    return [
+        f"PRAGMA journal_mode={profile.journal_mode}",
+        f"PRAGMA synchronous={profile.synchronous}",
+        # negative cache_size is in KiB rather than pages.
+        f"PRAGMA cache_size=-{profile.cache_size_kib}",
+        f"PRAGMA mmap_size={profile.mmap_size_bytes}",
+        f"PRAGMA temp_store={profile.temp_store}",
+        f"PRAGMA busy_timeout={profile.busy_timeout_ms}",
+        f"PRAGMA foreign_keys={'ON' if profile.foreign_keys else 'OFF'}",
+    ]
+
+
+def apply_connection_profile(
+    dbapi_conn: AsyncAdapt_aiosqlite_connection, profile: Database
+) -> None:
+    cursor = dbapi_conn.cursor()
+    try:
+        for pragma in connection_pragmas(profile):
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
 
+def setup_spatialite(engine: AsyncEngine, profile: Database | None = None) -> None:
+    """An event listener hook to setup spatialite using aiosqlite.
 
-def setup_spatialite(engine: AsyncEngine) -> None:
-    """An event listener hook to setup spatialite using aiosqlite."""
+    Also applies the connection profile pragmas, so every pooled connection is
+    configured the same way.
+    """
+    profile = profile or Database()
 
     @event.listens_for(engine.sync_engine, "connect")
     def load_spatialite(
         dbapi_conn: AsyncAdapt_aiosqlite_connection, _connection_record
     ):
-        loop = asyncio.get_running_loop()
-        # Schedule the coroutine in the existing event loop
-        loop.create_task(_load_spatialite(dbapi_conn))
+        # Awaited in place, so the pool hands out the connection only once the
+        # extension is loaded.
+        dbapi_conn.run_async(_load_spatialite)
+        apply_connection_profile(dbapi_conn, profile)
+
+
+async def migrate_geometry_srid(
+    conn: AsyncConnection, table: str, column: str, srid: int
+) -> None:
+    """Sets the SRID of geometries written with another one.
+
+    Databases created before geometry columns were registered hold points
+    written by GeomFromText without an SRID, which RecoverGeometryColumn
+    rejects. Their coordinates already are WGS 84 (lat, lng) pairs.
+    """
+    migrated = await conn.execute(
+        text(
+            f"UPDATE {table} SET {column} = SetSRID({column}, :srid) "
+            f"WHERE {column} IS NOT NULL AND SRID({column}) <> :srid"
+        ),
+        {"srid": srid},
+    )
+    if migrated.rowcount:
+        db_logger.info(
+            f"===== Set SRID {srid} on {migrated.rowcount} {table}.{column} rows ====="
+        )
 
 
-async def setup_database(engine: AsyncEngine) -> None:
+async def migrate_query_created_at(conn: AsyncConnection) -> None:
+    """Adds query.created_at to databases created before queries were archived.
+
+    create_all does not alter existing tables. Queries already stored are
+    stamped with the migration time, so retention counts from the upgrade.
+    Safe to run on every startup.
+    """
+    columns = await conn.execute(text("PRAGMA table_info(query)"))
+    if "created_at" not in {row[1] for row in columns}:
+        # ADD COLUMN only accepts constant defaults, not CURRENT_TIMESTAMP.
+        migrated_at = utc_now().isoformat(" ")
+        await conn.execute(
+            text(
+                "ALTER TABLE query ADD COLUMN created_at DATETIME NOT NULL "
+                f"DEFAULT '{migrated_at}'"
+            )
+        )
+        db_logger.info(f"===== Added query.created_at as of {migrated_at} =====")
+    await conn.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_query_created_at ON query (created_at)")
+    )
+
+
+async def migrate_query_foreign_key_indexes(conn: AsyncConnection) -> None:
+    """Indexes query.patient_id and query.location_id on existing databases.
+
+    Without them every orphan check and RESTRICT check of a patient or
+    location delete scans the query table. Safe to run on every startup.
+    """
+    for column in ("patient_id", "location_id"):
+        await conn.execute(
+            text(f"CREATE INDEX IF NOT EXISTS ix_query_{column} ON query ({column})")
+        )
+
+
+async def setup_provider_version(conn: AsyncConnection) -> None:
+    """Counts writes to the provider table in providerversion.
+
+    Triggers rather than ORM events, so bulk imports with Core statements from
+    other processes are counted too. Safe to run on every startup.
+    """
+    await conn.execute(
+        text("INSERT OR IGNORE INTO providerversion (id, version) VALUES (1, 0)")
+    )
+    for operation in ("INSERT", "UPDATE", "DELETE"):
+        await conn.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS provider_version_{operation.lower()} "
+                f"AFTER {operation} ON provider BEGIN "
+                "UPDATE providerversion SET version = version + 1 WHERE id = 1; END"
+            )
+        )
+
+
+async def setup_spatial_index(conn: AsyncConnection) -> None:
+    """Registers geometry columns with SpatiaLite and builds their R-tree index.
+
+    Safe to run on every startup, already registered columns are skipped.
+    """
+    has_metadata = await conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'geometry_columns'")
+    )
+    if not has_metadata.first():
+        await conn.execute(text("SELECT InitSpatialMetadata(1)"))
+    for table, column, geometry_type in SPATIAL_COLUMNS:
+        params = {"table": table, "column": column}
+        registered = await conn.execute(
+            text(
+                "SELECT 1 FROM geometry_columns "
+                "WHERE f_table_name = :table AND f_geometry_column = :column"
+            ),
+            params,
+        )
+        if registered.first():
+            continue
+        await migrate_geometry_srid(conn, table, column, GEOPOINT_SRID)
+        recovered = await conn.execute(
+            text("SELECT RecoverGeometryColumn(:table, :column, :srid, :type, 'XY')"),
+            params | {"srid": GEOPOINT_SRID, "type": geometry_type},
+        )
+        if recovered.scalar() != 1:
+            raise RuntimeError(
+                f"Failed to register {table}.{column} with SpatiaLite, every value "
+                f"must be an XY {geometry_type} with SRID {GEOPOINT_SRID}. "
+                f"Fix or delete the rows where GeometryType({column}) differs."
+            )
+        indexed = await conn.execute(
+            text("SELECT CreateSpatialIndex(:table, :column)"), params
+        )
+        if indexed.scalar() != 1:
+            raise RuntimeError(f"Failed to set up spatial index on {table}.{column}")
+        db_logger.info(f"===== Spatial index created on {table}.{column} =====")
+
+
+async def setup_database(engine: AsyncEngine, profile: Database | None = None) -> None:
     """Sets up tables for database."""
 
-    setup_spatialite(engine)
+    setup_spatialite(engine, profile)
     async with engine.begin() as conn:
-        # Enable extension loading
-        await conn.execute(text("PRAGMA load_extension = 1"))
-        # db_logger.info("SQLAlchemy setup to load the SpatiaLite extension.")
-        # await conn.execute(text("SELECT load_extension('/opt/homebrew/Cellar/libspatialite/5.1.0_1/lib/mod_spatialite.dylib')"))
-        # await conn.execute(text("SELECT load_extension('mod_spatialite')"))
-        # see: https://sqlmodel.tiangolo.com/tutorial/relationship-attributes/cascade-delete-relationships/#enable-foreign-key-support-in-sqlite
-        await conn.execute(text("PRAGMA foreign_keys=ON"))
-        # test_result = await conn.execute(text("SELECT spatialite_version() as version;"))
-        # print(f"==== Spatialite Version: {test_result.fetchone()} ====")
-
+        # SpatiaLite and PRAGMA foreign_keys are set up on every connection by
+        # setup_spatialite.
+        version = await conn.execute(text("SELECT spatialite_version()"))
+        db_logger.info(f"==== Spatialite Version: {version.scalar()} ====")
         await conn.run_sync(SQLModel.metadata.create_all)
+        await migrate_query_created_at(conn)
+        await migrate_query_foreign_key_indexes(conn)
+        await setup_provider_version(conn)
+        await setup_spatial_index(conn)
         await conn.commit()
         db_logger.info("===== Database tables setup. =====")
 
 
+def in_memory_database(db_engine_url: str) -> bool:
+    """Whether the URL names an in-memory SQLite database.
+
+    Every connection to one opens a new, empty database, so they are served
+    from a single StaticPool connection and never prefilled.
+    """
+    url = make_url(db_engine_url)
+    database = url.database or ""
+    return (
+        database in ("", ":memory:")
+        or database.startswith("file::memory:")
+        or url.query.get("mode") == "memory"
+    )
+
+
+async def prefill_pool(engine: AsyncEngine, size: int) -> None:
+    """Opens size pooled connections up front.
+
+    Connection setup, including loading SpatiaLite, then happens at startup
+    instead of on the first requests of a traffic burst.
+    """
+    async with AsyncExitStack() as stack:
+        await asyncio.gather(
+            *(stack.enter_async_context(engine.connect()) for _ in range(size))
+        )
+    db_logger.info(f"===== Connection pool prefilled with {size} connections. =====")
+
+
 @asynccontextmanager
 async def start_db_session(
     container: Container,
@@ -116,9 +290,24 @@ def configure_database_session(container: Container, settings: Settings) -> Cont
     db_logger.info(f"""====== Configuring database session. ======
                    DB_ENGINE_URL: {settings.db_engine_url}
                    """)
-    engine = create_async_engine(
-        settings.db_engine_url, echo=True, poolclass=AsyncAdaptedQueuePool
-    )
+    profile = settings.database
+    if in_memory_database(settings.db_engine_url):
+        engine = create_async_engine(
+            settings.db_engine_url, echo=profile.echo, poolclass=StaticPool
+        )
+    else:
+        engine = create_async_engine(
+            settings.db_engine_url,
+            echo=profile.echo,
+            poolclass=InstrumentedQueuePool
+            if settings.metrics.enabled
+            else AsyncAdaptedQueuePool,
+            pool_size=profile.pool_size,
+            max_overflow=profile.max_overflow,
+            pool_timeout=profile.pool_timeout_seconds,
+        )
+    if settings.metrics.enabled:
+        instrument_engine(engine)
     container.add_instance(engine, AsyncEngine)
 
     # add sessionmaker
@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Dict, Type
 
 from blacksheep import Request, Response
 from blacksheep.server import Application
@@ -11,6 +11,33 @@ from essentials.exceptions import (
     UnauthorizedException,
 )
 
+from xcov19.infra.pagination import InvalidContinuationToken
+from xcov19.utils.executor import ExecutorSaturatedError, LookupTimeoutError
+from xcov19.utils.work_queue import QueueFullError
+
+
+# Status of the response each handled exception is turned into, see
+# configure_error_handlers. Request metrics label failed requests with it.
+EXCEPTION_STATUSES: Dict[Type[Exception], int] = {
+    ObjectNotFound: 404,
+    NotImplementedException: 500,
+    UnauthorizedException: 401,
+    ForbiddenException: 403,
+    AcceptedException: 202,
+    InvalidContinuationToken: 400,
+    QueueFullError: 429,
+    ExecutorSaturatedError: 503,
+    LookupTimeoutError: 504,
+}
+
+
+def exception_status(exception: Exception) -> int:
+    """Status an exception is answered with, 500 when it is not handled."""
+    for exception_type in type(exception).__mro__:
+        if exception_type in EXCEPTION_STATUSES:
+            return EXCEPTION_STATUSES[exception_type]
+    return 500
+
 
 def configure_error_handlers(app: Application) -> None:
     async def not_found_handler(
@@ -30,6 +57,22 @@ def configure_error_handlers(app: Application) -> None:
     async def accepted(*args: Any) -> Response:
         return text("Accepted", status=202)
 
+    async def bad_request(
+        app: Application, request: Request, exception: Exception
+    ) -> Response:
+        return text(str(exception) or "Bad request", 400)
+
+    async def too_many_requests(*args: Any) -> Response:
+        response = text("Too many requests", status=429)
+        response.add_header(b"Retry-After", b"1")
+        return response
+
+    async def service_unavailable(*args: Any) -> Response:
+        return text("Service unavailable", status=503)
+
+    async def gateway_timeout(*args: Any) -> Response:
+        return text("Upstream lookup timed out", status=504)
+
     app.exceptions_handlers.update(
         {
             ObjectNotFound: not_found_handler,
@@ -37,5 +80,9 @@ def configure_error_handlers(app: Application) -> None:
             UnauthorizedException: unauthorized,
             ForbiddenException: forbidden,
             AcceptedException: accepted,
+            InvalidContinuationToken: bad_request,
+            QueueFullError: too_many_requests,
+            ExecutorSaturatedError: service_unavailable,
+            LookupTimeoutError: gateway_timeout,
         }
     )
@@ -7,15 +7,37 @@ from rodi import Container, ContainerProtocol
 
 from xcov19.app.database import (
     configure_database_session,
+    in_memory_database,
+    prefill_pool,
     setup_database,
 )
+from xcov19.app import binders  # noqa: F401 registers request binders
 from xcov19.app.auth import configure_authentication
 from xcov19.app.controllers import controller_router
 from xcov19.app.docs import configure_docs
 from xcov19.app.errors import configure_error_handlers
+from xcov19.app.metrics import configure_metrics, register_component_metrics
 from xcov19.app.middleware import origin_header_middleware, configure_middleware
+from xcov19.app.profiling import configure_profiling
 from xcov19.app.services import configure_services
 from xcov19.app.settings import load_settings, Settings
+from xcov19.app.workers import (
+    start_orphan_sweeper,
+    start_provider_snapshot,
+    start_query_retention,
+    start_result_store,
+    start_work_queue,
+    start_write_buffer,
+)
+from xcov19.infra.orphan_sweeper import OrphanSweeper
+from xcov19.infra.query_archive import QueryRetention
+from xcov19.infra.repository import InMemoryProviderRepo, untrack_provider_changes
+from xcov19.infra.result_store import FacilitiesResultStore
+from xcov19.infra.snapshot_reloader import SnapshotReloader
+from xcov19.infra.write_buffer import WriteBehindBuffer
+from xcov19.utils.executor import BoundedExecutor
+from xcov19.utils.profiling import RequestProfiler
+from xcov19.utils.work_queue import WorkQueue
 
 from sqlalchemy.ext.asyncio import AsyncEngine
 
@@ -32,7 +54,9 @@ def configure_application(
     configure_error_handlers(app)
     configure_authentication(app, settings)
     configure_middleware(app, origin_header_middleware)
+    configure_profiling(app, settings)
     configure_docs(app, settings)
+    configure_metrics(app, settings)
     configure_database_session(services, settings)
     return app
 
@@ -46,4 +70,31 @@ async def on_start():
     if not isinstance(container, Container):
         raise ValueError("Container is not a valid container")
     engine = container.resolve(AsyncEngine)
-    await setup_database(engine)
+    settings = container.resolve(Settings)
+    await setup_database(engine, settings.database)
+    if settings.database.pool_prefill and not in_memory_database(
+        settings.db_engine_url
+    ):
+        await prefill_pool(engine, settings.database.pool_size)
+    await start_provider_snapshot(container, settings)
+    await start_result_store(container, settings)
+    await start_write_buffer(container, settings)
+    await start_orphan_sweeper(container, settings)
+    await start_query_retention(container, settings)
+    await start_work_queue(container)
+    register_component_metrics(container)
+
+
+@app.on_stop
+async def on_stop():
+    await app.services.resolve(SnapshotReloader).stop()
+    untrack_provider_changes(app.services.resolve(InMemoryProviderRepo))
+    await app.services.resolve(QueryRetention).stop()
+    await app.services.resolve(OrphanSweeper).stop()
+    await app.services.resolve(WorkQueue).stop(drain=True)
+    # Workers are done, commit whatever they left in the buffer.
+    await app.services.resolve(WriteBehindBuffer).stop()
+    await app.services.resolve(FacilitiesResultStore).stop()
+    app.services.resolve(BoundedExecutor).shutdown(wait=False)
+    if RequestProfiler in app.services:
+        await app.services.resolve(RequestProfiler).drain()
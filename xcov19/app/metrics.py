@@ -0,0 +1,216 @@
+"""
+Application metrics, served in the Prometheus text format on settings.metrics.path:
+
+- request latency per controller route, method and status
+- latency per stage of geolocation queries, see xcov19.services.geolocation
+- database pool checkout wait and statement duration
+- work queue depth, buffered writes and cache hit ratios, read when scraped
+
+The endpoint sits behind the origin header middleware like every other route,
+so scrapers have to send the header.
+"""
+
+import time
+from typing import Awaitable, Callable, Dict
+
+from blacksheep import Application, Content, Request, Response
+from blacksheep.exceptions import HTTPException
+from rodi import Container
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from xcov19.app.errors import exception_status
+from xcov19.app.settings import Settings
+from xcov19.infra.location_cache import LocationCache
+from xcov19.infra.result_store import FacilitiesResultStore
+from xcov19.infra.write_buffer import WriteBehindBuffer
+from xcov19.services.geocoding import CachedReverseGeocoder
+from xcov19.utils.executor import BoundedExecutor
+from xcov19.utils.single_flight import SingleFlight
+from xcov19.utils.metrics import (
+    CONTENT_TYPE,
+    CallbackMetric,
+    LabelValues,
+    registry,
+)
+from xcov19.utils.work_queue import WorkQueue
+
+type Handler = Callable[[Request], Awaitable[Response]]
+
+REQUEST_SECONDS = registry.histogram(
+    "xcov19_http_request_seconds",
+    "Seconds to handle requests, per route, method and status.",
+    ["method", "route", "status"],
+)
+POOL_CHECKOUT_SECONDS = registry.histogram(
+    "xcov19_db_pool_checkout_seconds",
+    "Seconds waited for a connection from the database pool.",
+).labels()
+QUERY_SECONDS = registry.histogram(
+    "xcov19_db_query_seconds",
+    "Seconds to execute database statements, per statement kind.",
+    ["operation"],
+)
+QUERY_OPERATIONS = frozenset(["SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "PRAGMA"])
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool timing how long checkouts wait for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Times every statement the engine executes."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def start_query_timer(conn, _cursor, _statement, _parameters, _context, _many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def observe_query_time(conn, _cursor, statement, _parameters, _context, _many):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+        if operation not in QUERY_OPERATIONS:
+            operation = "OTHER"
+        QUERY_SECONDS.labels(operation).observe(elapsed)
+
+
+def timed_handler(handler: Handler, method: str, route: str) -> Handler:
+    async def timed(request: Request) -> Response:
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status if response else 204
+            return response
+        except HTTPException as error:
+            status = error.status
+            raise
+        except Exception as error:
+            # Answered by the application's exception handlers.
+            status = exception_status(error)
+            raise
+        finally:
+            REQUEST_SECONDS.labels(method, route, str(status)).observe(
+                time.perf_counter() - start
+            )
+
+    return timed
+
+
+def instrument_routes(app: Application) -> None:
+    """Wraps every route handler, middlewares included, in a request timer.
+
+    Runs once routes and middlewares are set up, so requests are labelled by
+    their route pattern without matching them again.
+    """
+    for method, routes in app.router.routes.items():
+        for route in routes:
+            route.handler = timed_handler(
+                route.handler, method.decode(), route.pattern.decode()
+            )
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(200, content=Content(CONTENT_TYPE, registry.render().encode()))
+
+
+def configure_metrics(app: Application, settings: Settings) -> None:
+    if not settings.metrics.enabled:
+        return
+    app.router.add_get(settings.metrics.path, metrics_endpoint)
+
+    @app.after_start
+    async def instrument(application: Application) -> None:
+        instrument_routes(application)
+
+
+def register_component_metrics(container: Container) -> None:
+    """Exports the statistics the application's components keep.
+
+    Run once they are all started.
+    """
+    work_queue = container.resolve(WorkQueue)
+    lookup_executor = container.resolve(BoundedExecutor)
+    write_buffer = container.resolve(WriteBehindBuffer)
+    result_store = container.resolve(FacilitiesResultStore)
+    geocoder = container.resolve(CachedReverseGeocoder)
+    locations = container.resolve(LocationCache)
+    coalescer = container.resolve(SingleFlight) if SingleFlight in container else None
+
+    def cache_lookups() -> Dict[str, tuple[int, int]]:
+        lookups = {
+            "result_store": (result_store.hits, result_store.misses),
+            "geocoder": (geocoder.cache.hits, geocoder.cache.misses),
+            "location": (locations.hits, locations.misses),
+        }
+        if coalescer is not None:
+            # A deduplicated call is answered from another caller's lookup.
+            lookups["coalescer"] = (coalescer.deduplicated, coalescer.executions)
+        return lookups
+
+    def per_cache(read: Callable[[int, int], float]) -> Dict[LabelValues, float]:
+        return {
+            (cache,): read(hits, misses)
+            for cache, (hits, misses) in cache_lookups().items()
+        }
+
+    for metric in (
+        CallbackMetric(
+            "xcov19_work_queue_depth",
+            "Jobs waiting in the work queue.",
+            lambda: work_queue.depth,
+        ),
+        CallbackMetric(
+            "xcov19_work_queue_processed",
+            "Jobs processed by the work queue.",
+            lambda: work_queue.processed,
+            kind="counter",
+        ),
+        CallbackMetric(
+            "xcov19_lookup_executor_in_flight",
+            "Lookups running or queued on the lookup executor.",
+            lambda: lookup_executor.in_flight,
+        ),
+        CallbackMetric(
+            "xcov19_write_buffer_pending_rows",
+            "Patients waiting for the next write buffer transaction.",
+            lambda: len(write_buffer),
+        ),
+        CallbackMetric(
+            "xcov19_write_buffer_transactions",
+            "Transactions committed by the write buffer.",
+            lambda: write_buffer.transactions,
+            kind="counter",
+        ),
+        CallbackMetric(
+            "xcov19_cache_hits",
+            "Lookups answered by a cache.",
+            lambda: per_cache(lambda hits, _: hits),
+            ["cache"],
+            kind="counter",
+        ),
+        CallbackMetric(
+            "xcov19_cache_misses",
+            "Lookups a cache could not answer.",
+            lambda: per_cache(lambda _, misses: misses),
+            ["cache"],
+            kind="counter",
+        ),
+        CallbackMetric(
+            "xcov19_cache_hit_ratio",
+            "Share of lookups answered by a cache.",
+            lambda: per_cache(
+                lambda hits, misses: hits / (hits + misses) if hits + misses else 0.0
+            ),
+            ["cache"],
+        ),
+    ):
+        registry.register(metric)
@@ -1,8 +1,11 @@
+import hmac
+import time
 from typing import Callable, Awaitable
 
 from blacksheep import Application, Request, Response, bad_request
 
 from xcov19.app.settings import FromOriginMatchHeader
+from xcov19.utils.profiling import RequestProfiler
 
 
 def configure_middleware(app: Application, *middlewares):
@@ -21,3 +24,44 @@ async def origin_header_middleware(
             return await handler(request)
         case _:
             return bad_request("Invalid origin match header value provided.")
+
+
+def profiling_middleware(
+    profiler: RequestProfiler, header: str, header_token: str | None = None
+):
+    """Profiles sampled requests and requests sending header_token in header.
+
+    Without a header_token the header is ignored, so clients cannot start the
+    profiler. Only added when profiling is enabled, see configure_profiling.
+    """
+    header_name = header.encode()
+    token = header_token.encode() if header_token else None
+
+    def requested(request: Request) -> bool:
+        if token is None or (value := request.headers.get_first(header_name)) is None:
+            return False
+        return hmac.compare_digest(value, token)
+
+    async def middleware(
+        request: Request, handler: Callable[[Request], Awaitable[Response]]
+    ) -> Response:
+        if not (requested(request) or profiler.sampled()):
+            return await handler(request)
+        if (profile := profiler.start()) is None:
+            return await handler(request)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status if response else 204
+            return response
+        finally:
+            profiler.finish(
+                profile,
+                request.method,
+                request.path,
+                status,
+                time.perf_counter() - start,
+            )
+
+    return middleware
@@ -0,0 +1,55 @@
+"""
+Opt-in request profiling, see xcov19.utils.profiling.
+
+When settings.profiling is enabled, the profiling middleware runs after the
+origin header check and the slowest captured requests are listed on
+settings.profiling.admin_path. Clients can only ask for a profile with the
+profiling header when settings.profiling.header_token is set and sent. When it is not, neither is installed and
+requests take no extra step.
+"""
+
+import dataclasses
+
+from blacksheep import Application, Request, Response, bad_request, json
+
+from xcov19.app.middleware import profiling_middleware
+from xcov19.app.settings import Settings
+from xcov19.utils.profiling import RequestProfiler
+
+
+def profiles_endpoint(profiler: RequestProfiler):
+    async def slowest_profiles(request: Request) -> Response:
+        """Lists the slowest captured requests, slowest first."""
+        limit = request.query.get("limit", [""])[0]
+        if limit and not (limit.isascii() and limit.isdigit()):
+            return bad_request("limit must be a non-negative integer.")
+        return json(
+            {
+                "output_dir": str(profiler.output_dir),
+                "captured": profiler.captured,
+                "skipped": profiler.skipped,
+                "profiles": [
+                    dataclasses.asdict(record)
+                    for record in profiler.slowest(int(limit) if limit else None)
+                ],
+            }
+        )
+
+    return slowest_profiles
+
+
+def configure_profiling(app: Application, settings: Settings) -> None:
+    profiling = settings.profiling
+    if not profiling.enabled:
+        return
+    profiler = RequestProfiler(
+        profiling.output_dir,
+        output_format=profiling.output_format,
+        sample_rate=profiling.sample_rate,
+        keep=profiling.keep,
+    )
+    app.middlewares.append(
+        profiling_middleware(profiler, profiling.header, profiling.header_token)
+    )
+    app.router.add_get(profiling.admin_path, profiles_endpoint(profiler))
+    app.services.add_instance(profiler, RequestProfiler)  # type: ignore[attr-defined]
@@ -0,0 +1,70 @@
+"""
+JSON responses serialized by compiled pydantic serializers.
+
+Response models go straight to JSON bytes through their TypeAdapter's
+dump_json, without building intermediate dicts for the generic json()
+helper. Bodies of at least min_bytes are gzip compressed when the client
+accepts it.
+"""
+
+import gzip
+from typing import Dict, List, Tuple
+
+from blacksheep import Content, Request, Response
+from pydantic import TypeAdapter
+
+JSON_CONTENT_TYPE = b"application/json"
+VARY_HEADER = (b"Vary", b"Accept-Encoding")
+
+
+def accepted_encodings(accept_encoding: bytes | None) -> Dict[str, float]:
+    """Content codings of an Accept-Encoding header with their q values."""
+    encodings: Dict[str, float] = {}
+    if not accept_encoding:
+        return encodings
+    for part in accept_encoding.decode("latin-1").split(","):
+        name, _, params = part.partition(";")
+        if not (name := name.strip().lower()):
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[name] = quality
+    return encodings
+
+
+class JSONResponder:
+    """Builds JSON responses, gzipped when the request's Accept-Encoding allows."""
+
+    def __init__(
+        self,
+        min_bytes: int = 1024,
+        gzip_level: int = 5,
+    ) -> None:
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+
+    def accepts_gzip(self, request: Request) -> bool:
+        """Whether the request's Accept-Encoding allows gzip."""
+        accepted = accepted_encodings(request.headers.get_first(b"Accept-Encoding"))
+        return accepted.get("gzip", accepted.get("*", 0.0)) > 0
+
+    def compress(self, body: bytes) -> bytes:
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    def json[T](
+        self, request: Request, adapter: TypeAdapter[T], value: T, status: int = 200
+    ) -> Response:
+        return self.json_bytes(request, adapter.dump_json(value), status)
+
+    def json_bytes(self, request: Request, body: bytes, status: int = 200) -> Response:
+        """Responds with an already serialized JSON body."""
+        headers: List[Tuple[bytes, bytes]] = [VARY_HEADER]
+        if len(body) >= self.min_bytes and self.accepts_gzip(request):
+            body = self.compress(body)
+            headers.append((b"Content-Encoding", b"gzip"))
+        return Response(status, headers, Content(JSON_CONTENT_TYPE, body))
@@ -10,22 +10,119 @@ For more information and documentation, see `rodi` Wiki and examples:
 
 from __future__ import annotations
 
+import logging
 from typing import Tuple
 
 from rodi import Container
 
 
+from xcov19.app.responses import JSONResponder
 from xcov19.app.settings import Settings
+from xcov19.domain.repository_interface import IPatientStore
+from xcov19.infra.gazetteer import OfflineGazetteer
+from xcov19.infra.location_cache import LocationCache
+from xcov19.infra.journal import SqliteJobJournal
+from xcov19.infra.patient_store import queued_patient_store
+from xcov19.infra.repository import InMemoryProviderRepo
+from xcov19.services.geocoding import CachedReverseGeocoder
 from xcov19.services.geolocation import (
     LocationQueryServiceInterface,
-    GeolocationQueryService,
+    geolocation_service,
 )
+from xcov19.utils.executor import BoundedExecutor
+from xcov19.utils.single_flight import SingleFlight
+from xcov19.utils.work_queue import WorkQueue
+
+services_logger = logging.getLogger(__name__)
+
+
+def configure_geocoder(settings: Settings) -> CachedReverseGeocoder:
+    geocoder = settings.geocoder
+    if geocoder.gazetteer_path:
+        gazetteer = OfflineGazetteer.from_csv(
+            geocoder.gazetteer_path, max_distance_km=geocoder.max_distance_km
+        )
+    else:
+        services_logger.warning(
+            "No gazetteer_path is set, every location resolves to an empty address."
+        )
+        gazetteer = OfflineGazetteer([])
+    return CachedReverseGeocoder(
+        gazetteer,
+        cache_size=geocoder.cache_size,
+        ttl_seconds=geocoder.ttl_seconds,
+        cell_precision=geocoder.cell_precision,
+        batch_window_ms=geocoder.batch_window_ms,
+        max_batch_size=geocoder.max_batch_size,
+    )
+
+
+def configure_lookup_executor(settings: Settings) -> BoundedExecutor:
+    lookup_executor = settings.lookup_executor
+    return BoundedExecutor(
+        kind=lookup_executor.kind,
+        max_workers=lookup_executor.max_workers,
+        queue_depth=lookup_executor.queue_depth,
+        timeout_seconds=lookup_executor.timeout_seconds,
+    )
+
+
+def configure_work_queue(settings: Settings) -> WorkQueue:
+    """The work queue, its handlers are added once it starts, see start_work_queue."""
+    work_queue = settings.work_queue
+    return WorkQueue(
+        {},
+        workers=work_queue.workers,
+        capacity=work_queue.capacity,
+        batch_size=work_queue.batch_size,
+        batch_wait_ms=work_queue.batch_wait_ms,
+        max_attempts=work_queue.max_attempts,
+        retry_delay_seconds=work_queue.retry_delay_seconds,
+        journal=(
+            SqliteJobJournal(work_queue.journal_path)
+            if work_queue.journal_path
+            else None
+        ),
+    )
 
 
 def configure_services(settings: Settings) -> Tuple[Container, Settings]:
     container = Container()
 
     container.add_instance(settings)
-    container.add_singleton(LocationQueryServiceInterface, GeolocationQueryService)
+    lookup_executor = configure_lookup_executor(settings)
+    container.add_instance(lookup_executor, BoundedExecutor)
+    coalescer: SingleFlight | None = None
+    if settings.coalescing.enabled:
+        coalescer = SingleFlight()
+        container.add_instance(coalescer, SingleFlight)
+    container.add_singleton(
+        LocationQueryServiceInterface,
+        geolocation_service(
+            lookup_executor, coalescer, settings.coalescing.cell_precision
+        ),
+    )
+    work_queue = configure_work_queue(settings)
+    container.add_instance(work_queue, WorkQueue)
+    container.add_singleton(IPatientStore, queued_patient_store(work_queue))
+
+    container.add_instance(InMemoryProviderRepo(), InMemoryProviderRepo)
+
+    container.add_instance(configure_geocoder(settings), CachedReverseGeocoder)
+    container.add_instance(
+        JSONResponder(
+            min_bytes=settings.compression.min_bytes,
+            gzip_level=settings.compression.gzip_level,
+        ),
+        JSONResponder,
+    )
+    container.add_instance(
+        LocationCache(
+            settings.locations.snap,
+            settings.locations.precision,
+            settings.locations.cache_size,
+        ),
+        LocationCache,
+    )
 
     return container, settings
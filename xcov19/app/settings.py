@@ -7,7 +7,7 @@ values.
 https://docs.pydantic.dev/latest/usage/settings/
 """
 
-from typing import Annotated
+from typing import Annotated, Literal
 from blacksheep import FromHeader
 from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -26,6 +26,145 @@ class Site(BaseModel):
     copyright: str = "Example"
 
 
+class Metrics(BaseModel):
+    # serves Prometheus metrics on path and times requests and statements.
+    enabled: bool = True
+    path: str = "/metrics"
+
+
+class Profiling(BaseModel):
+    # profiles a sample_rate share of requests, and requests sending
+    # header_token in header, keeping the `keep` slowest in output_dir. Off
+    # unless enabled; the header is ignored unless header_token is set.
+    enabled: bool = False
+    sample_rate: float = 0.0
+    header: str = "X-Profile"
+    header_token: str | None = None
+    output_dir: str = "profiles"
+    output_format: Literal["pstats", "collapsed"] = "pstats"
+    keep: int = 50
+    admin_path: str = "/admin/profiles"
+
+
+class Compression(BaseModel):
+    # JSON bodies of at least min_bytes are gzip compressed, as the
+    # client's Accept-Encoding allows.
+    min_bytes: int = 1024
+    gzip_level: int = 5
+
+
+class Database(BaseModel):
+    """SQLite connection profile, applied to every pooled connection."""
+
+    echo: bool = False
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout_seconds: float = 30.0
+    # opens pool_size connections at startup. In-memory databases use a
+    # single shared connection and are never prefilled.
+    pool_prefill: bool = True
+    # WAL lets readers proceed while a writer commits.
+    journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "MEMORY"] = "WAL"
+    # NORMAL only syncs at WAL checkpoints; safe against corruption with WAL.
+    synchronous: Literal["OFF", "NORMAL", "FULL"] = "NORMAL"
+    cache_size_kib: int = 64 * 1024
+    mmap_size_bytes: int = 256 * 1024 * 1024
+    temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    # how long a connection waits on a locked database before failing.
+    busy_timeout_ms: int = 5_000
+    foreign_keys: bool = True
+
+
+class Geocoder(BaseModel):
+    # CSV of reference places for offline reverse geocoding, see
+    # xcov19.infra.gazetteer. Without one every location resolves to an empty
+    # address.
+    gazetteer_path: str | None = None
+    max_distance_km: float = 25.0
+    cache_size: int = 100_000
+    ttl_seconds: float | None = 24 * 60 * 60
+    # decimal places of lat/lng sharing a cached address, 3 is roughly 100m.
+    cell_precision: int = 3
+    batch_window_ms: float = 5.0
+    max_batch_size: int = 64
+
+
+class LookupExecutor(BaseModel):
+    # thread pool running sync lookup services. The facilities lookup reads the
+    # in-process provider snapshot, so it cannot run on a process pool.
+    kind: Literal["thread"] = "thread"
+    max_workers: int = 4
+    # calls waiting for a worker before new ones are rejected with 503.
+    queue_depth: int = 64
+    timeout_seconds: float | None = 5.0
+
+
+class Coalescing(BaseModel):
+    # share one facilities lookup among concurrent queries from the same cell.
+    enabled: bool = True
+    # decimal places of lat/lng sharing a lookup, 3 is roughly 100m.
+    cell_precision: int = 3
+
+
+class WorkQueue(BaseModel):
+    workers: int = 4
+    # accepted jobs waiting for a worker before new ones are rejected with 429.
+    capacity: int = 10_000
+    batch_size: int = 64
+    batch_wait_ms: float = 5.0
+    max_attempts: int = 5
+    retry_delay_seconds: float = 1.0
+    # SQLite file journaling accepted jobs until processed, off when unset.
+    journal_path: str | None = None
+
+
+class Locations(BaseModel):
+    # patient coordinates are stored snapped to `precision` decimal places, or
+    # the centre of the geohash cell of `precision` characters.
+    snap: Literal["decimal", "geohash", "off"] = "decimal"
+    precision: int = 4
+    # snapped points whose location id is kept in memory.
+    cache_size: int = 100_000
+
+
+class WriteBuffer(BaseModel):
+    # Patient, Location and Query rows are committed together every
+    # flush_interval_ms, or once max_rows patients are waiting.
+    flush_interval_ms: float = 10.0
+    max_rows: int = 500
+
+
+class ProviderSnapshot(BaseModel):
+    # how often the provider table is checked for writes from other processes,
+    # such as bulk imports, and the in-memory snapshot rebuilt.
+    reload_interval_seconds: float = 30.0
+
+
+class OrphanSweep(BaseModel):
+    # how often patients and locations no query references are deleted, and
+    # how many rows each delete statement removes at most.
+    interval_seconds: float = 10 * 60
+    chunk_size: int = 1_000
+
+
+class QueryRetention(BaseModel):
+    # queries older than retention_days are moved to per-month archives in
+    # archive_dir, and kept in the database while it is not set.
+    archive_dir: str | None = None
+    archive_format: Literal["sqlite", "jsonl"] = "sqlite"
+    retention_days: float = 90
+    interval_seconds: float = 60 * 60
+    chunk_size: int = 1_000
+
+
+class ResultCache(BaseModel):
+    # facilities results of recent queries kept in memory.
+    cache_size: int = 10_000
+    ttl_seconds: float = 60 * 60
+    # how often expired results are deleted from the database.
+    eviction_interval_seconds: float = 5 * 60
+
+
 class Settings(BaseSettings):
     db_engine_url: Annotated[str, "database connection string"] = Field(default=...)
 
@@ -37,6 +176,62 @@ class Settings(BaseSettings):
     # export app_app='{"show_error_details": True}'
     app: App = App()
 
+    # to override metrics:
+    # export app_metrics='{"enabled": false}'
+    metrics: Metrics = Metrics()
+
+    # to override profiling:
+    # export app_profiling='{"enabled": true, "sample_rate": 0.01}'
+    profiling: Profiling = Profiling()
+
+    # to override compression:
+    # export app_compression='{"min_bytes": 4096}'
+    compression: Compression = Compression()
+
+    # to override database:
+    # export app_database='{"pool_size": 10, "synchronous": "FULL"}'
+    database: Database = Database()
+
+    # to override geocoder:
+    # export app_geocoder='{"gazetteer_path": "places.csv"}'
+    geocoder: Geocoder = Geocoder()
+
+    # to override lookup_executor:
+    # export app_lookup_executor='{"max_workers": 8}'
+    lookup_executor: LookupExecutor = LookupExecutor()
+
+    # to override coalescing:
+    # export app_coalescing='{"cell_precision": 2}'
+    coalescing: Coalescing = Coalescing()
+
+    # to override work_queue:
+    # export app_work_queue='{"journal_path": "xcov19_jobs.db"}'
+    work_queue: WorkQueue = WorkQueue()
+
+    # to override locations:
+    # export app_locations='{"snap": "geohash", "precision": 8}'
+    locations: Locations = Locations()
+
+    # to override write_buffer:
+    # export app_write_buffer='{"flush_interval_ms": 25}'
+    write_buffer: WriteBuffer = WriteBuffer()
+
+    # to override result_cache:
+    # export app_result_cache='{"ttl_seconds": 600}'
+    result_cache: ResultCache = ResultCache()
+
+    # to override provider_snapshot:
+    # export app_provider_snapshot='{"reload_interval_seconds": 300}'
+    provider_snapshot: ProviderSnapshot = ProviderSnapshot()
+
+    # to override orphan_sweep:
+    # export app_orphan_sweep='{"interval_seconds": 3600}'
+    orphan_sweep: OrphanSweep = OrphanSweep()
+
+    # to override query_retention:
+    # export app_query_retention='{"archive_dir": "archive", "retention_days": 30}'
+    query_retention: QueryRetention = QueryRetention()
+
     model_config = SettingsConfigDict(env_prefix="APP_")
 
 
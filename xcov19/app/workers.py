@@ -0,0 +1,252 @@
+"""
+Background workers processing patient queries accepted by the API.
+
+The result store the workers fill is built at application start, once the
+database is ready. The work queue, configured with the services, gets its
+handlers and starts then too. Both are stopped at shutdown.
+"""
+
+import asyncio
+from typing import List, Tuple
+
+from rodi import Container
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.app.database import db_logger
+from xcov19.app.settings import Settings
+from xcov19.dto import (
+    AnonymousId,
+    FacilitiesResult,
+    FacilityFilters,
+    GeoLocation,
+    LocationQueryJSON,
+    QueryId,
+)
+from xcov19.infra.location_cache import LocationCache
+from xcov19.infra.orphan_sweeper import OrphanSweeper
+from xcov19.infra.query_archive import (
+    JsonlQueryArchive,
+    QueryArchive,
+    QueryRetention,
+    SqliteQueryArchive,
+)
+from xcov19.infra.patient_store import (
+    DIAGNOSIS_QUERY,
+    GEOLOCATION_QUERY,
+    filters_from_payload,
+    patient_from_payload,
+)
+from xcov19.infra.repository import InMemoryProviderRepo, track_provider_changes
+from xcov19.infra.result_store import FacilitiesResultStore
+from xcov19.infra.snapshot_reloader import SnapshotReloader
+from xcov19.infra.write_buffer import WriteBehindBuffer
+from xcov19.services.geocoding import CachedReverseGeocoder
+from xcov19.services.geolocation import (
+    LocationQueryServiceInterface,
+    nearby_facilities_lookup,
+)
+from xcov19.utils.executor import BoundedExecutor, ExecutorSaturatedError
+from xcov19.utils.work_queue import Job, JobHandler, WorkQueue
+
+type StoredResults = Tuple[str, str, List[FacilitiesResult]]
+
+# Concurrent lookups of a geolocation handler without a lookup executor.
+MAX_CONCURRENT_LOOKUPS = 64
+
+
+def location_query_from_job(job: Job) -> LocationQueryJSON:
+    """Raises ValueError for jobs without a location or with invalid filters."""
+    patient = patient_from_payload(job.payload)
+    if not patient.geo_location:
+        raise ValueError(f"Geolocation query job {job.job_id} has no location.")
+    lat, lng = patient.geo_location
+    return LocationQueryJSON(
+        location=GeoLocation(lat=lat, lng=lng),
+        cust_id=AnonymousId(cust_id=patient.cust_id),
+        query_id=QueryId(query_id=patient.query_id or job.job_id),
+        filters=FacilityFilters.model_validate(filters_from_payload(job.payload)),
+    )
+
+
+def geolocation_query_handler(container: Container) -> JobHandler:
+    write_buffer = container.resolve(WriteBehindBuffer)
+    geocoder = container.resolve(CachedReverseGeocoder)
+    result_store = container.resolve(FacilitiesResultStore)
+    geolocation = container.resolve(LocationQueryServiceInterface)
+    facilities_lookup = nearby_facilities_lookup(
+        container.resolve(InMemoryProviderRepo)
+    )
+    # Every worker's batches share the executor, so lookups are started no
+    # faster than it accepts them.
+    lookups = asyncio.Semaphore(
+        container.resolve(BoundedExecutor).capacity
+        if BoundedExecutor in container
+        else MAX_CONCURRENT_LOOKUPS
+    )
+
+    async def process(job: Job, query: LocationQueryJSON) -> Job | StoredResults | None:
+        """The query's facilities to store, or the job if it must be retried."""
+        cust_id, query_id = query.cust_id.cust_id, query.query_id.query_id
+        try:
+            # Replayed or repeated queries are answered from the stored results.
+            if await result_store.get_json(cust_id, query_id) is not None:
+                return None
+            async with lookups:
+                facilities = await geolocation.fetch_facilities(
+                    geocoder, query, facilities_lookup
+                )
+        except ExecutorSaturatedError:
+            # Other callers of the executor took the slots, try again later.
+            return job
+        except Exception:
+            # Only this job is retried, the rest of the batch is still stored.
+            db_logger.exception(f"Geolocation query job {job.job_id} failed.")
+            return job
+        return cust_id, query_id, facilities or []
+
+    async def handle(jobs: List[Job]) -> List[Job]:
+        accepted: List[Tuple[Job, LocationQueryJSON]] = []
+        for job in jobs:
+            try:
+                accepted.append((job, location_query_from_job(job)))
+            except ValueError as e:
+                # Retrying cannot fix the payload, so the job is dropped.
+                db_logger.error(f"Rejected geolocation query job: {e}")
+        await write_buffer.persist_geolocation_queries(
+            [patient_from_payload(job.payload) for job, _ in accepted]
+        )
+        outcomes = await asyncio.gather(*(process(*pair) for pair in accepted))
+        # The batch's results are committed together.
+        await result_store.put_many(
+            outcome for outcome in outcomes if isinstance(outcome, tuple)
+        )
+        return [outcome for outcome in outcomes if isinstance(outcome, Job)]
+
+    return handle
+
+
+def diagnosis_query_handler(container: Container) -> JobHandler:
+    write_buffer = container.resolve(WriteBehindBuffer)
+
+    async def handle(jobs: List[Job]) -> List[Job]:
+        patients = [patient_from_payload(job.payload) for job in jobs]
+        pending = await write_buffer.attach_diagnosis_queries(patients)
+        # Jobs of the same query are retried, or completed, together.
+        pending_ids = {patient.query_id for patient in pending}
+        return [
+            job
+            for job, patient in zip(jobs, patients)
+            if patient.query_id in pending_ids
+        ]
+
+    return handle
+
+
+async def start_provider_snapshot(
+    container: Container, settings: Settings
+) -> SnapshotReloader:
+    """Loads the provider snapshot and starts keeping it in sync.
+
+    In-process ORM writes are applied as they commit, writes from other
+    processes by periodic reloads.
+    """
+    repo = container.resolve(InMemoryProviderRepo)
+    track_provider_changes(repo)
+    reloader = SnapshotReloader(
+        repo,
+        container.resolve(async_sessionmaker[AsyncSessionWrapper]),
+        interval_seconds=settings.provider_snapshot.reload_interval_seconds,
+    )
+    await reloader.reload()
+    reloader.start()
+    container.add_instance(reloader, SnapshotReloader)
+    return reloader
+
+
+async def start_result_store(
+    container: Container, settings: Settings
+) -> FacilitiesResultStore:
+    """Starts the facilities result store with its periodic eviction."""
+    result_cache = settings.result_cache
+    result_store = FacilitiesResultStore(
+        container.resolve(async_sessionmaker[AsyncSessionWrapper]),
+        cache_size=result_cache.cache_size,
+        ttl_seconds=result_cache.ttl_seconds,
+        eviction_interval_seconds=result_cache.eviction_interval_seconds,
+    )
+    result_store.start()
+    container.add_instance(result_store, FacilitiesResultStore)
+    return result_store
+
+
+async def start_write_buffer(
+    container: Container, settings: Settings
+) -> WriteBehindBuffer:
+    """Sets up the buffer committing the rows of patient queries for workers."""
+    write_buffer = WriteBehindBuffer(
+        container.resolve(async_sessionmaker[AsyncSessionWrapper]),
+        flush_interval_ms=settings.write_buffer.flush_interval_ms,
+        max_rows=settings.write_buffer.max_rows,
+        locations=container.resolve(LocationCache),
+    )
+    container.add_instance(write_buffer, WriteBehindBuffer)
+    return write_buffer
+
+
+async def start_orphan_sweeper(
+    container: Container, settings: Settings
+) -> OrphanSweeper:
+    """Starts the periodic sweep of orphan patients and locations.
+
+    Expects the write buffer to be set up, as location deletes take its lock.
+    """
+    sweeper = OrphanSweeper(
+        container.resolve(async_sessionmaker[AsyncSessionWrapper]),
+        chunk_size=settings.orphan_sweep.chunk_size,
+        interval_seconds=settings.orphan_sweep.interval_seconds,
+        locations=container.resolve(LocationCache),
+        write_lock=container.resolve(WriteBehindBuffer).write_lock,
+    )
+    sweeper.start()
+    container.add_instance(sweeper, OrphanSweeper)
+    return sweeper
+
+
+async def start_query_retention(
+    container: Container, settings: Settings
+) -> QueryRetention:
+    """Starts archiving expired queries when an archive directory is set.
+
+    Expects the orphan sweeper to be set up, it runs after each archival.
+    """
+    retention_settings = settings.query_retention
+    archive: QueryArchive | None = None
+    if retention_settings.archive_dir:
+        archive_type = (
+            SqliteQueryArchive
+            if retention_settings.archive_format == "sqlite"
+            else JsonlQueryArchive
+        )
+        archive = archive_type(retention_settings.archive_dir)
+    retention = QueryRetention(
+        container.resolve(async_sessionmaker[AsyncSessionWrapper]),
+        archive,
+        retention_days=retention_settings.retention_days,
+        chunk_size=retention_settings.chunk_size,
+        interval_seconds=retention_settings.interval_seconds,
+        sweeper=container.resolve(OrphanSweeper),
+    )
+    retention.start()
+    container.add_instance(retention, QueryRetention)
+    return retention
+
+
+async def start_work_queue(container: Container) -> WorkQueue:
+    """Adds the job handlers to the configured work queue and starts it."""
+    work_queue = container.resolve(WorkQueue)
+    work_queue.add_handler(GEOLOCATION_QUERY, geolocation_query_handler(container))
+    work_queue.add_handler(DIAGNOSIS_QUERY, diagnosis_query_handler(container))
+    await work_queue.start()
+    db_logger.info("===== Work queue started. =====")
+    return work_queue
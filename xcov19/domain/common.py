@@ -14,8 +14,14 @@ T = TypeVar("T")
 
 @dataclass(slots=True)
 class PaginatedSet(Generic[T]):
+    """
+    A page of results. The continuation_id, when set, is the opaque token to
+    request the next page with; total is None when it was not counted.
+    """
+
     items: list[T]
-    total: int
+    total: int | None
+    continuation_id: str | None = None
 
     def __iter__(self):
         yield from self.items
@@ -46,15 +52,17 @@ class PageOptions(BaseModel):
 
     - page, for page number
     - limit, for results per page
-    - continuation_id, the last numeric ID that was read
+    - continuation_id, opaque token of the last object that was read
+    - sort_order, ASC or DESC
     """
 
-    page: conint(gt=0) = Field(1, description="Page number.")  # type: ignore
+    page: conint(gt=0) = Field(default=1, description="Page number.")  # type: ignore
     limit: conint(gt=0, le=1000) = Field(  # type: ignore
-        100, description="Maximum number of results per page."
+        default=100, description="Maximum number of results per page."
     )
-    continuation_id: int | None = Field(
-        None, description="If provided, the ID of the last object that was retrieved."
+    continuation_id: str | None = Field(
+        default=None,
+        description="If provided, the token of the last page that was retrieved.",
     )
     sort_order: SortOrder = SortOrder.ASC
 
@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from xcov19.domain.models import GeoLocation
 
 type CustomerId = str
+type QueryId = str
 
 # domain entities
 
@@ -11,4 +12,5 @@ type CustomerId = str
 class Patient:
     cust_id: CustomerId
     query: str
-    geo_location: GeoLocation
+    geo_location: GeoLocation | None = None
+    query_id: QueryId | None = None
@@ -1,7 +1,8 @@
 import dataclasses
 import enum
+import re
 from dataclasses import dataclass
-from typing import Annotated, List
+from typing import Annotated, FrozenSet, List
 from xcov19.domain.models import MobileTelephone, GeoLocation
 
 
@@ -65,6 +66,29 @@ class Reviews:
             raise ValueError("Reviews cannot be negative.")
 
 
+_SPECIALTY_SEPARATORS = re.compile(r"[\s_\-]+")
+
+
+def normalize_specialty(name: str) -> str:
+    """Case folds a specialty and collapses spaces, `_` and `-` to one space."""
+    return _SPECIALTY_SEPARATORS.sub(" ", name).strip().casefold()
+
+
+@dataclass(frozen=True)
+class ProviderFilter:
+    """Restricts a provider search, empty fields match every provider.
+
+    max_fee matches providers with at least one doctor charging at most that.
+    """
+
+    facility_types: FrozenSet[FacilityEstablishment] = frozenset()
+    ownerships: FrozenSet[FacilityOwnership] = frozenset()
+    min_stars: int | None = None
+    specialties: FrozenSet[str] = frozenset()
+    match_all_specialties: bool = True
+    max_fee: MoneyType | None = None
+
+
 # domain entities
 
 
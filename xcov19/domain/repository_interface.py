@@ -1,22 +1,31 @@
-from typing import Protocol, TypeVar, List
+from typing import Collection, Protocol, Sequence, TypeVar, List, Tuple
 import abc
 
+from xcov19.domain.models import GeoLocation
 from xcov19.domain.models.patient import Patient
-from xcov19.domain.models.provider import Provider
+from xcov19.domain.models.provider import Provider, ProviderFilter
 
 PatientT = TypeVar("PatientT", bound=Patient)
 ProviderT = TypeVar("ProviderT", bound=Patient)
 
 
 class IPatientStore[PatientT: Patient](Protocol):
+    """Accepts patient queries for asynchronous processing.
+
+    Enqueue methods return an id to track the accepted work by. The filters of
+    a geolocation query are handed to the worker along with the patient.
+    """
+
     @classmethod
     @abc.abstractmethod
-    def enqueue_diagnosis_query(cls, patient: PatientT):
+    async def enqueue_diagnosis_query(cls, patient: PatientT) -> str:
         raise NotImplementedError
 
     @classmethod
     @abc.abstractmethod
-    def enqueue_geolocation_query(cls, patient: PatientT):
+    async def enqueue_geolocation_query(
+        cls, patient: PatientT, filters: dict | None = None
+    ) -> str:
         raise NotImplementedError
 
 
@@ -30,3 +39,87 @@ class IProviderRepository[ProviderT: Provider](Protocol):
         self, query_id: str, filtered_providers: List[ProviderT]
     ) -> List[ProviderT]:
         raise NotImplementedError
+
+
+class ProviderCandidates[ProviderT: Provider](Protocol):
+    """Providers found by a search as parallel columns, for batched ranking.
+
+    Only the providers picked from the columns are built with `provider`.
+    """
+
+    lats: Sequence[float]
+    lngs: Sequence[float]
+    stars: Sequence[int]
+    reviews: Sequence[int]
+    specialties: Sequence[Collection[str]]
+    distances_km: Sequence[float]
+
+    def __len__(self) -> int: ...
+
+    def provider(self, index: int) -> ProviderT: ...
+
+
+class ISpatialProviderRepository[ProviderT: Provider](
+    IProviderRepository[ProviderT], Protocol
+):
+    """Provider repository answering proximity queries.
+
+    Results are (provider, distance in km) pairs sorted by ascending distance.
+    """
+
+    @abc.abstractmethod
+    def fetch_candidates_within_radius(
+        self,
+        geo_location: GeoLocation,
+        radius_km: float,
+        provider_filter: ProviderFilter | None = None,
+    ) -> ProviderCandidates[ProviderT]:
+        """Candidates within radius_km matching provider_filter."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fetch_within_radius(
+        self, geo_location: GeoLocation, radius_km: float
+    ) -> List[Tuple[ProviderT, float]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fetch_by_specialties(
+        self, specialties: Collection[str], match_all: bool = True
+    ) -> List[ProviderT]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fetch_nearest(
+        self, geo_location: GeoLocation, k: int
+    ) -> List[Tuple[ProviderT, float]]:
+        raise NotImplementedError
+
+
+class IAsyncSpatialProviderRepository[ProviderT: Provider](Protocol):
+    """Awaitable counterpart of ISpatialProviderRepository for database backends."""
+
+    @abc.abstractmethod
+    async def fetch_by_providers(self, **address: dict[str, str]) -> List[ProviderT]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def fetch_by_query(
+        self, query_id: str, filtered_providers: List[ProviderT]
+    ) -> List[ProviderT]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def fetch_within_radius(
+        self,
+        geo_location: GeoLocation,
+        radius_km: float,
+        provider_filter: ProviderFilter | None = None,
+    ) -> List[Tuple[ProviderT, float]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def fetch_nearest(
+        self, geo_location: GeoLocation, k: int
+    ) -> List[Tuple[ProviderT, float]]:
+        raise NotImplementedError
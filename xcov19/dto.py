@@ -1,7 +1,13 @@
-from pydantic import BaseModel, Field
+from pydantic import AfterValidator, BaseModel, Field
 
 from typing import Annotated, List
 
+from xcov19.domain.models.provider import (
+    FacilityEstablishment,
+    FacilityOwnership,
+    normalize_specialty,
+)
+
 
 class GeoLocation(BaseModel):
     lat: float
@@ -25,10 +31,34 @@ class QueryId(BaseModel):
     query_id: str
 
 
+def _specialty_name(name: str) -> str:
+    if not normalize_specialty(name):
+        raise ValueError("Specialty names cannot be blank.")
+    return name
+
+
+SpecialtyName = Annotated[str, AfterValidator(_specialty_name)]
+
+
+class FacilityFilters(BaseModel):
+    """Restricts the facilities of a location query, unset fields match all."""
+
+    facility_type: List[FacilityEstablishment] = Field(default_factory=list)
+    ownership: List[FacilityOwnership] = Field(default_factory=list)
+    min_stars: Annotated[int | None, Field(default=None, ge=1, le=5)]
+    specialties: List[SpecialtyName] = Field(default_factory=list)
+    # offer every listed specialty, or any of them when false.
+    match_all_specialties: bool = True
+    max_distance_km: Annotated[float | None, Field(default=None, gt=0)]
+    # at least one doctor with a fee up to this.
+    max_fee: Annotated[float | None, Field(default=None, ge=0)]
+
+
 class LocationQueryJSON(BaseModel):
     location: GeoLocation
     cust_id: AnonymousId
     query_id: QueryId
+    filters: FacilityFilters = Field(default_factory=FacilityFilters)
 
 
 class DiagnosisQueryJSON(BaseModel):
@@ -48,3 +78,22 @@ class FacilitiesResult(BaseModel):
     reviews: Annotated[int, Field(ge=0)]
     rank: Annotated[int, Field(default=1, gt=0, le=20)]
     estimated_time: Annotated[float, Field(default=0.0, ge=0)]
+
+
+class ProviderResult(BaseModel):
+    provider_id: str
+    name: str
+    address: str
+    geolocation: GeoLocation
+    contact: str
+    facility_type: str
+    ownership: str
+    specialties: List[str]
+    stars: int
+    reviews: int
+
+
+class ProvidersPage(BaseModel):
+    items: List[ProviderResult]
+    # pass as continuation_id to get the next page, None on the last page.
+    continuation_id: str | None = None
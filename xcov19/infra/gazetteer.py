@@ -0,0 +1,55 @@
+"""Offline reverse geocoding backend over a local gazetteer.
+
+A gazetteer is a CSV of reference places (postcode centroids, admin boundary
+centroids, towns) with `lat` and `lng` columns plus any of the `Address`
+fields: name, street, city, state, zip, country. A point resolves to the
+nearest place within `max_distance_km`, or to an empty address when there is
+none, without ever leaving the process.
+"""
+
+import csv
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from xcov19.domain.models import GeoLocation
+from xcov19.dto import Address
+from xcov19.infra.spatial import GeoGridIndex
+from xcov19.services.geocoding import ReverseGeocoderBackend
+
+ADDRESS_FIELDS = tuple(Address.model_fields)
+
+
+class OfflineGazetteer(ReverseGeocoderBackend):
+    def __init__(
+        self,
+        places: Iterable[Dict[str, str]],
+        max_distance_km: float = 25.0,
+        cell_size_km: float = 10.0,
+    ) -> None:
+        self._max_distance_km = max_distance_km
+        self._index: GeoGridIndex[int] = GeoGridIndex(cell_size_km)
+        self._places: List[dict] = []
+        for place in places:
+            self._index.upsert(
+                len(self._places), (float(place["lat"]), float(place["lng"]))
+            )
+            self._places.append(
+                {field: place[field] for field in ADDRESS_FIELDS if place.get(field)}
+            )
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    @classmethod
+    def from_csv(cls, path: str | Path, **kwargs) -> "OfflineGazetteer":
+        with open(path, newline="", encoding="utf-8") as places_file:
+            return cls(csv.DictReader(places_file), **kwargs)
+
+    def reverse(self, geo_location: GeoLocation) -> dict:
+        nearby = self._index.within_radius(geo_location, self._max_distance_km)
+        if not nearby:
+            return {}
+        return dict(self._places[nearby[0][0]])
+
+    async def reverse_many(self, geo_locations: List[GeoLocation]) -> List[dict]:
+        return [self.reverse(geo_location) for geo_location in geo_locations]
@@ -0,0 +1,105 @@
+"""Durable SQLite journal for the work queue.
+
+Kept in its own database file so journal writes never contend with the
+application database's write lock.
+"""
+
+import json
+import time
+from typing import List
+
+import aiosqlite
+
+from xcov19.utils.work_queue import Job, JobJournal, Priority
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class SqliteJobJournal(JobJournal):
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._conn: aiosqlite.Connection | None = None
+
+    @property
+    def conn(self) -> aiosqlite.Connection:
+        if self._conn is None:
+            raise RuntimeError("Job journal is not open.")
+        return self._conn
+
+    async def open(self) -> List[Job]:
+        self._conn = await aiosqlite.connect(self._path)
+        await self.conn.execute("PRAGMA journal_mode=WAL")
+        await self.conn.execute("PRAGMA synchronous=NORMAL")
+        await self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_journal (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                enqueued_at REAL NOT NULL
+            )"""
+        )
+        await self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_job_journal_status "
+            "ON job_journal (status, enqueued_at)"
+        )
+        # Finished jobs are only kept until the next start.
+        await self.conn.execute("DELETE FROM job_journal WHERE status = ?", (DONE,))
+        await self.conn.commit()
+        async with self.conn.execute(
+            "SELECT job_id, kind, payload, priority, attempts FROM job_journal "
+            "WHERE status = ? ORDER BY enqueued_at",
+            (PENDING,),
+        ) as cursor:
+            return [
+                Job(
+                    job_id=job_id,
+                    kind=kind,
+                    payload=json.loads(payload),
+                    priority=Priority(priority),
+                    attempts=attempts,
+                )
+                async for job_id, kind, payload, priority, attempts in cursor
+            ]
+
+    async def append(self, job: Job) -> None:
+        await self.conn.execute(
+            "INSERT INTO job_journal "
+            "(job_id, kind, payload, priority, attempts, status, enqueued_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                job.job_id,
+                job.kind,
+                json.dumps(job.payload),
+                int(job.priority),
+                job.attempts,
+                PENDING,
+                time.time(),
+            ),
+        )
+        await self.conn.commit()
+
+    async def _set_status(self, jobs: List[Job], status: str) -> None:
+        await self.conn.executemany(
+            "UPDATE job_journal SET status = ?, attempts = ? WHERE job_id = ?",
+            [(status, job.attempts, job.job_id) for job in jobs],
+        )
+        await self.conn.commit()
+
+    async def complete(self, jobs: List[Job]) -> None:
+        await self._set_status(jobs, DONE)
+
+    async def fail(self, jobs: List[Job]) -> None:
+        await self._set_status(jobs, FAILED)
+
+    async def retry(self, jobs: List[Job]) -> None:
+        await self._set_status(jobs, PENDING)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
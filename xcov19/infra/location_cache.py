@@ -0,0 +1,77 @@
+"""Snapped coordinates to location ids, in front of the location table.
+
+Patient coordinates are snapped before they are stored, to a number of decimal
+places or to the centre of a geohash cell, so queries a few metres apart share
+one Location row. Ids of snapped points seen before are served from memory and
+their queries skip the location upsert altogether.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Literal, Tuple
+
+from xcov19.domain.models import GeoLocation
+from xcov19.utils.cache import TTLCache
+from xcov19.utils.geo import snap_decimal, snap_geohash
+
+type LocationId = str
+type SnapMode = Literal["decimal", "geohash", "off"]
+
+
+class LocationCache:
+    """Bounded LRU map of snapped points to location ids.
+
+    Only ids of committed rows may be added. Clear it when location rows are
+    deleted, see sweep_orphans.
+    """
+
+    __slots__ = ("mode", "precision", "_ids")
+
+    def __init__(
+        self, mode: SnapMode = "decimal", precision: int = 4, maxsize: int = 100_000
+    ) -> None:
+        self.mode = mode
+        self.precision = precision
+        self._ids: TTLCache[GeoLocation, LocationId] = TTLCache(maxsize)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def hits(self) -> int:
+        return self._ids.hits
+
+    @property
+    def misses(self) -> int:
+        return self._ids.misses
+
+    @property
+    def hit_ratio(self) -> float:
+        return self._ids.hit_ratio
+
+    def snap(self, geo_location: GeoLocation) -> GeoLocation:
+        if self.mode == "decimal":
+            return snap_decimal(geo_location, self.precision)
+        if self.mode == "geohash":
+            return snap_geohash(geo_location, self.precision)
+        return geo_location
+
+    def lookup(
+        self, points: Iterable[GeoLocation]
+    ) -> Tuple[Dict[GeoLocation, LocationId], set[GeoLocation]]:
+        """Splits snapped points into cached ids and points to upsert."""
+        known: Dict[GeoLocation, LocationId] = {}
+        missing: set[GeoLocation] = set()
+        for point in points:
+            if (location_id := self._ids.get(point)) is None:
+                missing.add(point)
+            else:
+                known[point] = location_id
+        return known, missing
+
+    def update(self, location_ids: Dict[GeoLocation, LocationId]) -> None:
+        for point, location_id in location_ids.items():
+            self._ids.set(point, location_id)
+
+    def clear(self) -> None:
+        self._ids.clear()
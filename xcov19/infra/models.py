@@ -12,19 +12,21 @@ Database Models and Delete Behavior Design Principles
 
 3. Orphan Deletion:
    - A Patient or Location should be deleted only when there are no more Queries referencing it.
-   - This is handled by custom event listeners that check for remaining Queries after a Query deletion.
+   - This is handled by OrphanSweeper, which periodically deletes orphans with one anti-join per
+     table, in bounded chunks, rather than checking for remaining Queries after every Query deletion.
 
 4. Cascading Behavior:
    - There is no automatic cascading delete from Patient or Location to Query.
    - Queries must be explicitly deleted before their associated Patient or Location can be removed.
 
 5. Transaction Handling:
-   - Delete operations and subsequent orphan checks should occur within the same transaction.
-   - Event listeners use the existing database connection to ensure consistency with the main transaction.
+   - Each chunk of orphans is checked and deleted by a single statement in its own transaction, so
+     a Query committed concurrently keeps its Patient and Location.
+   - Query deletes do not wait on orphan cleanup; orphans left in between are harmless.
 
 6. Error Handling:
    - Errors during the orphan deletion process should not silently fail.
-   - Exceptions in event listeners are logged and re-raised to ensure proper transaction rollback.
+   - A failed chunk is rolled back and logged; its orphans are retried on the next sweep.
 
 7. Data Integrity:
    - Database-level constraints (foreign keys, unique constraints) are used in conjunction with SQLAlchemy model definitions to ensure data integrity.
@@ -35,25 +37,76 @@ These principles aim to maintain referential integrity while allowing for the cl
 from __future__ import annotations
 
 import json
-from typing import Annotated, Dict, List, Tuple, Any
+import struct
+from datetime import datetime, timezone
+from typing import Annotated, ClassVar, Dict, List, Tuple, Any
 from pydantic import GetCoreSchemaHandler, TypeAdapter
 from pydantic_core import CoreSchema, core_schema
 from sqlalchemy.sql.elements import ColumnElement
 from sqlalchemy.sql.type_api import _BindProcessorType
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import BindParameter, Column, Dialect, Text, Float, Index, func
+from sqlalchemy import (
+    BindParameter,
+    Column,
+    DateTime,
+    Dialect,
+    Text,
+    Float,
+    Index,
+    Table,
+    func,
+)
 from sqlalchemy.orm import relationship, Mapped
 import uuid
-from sqlalchemy.dialects.sqlite import TEXT, NUMERIC, JSON, INTEGER
+from sqlalchemy.dialects.sqlite import TEXT, NUMERIC, JSON, INTEGER, BLOB, REAL
 from sqlalchemy.types import UserDefinedType
 
+# WGS 84, stored with X as latitude and Y as longitude.
+GEOPOINT_SRID = 4326
+
+# WKB point: byte order, geometry type, X, Y.
+WKB_POINT = struct.Struct("<BIdd")
+WKB_POINT_BIG_ENDIAN = struct.Struct(">BIdd")
+WKB_POINT_TYPE = 1
+
+
+def encode_point(point: Tuple[float, float]) -> bytes:
+    lat, lng = point
+    return WKB_POINT.pack(1, WKB_POINT_TYPE, lat, lng)
+
+
+def decode_point(wkb: bytes) -> Tuple[float, float]:
+    point = WKB_POINT if wkb[0] == 1 else WKB_POINT_BIG_ENDIAN
+    _, geometry_type, lat, lng = point.unpack(wkb)
+    if geometry_type != WKB_POINT_TYPE:
+        raise ValueError(f"Expected a WKB point, got geometry type {geometry_type}.")
+    return lat, lng
+
+
+def decode_points(wkbs: List[bytes]) -> List[Tuple[float, float]]:
+    """Decodes many little endian WKB points in one pass.
+
+    Unpacks the concatenated blobs with a single struct.iter_unpack call instead
+    of one call per point. Falls back to decode_point per blob for anything
+    else, e.g. big endian points.
+    """
+    blob = b"".join(wkbs)
+    if len(blob) != WKB_POINT.size * len(wkbs) or any(wkb[0] != 1 for wkb in wkbs):
+        return [decode_point(wkb) for wkb in wkbs]
+    return [(lat, lng) for _, _, lat, lng in WKB_POINT.iter_unpack(blob)]
+
 
 class PointType(UserDefinedType):
     """Defines a geopoint type.
 
+    Points travel to and from SpatiaLite as binary WKB, avoiding formatting and
+    parsing WKT text for every row.
+
     It also sets the type as a pydantic type when plugged into TypeAdapter.
     """
 
+    cache_ok = True
+
     def get_col_spec(self):
         return "POINT"
 
@@ -61,8 +114,7 @@ class PointType(UserDefinedType):
         def process(value):
             if not value:
                 return None
-            parsed_value = value[6:-1].split()
-            return tuple(map(float, parsed_value))
+            return decode_point(value)
 
         return process
 
@@ -70,13 +122,15 @@ class PointType(UserDefinedType):
         def process(value):
             if not value:
                 return None
-            lat, lng = value
-            return f"POINT({lat} {lng})"
+            return encode_point(value)
 
         return process
 
     def bind_expression(self, bindvalue: BindParameter) -> ColumnElement | None:
-        return func.GeomFromText(bindvalue, type_=self)
+        return func.GeomFromWKB(bindvalue, GEOPOINT_SRID, type_=self)
+
+    def column_expression(self, colexpr: ColumnElement) -> ColumnElement | None:
+        return func.AsBinary(colexpr, type_=self)
 
     @classmethod
     def __get_pydantic_core_schema__(
@@ -94,6 +148,11 @@ def generate_uuid() -> str:
     return str(uuid.uuid4())
 
 
+def utc_now() -> datetime:
+    """Naive UTC timestamp, the way SQLite stores datetimes."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 ### These tables map to the domain models for Patient
 class Patient(SQLModel, table=True):
     patient_id: str = Field(
@@ -110,6 +169,12 @@ class Patient(SQLModel, table=True):
 class Query(SQLModel, table=True):
     """Every Query must have both a Patient and a Location."""
 
+    __table_args__ = (
+        Index("ix_query_created_at", "created_at"),
+        # Orphan sweeps and RESTRICT checks look queries up by these keys.
+        Index("ix_query_patient_id", "patient_id"),
+        Index("ix_query_location_id", "location_id"),
+    )
     query_id: str = Field(
         sa_column=Column(TEXT, unique=True, primary_key=True, default=generate_uuid),
         allow_mutation=False,
@@ -119,6 +184,12 @@ class Query(SQLModel, table=True):
     patient_id: str = Field(foreign_key="patient.patient_id", ondelete="RESTRICT")
     # Restrict deleting Location record when there is atleast 1 query referencing it
     location_id: str = Field(foreign_key="location.location_id", ondelete="RESTRICT")
+    # naive UTC, as TimedMixin.created_at; old queries are archived by it.
+    created_at: datetime = Field(
+        default_factory=utc_now,
+        sa_column=Column(DateTime, nullable=False, default=utc_now),
+        allow_mutation=False,
+    )
     location: Location = Relationship(back_populates="queries")
     patient: Patient = Relationship(back_populates="queries")
 
@@ -145,6 +216,17 @@ class Location(SQLModel, table=True):
 
 ### These tables map to the domain models for Provider
 class Provider(SQLModel, table=True):
+    # Set by SQLModel for table models; declared for Core statements on it.
+    __table__: ClassVar[Table]
+    # Attribute filters of facility searches, see SqliteProviderRepo.
+    __table_args__ = (
+        Index(
+            "ix_provider_facility_type_ownership_type_stars",
+            "facility_type",
+            "ownership_type",
+            "stars",
+        ),
+    )
     provider_id: str = Field(
         sa_column=Column(TEXT, unique=True, primary_key=True, default=generate_uuid),
         allow_mutation=False,
@@ -167,40 +249,30 @@ class Provider(SQLModel, table=True):
     )
 
 
+class ProviderVersion(SQLModel, table=True):
+    """Count of writes to the provider table, in a single row.
+
+    Bumped by SQL triggers on every insert, update and delete of a provider,
+    whichever process writes it, see setup_provider_version.
+    """
+
+    id: int = Field(default=1, primary_key=True)
+    version: int = Field(sa_column=Column(INTEGER, nullable=False, default=0))
+
+
 ###
 
-# TODO: Add Model events for database ops during testing
-# @event.listens_for(Query, "after_delete")
-# def delete_dangling_location(mapper: Mapper, connection: Engine, target: Query):
-#     """Deletes orphan Location when no related queries exist."""
-#     local_session = sessionmaker(connection)
-#     with local_session() as session:
-#         stmt = (
-#             select(func.count())
-#             .select_from(Query)
-#             .where(Query.location_id == target.location_id)
-#         )
-#         if (
-#             num_queries := session.execute(stmt).scalar_one_or_none()
-#         ) and num_queries <= 1:
-#             location: Location = session.get(Location, target.location_id)
-#             session.delete(location)
-#         session.flush()
-
-
-# @event.listens_for(Query, "after_delete")
-# def delete_dangling_patient(mapper: Mapper, connection: Engine, target: Query):
-#     """Deletes orphan Patient records when no related queries exist."""
-#     local_session = sessionmaker(connection)
-#     with local_session() as session:
-#         stmt = (
-#             select(func.count())
-#             .select_from(Query)
-#             .where(Query.patient_id == target.patient_id)
-#         )
-#         if (
-#             num_queries := session.execute(stmt).scalar_one_or_none()
-#         ) and num_queries <= 1:
-#             patient: Patient = session.get(Patient, target.patient_id)
-#             session.delete(patient)
-#         session.flush()
+
+### Processed results served to the downstream consumer service
+class FacilitiesResultSet(SQLModel, table=True):
+    """Serialized List[FacilitiesResult] of a processed query of a customer."""
+
+    __table_args__ = (Index("ix_facilitiesresultset_expires_at", "expires_at"),)
+    cust_id: str = Field(sa_column=Column(TEXT, primary_key=True))
+    query_id: str = Field(sa_column=Column(TEXT, primary_key=True))
+    results: bytes = Field(sa_column=Column(BLOB, nullable=False))
+    # unix timestamp after which the results are stale.
+    expires_at: float = Field(sa_column=Column(REAL, nullable=False))
+
+
+###
@@ -0,0 +1,121 @@
+"""Periodic deletion of Patient and Location rows no Query references anymore.
+
+Each table is swept with one anti-join per chunk: a single DELETE removes up
+to `chunk_size` rows with no referencing Query, so finding and deleting
+orphans is a bounded amount of work however many queries retention removed.
+Every chunk commits on its own and the sweeper yields to the event loop
+between chunks, so request traffic and the write-behind buffer get the
+database write lock in between.
+"""
+
+import asyncio
+import logging
+from typing import Type
+
+from sqlalchemy import delete, exists, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.infra import models
+from xcov19.infra.location_cache import LocationCache
+
+sweeper_logger = logging.getLogger(__name__)
+
+
+def orphans_chunk(model: Type[SQLModel], key: str, chunk_size: int):
+    """DELETE of up to chunk_size rows of model no Query references by key."""
+    primary_key = getattr(model, key)
+    orphans = (
+        select(primary_key)
+        .where(~exists().where(getattr(models.Query, key) == primary_key))
+        .limit(chunk_size)
+    )
+    return delete(model).where(primary_key.in_(orphans))
+
+
+class OrphanSweeper:
+    """Deletes orphan Patient and Location rows in bounded chunks.
+
+    Location ids are cached in front of the location table, see
+    LocationCache. Location chunks are deleted holding `write_lock`, the lock
+    of the writer using that cache, and the cache is cleared before the lock
+    is released, so no write can reference a location deleted meanwhile.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSessionWrapper],
+        chunk_size: int = 1_000,
+        interval_seconds: float = 10 * 60,
+        locations: LocationCache | None = None,
+        write_lock: asyncio.Lock | None = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self.chunk_size = chunk_size
+        self._interval = interval_seconds
+        self.locations = locations
+        self._write_lock = write_lock or asyncio.Lock()
+        self.patients_deleted = 0
+        self.locations_deleted = 0
+        self._sweep_task: asyncio.Task | None = None
+
+    async def _delete_chunk(self, model: Type[SQLModel], key: str) -> int:
+        async with self._session_factory() as session:
+            result = await session.exec(orphans_chunk(model, key, self.chunk_size))
+            await session.commit()
+        return result.rowcount
+
+    async def _delete_location_chunk(self) -> int:
+        async with self._write_lock:
+            deleted = await self._delete_chunk(models.Location, "location_id")
+            if deleted and self.locations is not None:
+                self.locations.clear()
+        return deleted
+
+    async def sweep_patients(self) -> int:
+        """Deletes every orphan Patient, returning how many were removed."""
+        total = 0
+        while deleted := await self._delete_chunk(models.Patient, "patient_id"):
+            total += deleted
+            self.patients_deleted += deleted
+            if deleted < self.chunk_size:
+                break
+            await asyncio.sleep(0)
+        return total
+
+    async def sweep_locations(self) -> int:
+        """Deletes every orphan Location, returning how many were removed."""
+        total = 0
+        while deleted := await self._delete_location_chunk():
+            total += deleted
+            self.locations_deleted += deleted
+            if deleted < self.chunk_size:
+                break
+            await asyncio.sleep(0)
+        return total
+
+    async def sweep(self) -> int:
+        return await self.sweep_patients() + await self.sweep_locations()
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.sweep()
+            except Exception:
+                sweeper_logger.exception(
+                    "Sweeping orphan patients and locations failed."
+                )
+
+    def start(self) -> None:
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(
+                self._sweep_periodically(), name="orphan-sweep"
+            )
+
+    async def stop(self) -> None:
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            await asyncio.gather(self._sweep_task, return_exceptions=True)
+            self._sweep_task = None
@@ -0,0 +1,87 @@
+"""Keyset pagination of SQLModel queries.
+
+Pages are selected with a row value comparison on the sort key columns from
+the last row read, e.g. WHERE (provider_id) > (:last) ORDER BY provider_id
+LIMIT n, so with an index on the key every page is an index seek, however deep.
+The last row's key is handed to clients as an opaque continuation token.
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, List, Sequence
+
+from sqlalchemy import Select, func, tuple_
+from sqlalchemy.orm import Mapped
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.domain.common import PageOptions, PaginatedSet, SortOrder
+
+
+class InvalidContinuationToken(ValueError):
+    """Raised for continuation tokens that were not issued by encode_token."""
+
+    pass
+
+
+def encode_token(key: Sequence[Any]) -> str:
+    payload = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_token(token: str, key_size: int) -> List[Any]:
+    try:
+        payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        key = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as error:
+        raise InvalidContinuationToken("Malformed continuation token.") from error
+    if not isinstance(key, list) or len(key) != key_size:
+        raise InvalidContinuationToken("Continuation token does not match query.")
+    # Keys are bound as SQL parameters, which only take scalars.
+    if not all(value is None or isinstance(value, (str, int, float)) for value in key):
+        raise InvalidContinuationToken("Continuation token does not match query.")
+    return key
+
+
+async def fetch_page[T](
+    session: AsyncSessionWrapper,
+    statement: Select,
+    keys: Sequence[Mapped[Any]],
+    options: PageOptions,
+    with_total: bool = False,
+) -> PaginatedSet[T]:
+    """Runs statement for the page after options.continuation_id.
+
+    keys are model columns, wrapped in col(), that must uniquely identify a
+    row, ending with the primary key if needed, and be covered by an index
+    for pages to stay cheap. Counting the total
+    scans every matching row, so it is only done when asked for.
+    """
+    total = None
+    if with_total:
+        total = (
+            await session.exec(select(func.count()).select_from(statement.subquery()))
+        ).one()
+    key_columns = tuple_(*keys)
+    if options.continuation_id is not None:
+        last_key = tuple_(*decode_token(options.continuation_id, len(keys)))
+        statement = statement.where(
+            key_columns > last_key
+            if options.sort_order == SortOrder.ASC
+            else key_columns < last_key
+        )
+    order_by = [
+        key.asc() if options.sort_order == SortOrder.ASC else key.desc() for key in keys
+    ]
+    # One extra row tells whether there is a next page.
+    rows = list(
+        (
+            await session.exec(statement.order_by(*order_by).limit(options.limit + 1))
+        ).all()
+    )
+    continuation_id = None
+    if len(rows) > options.limit:
+        rows = rows[: options.limit]
+        continuation_id = encode_token([getattr(rows[-1], key.key) for key in keys])
+    return PaginatedSet(items=rows, total=total, continuation_id=continuation_id)
@@ -0,0 +1,224 @@
+"""Queue backed patient store and the batched writes its workers run.
+
+Geolocation queries carry the patient and location, so they create the
+Patient, Location and Query rows. Diagnosis queries only carry the free text
+for a query_id and attach it to the Query once its geolocation query has been
+stored; until then they are retried by the work queue.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+from typing import ClassVar, Dict, List, Set
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.domain.models import GeoLocation
+from xcov19.domain.models.patient import Patient
+from xcov19.domain.repository_interface import IPatientStore
+from xcov19.infra import models
+from xcov19.infra.location_cache import LocationCache
+from xcov19.utils.mixins import InterfaceProtocolCheckMixin
+from xcov19.utils.work_queue import Priority, WorkQueue
+
+GEOLOCATION_QUERY = "geolocation_query"
+DIAGNOSIS_QUERY = "diagnosis_query"
+
+
+def patient_to_payload(patient: Patient) -> dict:
+    return dataclasses.asdict(patient)
+
+
+def filters_from_payload(payload: dict) -> dict:
+    """Facility filters a geolocation query was enqueued with."""
+    return payload.get("filters") or {}
+
+
+def patient_from_payload(payload: dict) -> Patient:
+    geo_location = payload.get("geo_location")
+    return Patient(
+        cust_id=payload["cust_id"],
+        query=payload["query"],
+        geo_location=tuple(geo_location) if geo_location else None,
+        query_id=payload.get("query_id"),
+    )
+
+
+async def submit_patient_job(
+    work_queue: WorkQueue | None,
+    kind: str,
+    patient: Patient,
+    priority: Priority,
+    filters: dict | None = None,
+) -> str:
+    if work_queue is None or not work_queue.running:
+        raise RuntimeError("Patient store work queue is not running.")
+    payload = patient_to_payload(patient)
+    if filters:
+        payload["filters"] = filters
+    job = await work_queue.submit(kind, payload, priority)
+    return job.job_id
+
+
+class QueuedPatientStore(IPatientStore[Patient], InterfaceProtocolCheckMixin):
+    """Enqueues patient queries on the work queue started with the application.
+
+    Geolocation queries get the high priority lane as the patient is waiting
+    on nearby facilities.
+    """
+
+    # Set on the subclasses queued_patient_store returns, never on this class.
+    work_queue: ClassVar[WorkQueue | None] = None
+
+    @classmethod
+    async def enqueue_diagnosis_query(cls, patient: Patient) -> str:
+        return await submit_patient_job(
+            cls.work_queue, DIAGNOSIS_QUERY, patient, Priority.NORMAL
+        )
+
+    @classmethod
+    async def enqueue_geolocation_query(
+        cls, patient: Patient, filters: dict | None = None
+    ) -> str:
+        return await submit_patient_job(
+            cls.work_queue, GEOLOCATION_QUERY, patient, Priority.HIGH, filters
+        )
+
+
+def queued_patient_store(work_queue: WorkQueue) -> type[QueuedPatientStore]:
+    """A QueuedPatientStore enqueueing on an application's own work queue."""
+    return type(
+        QueuedPatientStore.__name__, (QueuedPatientStore,), {"work_queue": work_queue}
+    )
+
+
+async def upsert_locations(
+    session: AsyncSessionWrapper, coordinates: Set[GeoLocation]
+) -> Dict[GeoLocation, str]:
+    """Upserts locations on ix_location_composite_lat_lng, returns their ids.
+
+    A no-op update on conflict makes RETURNING include rows that already
+    existed.
+    """
+    if not coordinates:
+        return {}
+    statement = insert(models.Location).values(
+        [
+            {
+                "location_id": models.generate_uuid(),
+                "latitude": lat,
+                "longitude": lng,
+            }
+            for lat, lng in coordinates
+        ]
+    )
+    location_rows = await session.exec(
+        statement.on_conflict_do_update(
+            index_elements=["latitude", "longitude"],
+            set_={"latitude": statement.excluded.latitude},
+        ).returning(
+            models.Location.location_id,
+            models.Location.latitude,
+            models.Location.longitude,
+        )
+    )
+    return {(lat, lng): location_id for location_id, lat, lng in location_rows}
+
+
+async def stage_geolocation_queries(
+    session: AsyncSessionWrapper,
+    patients: List[Patient],
+    locations: LocationCache | None = None,
+) -> Dict[GeoLocation, str]:
+    """Writes Patient, Location and Query rows for a batch, without committing.
+
+    Rows that already exist are left untouched, so replayed jobs are harmless.
+    With a LocationCache, coordinates are snapped first and only locations
+    missing from it are upserted. Returns the ids of the upserted locations,
+    to add to the cache once the transaction commits.
+    """
+    patients = [patient for patient in patients if patient.geo_location]
+    if not patients:
+        return {}
+    await session.exec(
+        insert(models.Patient)
+        .values([{"patient_id": patient.cust_id} for patient in patients])
+        .on_conflict_do_nothing()
+    )
+    if locations is None:
+        points = [patient.geo_location for patient in patients]
+        known, missing = {}, set(points)
+    else:
+        points = [locations.snap(patient.geo_location) for patient in patients]
+        known, missing = locations.lookup(set(points))
+    upserted = await upsert_locations(session, missing)
+    location_ids = known | upserted
+    await session.exec(
+        insert(models.Query)
+        .values(
+            [
+                {
+                    "query_id": patient.query_id or models.generate_uuid(),
+                    "query": patient.query,
+                    "patient_id": patient.cust_id,
+                    "location_id": location_ids[point],
+                }
+                for patient, point in zip(patients, points)
+            ]
+        )
+        .on_conflict_do_nothing()
+    )
+    return upserted
+
+
+async def stage_diagnosis_queries(
+    session: AsyncSessionWrapper, patients: List[Patient]
+) -> List[Patient]:
+    """Sets the query text of stored queries without committing, returns the
+    patients whose query is not stored yet."""
+    if not patients:
+        return []
+    query_ids = {patient.query_id for patient in patients}
+    stored = set(
+        await session.exec(
+            select(models.Query.query_id).where(
+                models.Query.query_id.in_(query_ids)  # type: ignore[attr-defined]
+            )
+        )
+    )
+    found = [patient for patient in patients if patient.query_id in stored]
+    if found:
+        await session.exec(
+            update(models.Query.__table__)  # type: ignore[arg-type]
+            .where(models.Query.__table__.c.query_id == bindparam("b_query_id"))
+            .values(query=bindparam("b_query")),
+            params=[
+                {"b_query_id": patient.query_id, "b_query": patient.query}
+                for patient in found
+            ],
+        )
+    return [patient for patient in patients if patient.query_id not in stored]
+
+
+async def persist_geolocation_queries(
+    session: AsyncSessionWrapper,
+    patients: List[Patient],
+    locations: LocationCache | None = None,
+) -> None:
+    """Stores Patient, Location and Query rows for a batch in one transaction."""
+    upserted = await stage_geolocation_queries(session, patients, locations)
+    await session.commit()
+    if locations is not None:
+        locations.update(upserted)
+
+
+async def attach_diagnosis_queries(
+    session: AsyncSessionWrapper, patients: List[Patient]
+) -> List[Patient]:
+    """Sets the query text of stored queries, returns those not stored yet."""
+    pending = await stage_diagnosis_queries(session, patients)
+    await session.commit()
+    return pending
@@ -0,0 +1,277 @@
+"""Streaming import of provider registries from CSV or JSONL files.
+
+Records are read one at a time, validated against the provider value objects
+and upserted on provider_id in executemany batches, committing every
+`transaction_rows` rows. Memory use depends on the batch size only, not on the
+file size.
+
+Run with:
+    python -m xcov19.infra.provider_import registry.csv --db-url sqlite+aiosqlite:///xcov19.db
+
+CSV files have a header row with the columns name, address, lat, lng, contact,
+facility_type, ownership, specialties, stars, reviews and optionally
+provider_id and available_doctors. specialties is a JSON list or `|`
+separated, available_doctors a JSON list of doctors. JSONL records use the
+same keys, or geopoint as [lat, lng], with lists as JSON values. Specialties
+are stored normalized, see normalize_specialty.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import dataclasses
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import text
+
+from xcov19.app.database import setup_database
+from xcov19.domain.models.provider import (
+    Contact,
+    Doctor,
+    FacilityEstablishment,
+    FacilityOwnership,
+    Reviews,
+    Stars,
+    normalize_specialty,
+)
+from xcov19.infra import models
+
+import_logger = logging.getLogger(__name__)
+
+# Provider ids derived from name and address when a registry has none, so
+# re-importing a file updates rows instead of duplicating them.
+PROVIDER_NAMESPACE = uuid.UUID("5b0c0d44-2f4e-4a53-9f8e-2a3c1b7e6d10")
+
+# Bulk load settings for the import connection only: a larger page cache and
+# in memory temp b-trees, fsync at WAL checkpoints instead of every commit.
+IMPORT_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+
+type ProviderRow = Dict[str, Any]
+
+
+class InvalidProviderRecord(ValueError):
+    pass
+
+
+type RawRecord = Dict[str, Any] | InvalidProviderRecord
+
+
+@dataclasses.dataclass(slots=True)
+class ImportStats:
+    read: int = 0
+    imported: int = 0
+    rejected: int = 0
+    started_at: float = dataclasses.field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = self.elapsed_seconds
+        return self.imported / elapsed if elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.imported} providers imported, {self.rejected} rejected of "
+            f"{self.read} read in {self.elapsed_seconds:.1f}s "
+            f"({self.rows_per_second:,.0f} rows/s)"
+        )
+
+
+def read_records(path: Path) -> Iterator[RawRecord]:
+    """Yields raw records of a .csv or .jsonl file one at a time.
+
+    JSONL lines that are not valid JSON are yielded as InvalidProviderRecord,
+    to be rejected like any other invalid record.
+    """
+    with path.open(newline="", encoding="utf-8") as file:
+        if path.suffix.lower() == ".csv":
+            yield from csv.DictReader(file)
+        elif path.suffix.lower() in (".jsonl", ".ndjson"):
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as error:
+                    yield InvalidProviderRecord(
+                        f"JSONDecodeError on line {line_number}: {error}"
+                    )
+        else:
+            raise ValueError(f"Unsupported provider file format {path.suffix}.")
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        if value.lstrip().startswith("["):
+            return json.loads(value)
+        return [part.strip() for part in value.split("|") if part.strip()]
+    return list(value)
+
+
+def _specialties(names: Iterable[Any]) -> List[str]:
+    """Normalized specialties in their first order, blanks and repeats dropped.
+
+    Stored normalized so SQL filters compare them as plain values.
+    """
+    normalized = (normalize_specialty(str(name)) for name in names)
+    return list(dict.fromkeys(name for name in normalized if name))
+
+
+def provider_row(record: Dict[str, Any]) -> ProviderRow:
+    """Validates a raw record into a provider table row."""
+    try:
+        if "geopoint" in record:
+            lat, lng = map(float, _as_list(record["geopoint"]))
+        else:
+            lat, lng = float(record["lat"]), float(record["lng"])
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError(f"Coordinates out of range: {lat}, {lng}.")
+        name, address = str(record["name"]).strip(), str(record["address"]).strip()
+        if not name or not address:
+            raise ValueError("Provider name and address are required.")
+        contact = Contact(str(record["contact"]).strip()).value
+        doctors = [
+            dataclasses.asdict(Doctor(**doctor))
+            for doctor in _as_list(record.get("available_doctors"))
+        ]
+        for doctor in doctors:
+            doctor["specialties"] = _specialties(doctor["specialties"])
+        return {
+            "provider_id": record.get("provider_id")
+            or str(uuid.uuid5(PROVIDER_NAMESPACE, f"{name}|{address}")),
+            "name": name,
+            "address": address,
+            "geopoint": (lat, lng),
+            "contact": int(contact.lstrip("+")),
+            "facility_type": FacilityEstablishment(record["facility_type"]).value,
+            "ownership_type": FacilityOwnership(record["ownership"]).value,
+            "specialties": _specialties(_as_list(record.get("specialties"))),
+            "stars": Stars(round(float(record["stars"]))).value,
+            "reviews": Reviews(int(record.get("reviews") or 0)).value,
+            "available_doctors": doctors,
+        }
+    except (KeyError, TypeError, ValueError) as error:
+        raise InvalidProviderRecord(f"{type(error).__name__}: {error}") from error
+
+
+def valid_rows(records: Iterable[RawRecord], stats: ImportStats) -> Iterator:
+    for line, record in enumerate(records, start=1):
+        stats.read += 1
+        try:
+            if isinstance(record, InvalidProviderRecord):
+                raise record
+            yield provider_row(record)
+        except InvalidProviderRecord as error:
+            stats.rejected += 1
+            import_logger.warning(f"Skipping record {line}: {error}")
+
+
+def upsert_providers_statement():
+    statement = insert(models.Provider.__table__)  # type: ignore[arg-type]
+    return statement.on_conflict_do_update(
+        index_elements=["provider_id"],
+        set_={
+            column.name: statement.excluded[column.name]
+            for column in models.Provider.__table__.columns  # type: ignore[attr-defined]
+            if column.name != "provider_id"
+        },
+    )
+
+
+async def import_providers(
+    engine: AsyncEngine,
+    records: Iterable[RawRecord],
+    batch_size: int = 5_000,
+    transaction_rows: int = 50_000,
+    report_every_seconds: float = 5.0,
+) -> ImportStats:
+    """Upserts valid records in batches of batch_size rows."""
+    stats = ImportStats()
+    statement = upsert_providers_statement()
+    last_report = time.perf_counter()
+    batches = itertools.batched(valid_rows(records, stats), batch_size)
+    async with engine.connect() as conn:
+        for pragma in IMPORT_PRAGMAS:
+            await conn.exec_driver_sql(pragma)
+        await conn.commit()
+        uncommitted = 0
+        for batch in batches:
+            await conn.execute(statement, list(batch))
+            stats.imported += len(batch)
+            uncommitted += len(batch)
+            if uncommitted >= transaction_rows:
+                await conn.commit()
+                uncommitted = 0
+            if time.perf_counter() - last_report >= report_every_seconds:
+                import_logger.info(stats.summary())
+                last_report = time.perf_counter()
+        await conn.commit()
+    return stats
+
+
+async def run(
+    path: Path, db_url: str, batch_size: int, transaction_rows: int
+) -> ImportStats:
+    engine = create_async_engine(db_url)
+    try:
+        await setup_database(engine)
+        stats = await import_providers(
+            engine,
+            read_records(path),
+            batch_size=batch_size,
+            transaction_rows=transaction_rows,
+        )
+        async with engine.begin() as conn:
+            await conn.execute(text("ANALYZE provider"))
+    finally:
+        await engine.dispose()
+    import_logger.info(stats.summary())
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Import providers from a CSV or JSONL registry file."
+    )
+    parser.add_argument("path", type=Path)
+    parser.add_argument(
+        "--db-url",
+        default=os.environ.get("APP_DB_ENGINE_URL"),
+        help="database to import into, defaults to APP_DB_ENGINE_URL",
+    )
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    parser.add_argument("--transaction-rows", type=int, default=50_000)
+    args = parser.parse_args()
+    if not args.db_url:
+        parser.error("--db-url or APP_DB_ENGINE_URL is required")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    stats = asyncio.run(
+        run(args.path, args.db_url, args.batch_size, args.transaction_rows)
+    )
+    if stats.read and not stats.imported:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
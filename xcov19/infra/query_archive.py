@@ -0,0 +1,291 @@
+"""Retention of old queries in per-month archives outside the database.
+
+Queries older than the retention period are moved, oldest first and in
+bounded chunks, into one archive per calendar month of their created_at:
+either a SQLite file or a gzip compressed JSON lines file. The query table and
+its indexes then only hold recent queries. Archived queries can still be
+looked up by id, newest month first.
+"""
+
+import asyncio
+import dataclasses
+import gzip
+import json
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import ClassVar, Dict, Iterable, List
+
+import aiosqlite
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.infra import models
+from xcov19.infra.orphan_sweeper import OrphanSweeper
+
+archive_logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class ArchivedQuery:
+    query_id: str
+    query: str
+    patient_id: str
+    location_id: str
+    latitude: float
+    longitude: float
+    created_at: datetime
+
+    def to_json(self) -> str:
+        record = dataclasses.asdict(self)
+        record["created_at"] = self.created_at.isoformat()
+        return json.dumps(record)
+
+    @classmethod
+    def from_json(cls, line: str) -> "ArchivedQuery":
+        record = json.loads(line)
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+        return cls(**record)
+
+
+def select_archived_queries():
+    """Selects queries with their coordinates, in ArchivedQuery field order."""
+    return select(
+        models.Query.query_id,
+        models.Query.query,
+        models.Query.patient_id,
+        models.Query.location_id,
+        models.Location.latitude,
+        models.Location.longitude,
+        models.Query.created_at,
+    ).join(models.Location)
+
+
+def month_of(created_at: datetime) -> str:
+    return created_at.strftime("%Y-%m")
+
+
+class QueryArchive(ABC):
+    """Per-month archive files of queries in one directory."""
+
+    suffix: ClassVar[str]
+
+    def __init__(self, directory: str | Path) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, month: str) -> Path:
+        return self.directory / f"queries-{month}{self.suffix}"
+
+    def months(self) -> List[str]:
+        """Archived months, newest first."""
+        prefix, suffix = len("queries-"), len(self.suffix)
+        return sorted(
+            (
+                path.name[prefix:-suffix]
+                for path in self.directory.glob(f"queries-*{self.suffix}")
+            ),
+            reverse=True,
+        )
+
+    async def write(self, queries: Iterable[ArchivedQuery]) -> None:
+        """Adds queries to the archives of their months.
+
+        Writing a query twice is harmless, so an interrupted archival can be
+        repeated.
+        """
+        by_month: Dict[str, List[ArchivedQuery]] = defaultdict(list)
+        for query in queries:
+            by_month[month_of(query.created_at)].append(query)
+        for month, month_queries in sorted(by_month.items()):
+            await self._write_month(self.path(month), month_queries)
+
+    async def get(self, query_id: str) -> ArchivedQuery | None:
+        for month in self.months():
+            if (query := await self._find(self.path(month), query_id)) is not None:
+                return query
+        return None
+
+    @abstractmethod
+    async def _write_month(self, path: Path, queries: List[ArchivedQuery]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def _find(self, path: Path, query_id: str) -> ArchivedQuery | None:
+        raise NotImplementedError
+
+
+class SqliteQueryArchive(QueryArchive):
+    """One SQLite file per month, looked up by its primary key."""
+
+    suffix = ".db"
+
+    async def _write_month(self, path: Path, queries: List[ArchivedQuery]) -> None:
+        async with aiosqlite.connect(path) as conn:
+            await conn.execute(
+                """CREATE TABLE IF NOT EXISTS query (
+                    query_id TEXT PRIMARY KEY,
+                    query TEXT,
+                    patient_id TEXT NOT NULL,
+                    location_id TEXT NOT NULL,
+                    latitude REAL,
+                    longitude REAL,
+                    created_at TEXT NOT NULL
+                )"""
+            )
+            await conn.executemany(
+                "INSERT OR REPLACE INTO query VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (*dataclasses.astuple(query)[:-1], query.created_at.isoformat())
+                    for query in queries
+                ],
+            )
+            await conn.commit()
+
+    async def _find(self, path: Path, query_id: str) -> ArchivedQuery | None:
+        async with aiosqlite.connect(path) as conn:
+            async with conn.execute(
+                "SELECT * FROM query WHERE query_id = ?", (query_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            return None
+        return ArchivedQuery(*row[:-1], created_at=datetime.fromisoformat(row[-1]))
+
+
+class JsonlQueryArchive(QueryArchive):
+    """One gzip compressed JSON lines file per month, appended as members.
+
+    Smaller than SQLite archives, but a lookup decompresses and scans files
+    until the query is found.
+    """
+
+    suffix = ".jsonl.gz"
+
+    @staticmethod
+    def _append(path: Path, queries: List[ArchivedQuery]) -> None:
+        with gzip.open(path, "at", encoding="utf-8") as archive:
+            archive.writelines(f"{query.to_json()}\n" for query in queries)
+
+    @staticmethod
+    def _scan(path: Path, query_id: str) -> ArchivedQuery | None:
+        needle = json.dumps(query_id)
+        with gzip.open(path, "rt", encoding="utf-8") as archive:
+            for line in archive:
+                if (
+                    needle in line
+                    and (query := ArchivedQuery.from_json(line)).query_id == query_id
+                ):
+                    return query
+        return None
+
+    async def _write_month(self, path: Path, queries: List[ArchivedQuery]) -> None:
+        await asyncio.to_thread(self._append, path, queries)
+
+    async def _find(self, path: Path, query_id: str) -> ArchivedQuery | None:
+        return await asyncio.to_thread(self._scan, path, query_id)
+
+
+class QueryRetention:
+    """Moves queries older than retention_days from the database to archive.
+
+    Each chunk is written to the archive before it is deleted from the
+    database. Patients and locations left without queries are then removed by
+    the orphan sweeper.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSessionWrapper],
+        archive: QueryArchive | None,
+        retention_days: float = 90,
+        chunk_size: int = 1_000,
+        interval_seconds: float = 60 * 60,
+        sweeper: OrphanSweeper | None = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self.archive = archive
+        self.retention = timedelta(days=retention_days)
+        self.chunk_size = chunk_size
+        self._interval = interval_seconds
+        self.sweeper = sweeper
+        self.archived_rows = 0
+        self._retention_task: asyncio.Task | None = None
+
+    async def _archive_chunk(self, archive: QueryArchive, cutoff: datetime) -> int:
+        async with self._session_factory() as session:
+            rows = (
+                await session.exec(
+                    select_archived_queries()
+                    .where(models.Query.created_at < cutoff)
+                    .order_by(models.Query.created_at)
+                    .limit(self.chunk_size)
+                )
+            ).all()
+        if not rows:
+            return 0
+        queries = [ArchivedQuery(*row) for row in rows]
+        await archive.write(queries)
+        async with self._session_factory() as session:
+            await session.exec(
+                delete(models.Query).where(
+                    models.Query.query_id.in_([q.query_id for q in queries])  # type: ignore[attr-defined]
+                )
+            )
+            await session.commit()
+        return len(queries)
+
+    async def archive_expired(self) -> int:
+        """Archives every expired query, returning how many were moved."""
+        if self.archive is None:
+            return 0
+        cutoff = models.utc_now() - self.retention
+        total = 0
+        while archived := await self._archive_chunk(self.archive, cutoff):
+            total += archived
+            self.archived_rows += archived
+            if archived < self.chunk_size:
+                break
+            await asyncio.sleep(0)
+        if total and self.sweeper is not None:
+            await self.sweeper.sweep()
+        return total
+
+    async def get(self, query_id: str) -> ArchivedQuery | None:
+        """Looks a query up in the database, then in the archive."""
+        async with self._session_factory() as session:
+            row = (
+                await session.exec(
+                    select_archived_queries().where(models.Query.query_id == query_id)
+                )
+            ).first()
+        if row is not None:
+            return ArchivedQuery(*row)
+        if self.archive is None:
+            return None
+        return await self.archive.get(query_id)
+
+    async def _archive_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.archive_expired()
+            except Exception:
+                archive_logger.exception("Archiving expired queries failed.")
+
+    def start(self) -> None:
+        if self._retention_task is None and self.archive is not None:
+            self._retention_task = asyncio.create_task(
+                self._archive_periodically(), name="query-retention"
+            )
+
+    async def stop(self) -> None:
+        if self._retention_task is not None:
+            self._retention_task.cancel()
+            await asyncio.gather(self._retention_task, return_exceptions=True)
+            self._retention_task = None
@@ -0,0 +1,198 @@
+"""Plans filtered provider searches over the indexes of a snapshot.
+
+A filtered search can be driven by any of three indexes:
+
+- spatial: the grid cells around the patient
+- specialty: the posting arrays of the wanted specialties
+- attribute: the posting arrays of the wanted facility types, ownerships or
+  star ratings
+
+plan_search estimates how many positions each applicable index yields and
+picks the smallest. The search then only reads those positions and checks the
+remaining predicates (distance, other attributes, fee) against the snapshot
+columns, so a filtered search never scans the whole registry.
+"""
+
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Literal, Tuple
+
+from xcov19.domain.models import GeoLocation
+from xcov19.domain.models.provider import ProviderFilter
+from xcov19.infra.snapshot import (
+    FACILITY_TYPE_CODES,
+    OWNERSHIP_CODES,
+    Hit,
+    ProviderSnapshot,
+    SnapshotView,
+)
+from xcov19.utils.geo import haversine_km
+
+type Driver = Literal["spatial", "specialty", "attribute"]
+type Match = Tuple[int, float]
+
+STAR_RATINGS = range(1, 6)
+
+
+@dataclass(frozen=True, slots=True)
+class SearchPlan:
+    driver: Driver
+    estimated_rows: int
+    # attribute driving the search when driver is "attribute".
+    attribute: str | None = None
+
+
+def _attribute_codes(provider_filter: ProviderFilter) -> List[Tuple[str, List[int]]]:
+    """Filtered attributes with the codes each accepts."""
+    codes = []
+    if provider_filter.facility_types:
+        codes.append(
+            (
+                "facility_type",
+                sorted(
+                    FACILITY_TYPE_CODES[kind] for kind in provider_filter.facility_types
+                ),
+            )
+        )
+    if provider_filter.ownerships:
+        codes.append(
+            (
+                "ownership",
+                sorted(OWNERSHIP_CODES[kind] for kind in provider_filter.ownerships),
+            )
+        )
+    if provider_filter.min_stars is not None:
+        codes.append(
+            (
+                "stars",
+                [stars for stars in STAR_RATINGS if stars >= provider_filter.min_stars],
+            )
+        )
+    return codes
+
+
+def _specialty_estimate(
+    snapshot: ProviderSnapshot, provider_filter: ProviderFilter
+) -> int:
+    sizes = [
+        len(snapshot.specialty_index.positions(name))
+        for name in provider_filter.specialties
+    ]
+    return min(sizes) if provider_filter.match_all_specialties else sum(sizes)
+
+
+def plan_search(
+    snapshot: ProviderSnapshot,
+    center: GeoLocation,
+    radius_km: float,
+    provider_filter: ProviderFilter | None = None,
+) -> SearchPlan:
+    """Picks the index expected to yield the fewest candidate positions.
+
+    Ties go to the spatial index, which also yields the distances.
+    """
+    plans = [SearchPlan("spatial", snapshot.index.estimate(center, radius_km))]
+    if provider_filter is None:
+        return plans[0]
+    if provider_filter.specialties:
+        plans.append(
+            SearchPlan("specialty", _specialty_estimate(snapshot, provider_filter))
+        )
+    for attribute, codes in _attribute_codes(provider_filter):
+        estimate = sum(
+            len(snapshot.attribute_index.positions(attribute, code)) for code in codes
+        )
+        plans.append(SearchPlan("attribute", estimate, attribute))
+    return min(plans, key=lambda plan: plan.estimated_rows)
+
+
+def _residual_checks(
+    snapshot: ProviderSnapshot, provider_filter: ProviderFilter, plan: SearchPlan
+) -> List[Callable[[int], bool]]:
+    """Predicates the driving index of plan does not already guarantee."""
+    checks: List[Callable[[int], bool]] = []
+    columns = {
+        "facility_type": snapshot.facility_types,
+        "ownership": snapshot.ownerships,
+        "stars": snapshot.stars,
+    }
+    for attribute, codes in _attribute_codes(provider_filter):
+        if attribute != plan.attribute:
+            column, accepted = columns[attribute], frozenset(codes)
+            checks.append(
+                lambda position, column=column, accepted=accepted: (
+                    column[position] in accepted
+                )
+            )
+    if provider_filter.specialties and plan.driver != "specialty":
+        checks.append(
+            snapshot.specialty_index.matcher(
+                provider_filter.specialties, provider_filter.match_all_specialties
+            )
+        )
+    if provider_filter.max_fee is not None:
+        min_fees, max_fee = snapshot.min_fees, provider_filter.max_fee
+        checks.append(lambda position: min_fees[position] <= max_fee)
+    return checks
+
+
+def _driver_positions(
+    snapshot: ProviderSnapshot, provider_filter: ProviderFilter, plan: SearchPlan
+) -> Iterable[int]:
+    if plan.driver == "specialty":
+        return snapshot.specialty_index.matching(
+            provider_filter.specialties, provider_filter.match_all_specialties
+        )
+    codes = dict(_attribute_codes(provider_filter))[plan.attribute]
+    # Every position has one value per attribute, so the arrays are disjoint.
+    return heapq.merge(
+        *(snapshot.attribute_index.positions(plan.attribute, code) for code in codes)
+    )
+
+
+def search_snapshot(
+    snapshot: ProviderSnapshot,
+    center: GeoLocation,
+    radius_km: float,
+    provider_filter: ProviderFilter | None = None,
+) -> Iterator[Match]:
+    """Yields (position, distance) of matching providers, in no given order."""
+    plan = plan_search(snapshot, center, radius_km, provider_filter)
+    if plan.driver == "spatial":
+        matches: Iterable[Match] = snapshot.index.within_radius(center, radius_km)
+    else:
+        lats, lngs = snapshot.lats, snapshot.lngs
+        matches = (
+            (position, haversine_km(center, (lats[position], lngs[position])))
+            for position in _driver_positions(snapshot, provider_filter, plan)
+        )
+    checks = (
+        _residual_checks(snapshot, provider_filter, plan) if provider_filter else []
+    )
+    for position, distance in matches:
+        if distance <= radius_km and all(check(position) for check in checks):
+            yield position, distance
+
+
+def search_view(
+    view: SnapshotView,
+    center: GeoLocation,
+    radius_km: float,
+    provider_filter: ProviderFilter | None = None,
+) -> List[Hit]:
+    """Matching providers of a view by ascending distance.
+
+    The base snapshot and the segments are planned separately, the small
+    segments usually go by their spatial index.
+    """
+    hits = [
+        hit
+        for snapshot in view.snapshots()
+        for hit in view.visible(
+            snapshot, search_snapshot(snapshot, center, radius_km, provider_filter)
+        )
+    ]
+    hits.sort(key=lambda hit: hit[2])
+    return hits
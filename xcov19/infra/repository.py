@@ -0,0 +1,459 @@
+"""Provider repositories backing the geolocation lookup services."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import weakref
+from typing import Collection, Iterable, List, Tuple
+
+from sqlalchemy import ColumnElement, and_, event, or_, text
+from sqlalchemy.orm import Mapper, Session, object_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19 import dto
+from xcov19.domain.models import GeoLocation
+from xcov19.domain.models.provider import (
+    Contact,
+    Doctor,
+    FacilityEstablishment,
+    FacilityOwnership,
+    Provider,
+    ProviderFilter,
+    normalize_specialty,
+)
+from xcov19.domain.repository_interface import (
+    IAsyncSpatialProviderRepository,
+    ISpatialProviderRepository,
+)
+from xcov19.infra import models
+from xcov19.infra.query_planner import search_view
+from xcov19.infra.snapshot import (
+    ProviderSnapshot,
+    SnapshotCandidates,
+    SnapshotView,
+    load_snapshot,
+)
+from xcov19.infra.spatial import MAX_SEARCH_RADIUS_KM
+from xcov19.utils.geo import bounding_box, haversine_km
+from xcov19.utils.mixins import InterfaceProtocolCheckMixin
+
+type ProviderId = str
+type ProviderChange = Tuple[ProviderId, Provider | None]
+
+repository_logger = logging.getLogger(__name__)
+
+DEFAULT_RADIUS_KM = 10.0
+NEAREST_START_RADIUS_KM = 5.0
+# Degrees added around R-tree search boxes. The R-tree stores coordinates as
+# 32 bit floats, about 1e-5 degrees apart at 180.
+RTREE_SLACK_DEG = 1e-4
+
+
+# Specialties are stored normalized by the provider import, see
+# xcov19.infra.provider_import, so they compare as plain values.
+SPECIALTY_SQL = (
+    "(EXISTS (SELECT 1 FROM json_each(provider.specialties) AS offered "
+    "WHERE offered.value = :specialty_{n}) "
+    "OR EXISTS (SELECT 1 FROM json_each(provider.available_doctors) AS doctor, "
+    "json_each(doctor.value, '$.specialties') AS offered "
+    "WHERE offered.value = :specialty_{n}))"
+)
+MAX_FEE_SQL = (
+    "EXISTS (SELECT 1 FROM json_each(provider.available_doctors) AS doctor "
+    "WHERE json_extract(doctor.value, '$.fee') <= :max_fee)"
+)
+
+
+def provider_from_row(row: models.Provider) -> Provider:
+    """Maps a provider table row to the domain Provider entity."""
+    lat, lng = row.geopoint
+    return Provider(
+        name=row.name,
+        address=row.address,
+        geo_location=(lat, lng),
+        contact=Contact(str(row.contact)),
+        facility_type=FacilityEstablishment(row.facility_type),
+        ownership=FacilityOwnership(row.ownership_type),
+        specialties=list(row.specialties),
+        available_doctors=[Doctor(**doctor) for doctor in row.available_doctors],
+        stars=row.stars,
+        reviews=row.reviews,
+    )
+
+
+def provider_result_from_row(row: models.Provider) -> dto.ProviderResult:
+    lat, lng = row.geopoint
+    return dto.ProviderResult(
+        provider_id=row.provider_id,
+        name=row.name,
+        address=row.address,
+        geolocation=dto.GeoLocation(lat=lat, lng=lng),
+        contact=str(row.contact),
+        facility_type=row.facility_type,
+        ownership=row.ownership_type,
+        specialties=list(row.specialties),
+        stars=row.stars,
+        reviews=row.reviews,
+    )
+
+
+def split_address(
+    address: dict,
+) -> Tuple[GeoLocation | None, float, List[str]]:
+    """Splits fetch_by_providers keyword arguments into a search.
+
+    `lat` / `lng` (and optionally `radius_km`) select a proximity search, every
+    other non empty value is an address part the provider address must contain.
+    """
+    address = dict(address)
+    lat, lng = address.pop("lat", None), address.pop("lng", None)
+    radius_km = float(address.pop("radius_km", None) or DEFAULT_RADIUS_KM)
+    origin = None if lat is None or lng is None else (float(lat), float(lng))
+    parts = [str(value).lower() for value in address.values() if value]
+    return origin, radius_km, parts
+
+
+def matches_address(provider: Provider, parts: List[str]) -> bool:
+    provider_address = provider.address.lower()
+    return all(part in provider_address for part in parts)
+
+
+class InMemoryProviderRepo(
+    ISpatialProviderRepository[Provider], InterfaceProtocolCheckMixin
+):
+    """Provider repository answering proximity queries from a columnar snapshot.
+
+    Load it from the provider table with `load` and keep it in sync with
+    `track_provider_changes`, or feed it directly with `upsert` / `remove`.
+    Writes from other processes are picked up by reloading, see
+    SnapshotReloader.
+    Every load or change publishes a new SnapshotView with a single assignment,
+    so searches running on other threads never see a half applied update.
+
+    Once a view needs compaction, it is compacted on a worker thread while the
+    event loop keeps applying changes, then swapped in with those changes
+    replayed on top. Without a running event loop it is compacted in place.
+    """
+
+    def __init__(self, cell_size_km: float = 5.0) -> None:
+        self._cell_size_km = cell_size_km
+        self._view = SnapshotView(ProviderSnapshot(cell_size_km))
+        self._compaction: asyncio.Future[ProviderSnapshot] | None = None
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    @property
+    def view(self) -> SnapshotView:
+        return self._view
+
+    def get(self, provider_id: ProviderId) -> Provider | None:
+        return self._view.get(provider_id)
+
+    def upsert(self, provider_id: ProviderId, provider: Provider) -> None:
+        self.apply_changes([(provider_id, provider)])
+
+    def remove(self, provider_id: ProviderId) -> None:
+        self.apply_changes([(provider_id, None)])
+
+    def apply_changes(self, changes: Iterable[ProviderChange]) -> None:
+        """Applies upserts, or removals for changes without a provider."""
+        self._view = self._view.with_changes(changes)
+        if self._view.needs_compaction and self._compaction is None:
+            self._compact()
+
+    def _compact(self) -> None:
+        view = self._view
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._view = SnapshotView(view.compacted())
+            return
+        self._compaction = loop.run_in_executor(None, view.compacted)
+        self._compaction.add_done_callback(
+            lambda compaction: self._swap_compacted(view, compaction)
+        )
+
+    def _swap_compacted(
+        self, source: SnapshotView, compaction: asyncio.Future[ProviderSnapshot]
+    ) -> None:
+        self._compaction = None
+        if compaction.cancelled() or self._view.base is not source.base:
+            # Reloaded while compacting.
+            return
+        if (error := compaction.exception()) is not None:
+            repository_logger.error("Provider snapshot compaction failed: %r", error)
+            return
+        self._view = self._view.rebased(compaction.result(), source)
+        if self._view.needs_compaction:
+            self._compact()
+
+    async def wait_compacted(self) -> None:
+        """Waits for a running compaction to be swapped in."""
+        while (compaction := self._compaction) is not None:
+            await asyncio.wait([compaction])
+            # Let the done callback swap it in.
+            await asyncio.sleep(0)
+
+    def bulk_load(self, rows: Iterable[models.Provider]) -> None:
+        self.apply_changes((row.provider_id, provider_from_row(row)) for row in rows)
+
+    async def load(self, session: AsyncSessionWrapper) -> None:
+        """Replaces the snapshot with one of every row in the provider table."""
+        self._view = SnapshotView(await load_snapshot(session, self._cell_size_km))
+
+    def fetch_within_radius(
+        self, geo_location: GeoLocation, radius_km: float
+    ) -> List[Tuple[Provider, float]]:
+        return [
+            (snapshot.provider(position), distance)
+            for snapshot, position, distance in self._view.within_radius(
+                geo_location, radius_km
+            )
+        ]
+
+    def fetch_candidates_within_radius(
+        self,
+        geo_location: GeoLocation,
+        radius_km: float,
+        provider_filter: ProviderFilter | None = None,
+    ) -> SnapshotCandidates:
+        """Candidates within radius_km, searched with the plan of plan_search."""
+        return SnapshotCandidates(
+            search_view(self._view, geo_location, radius_km, provider_filter)
+        )
+
+    def fetch_by_specialties(
+        self, specialties: Collection[str], match_all: bool = True
+    ) -> List[Provider]:
+        """Providers offering all (or with match_all=False any) specialties.
+
+        Specialties match case insensitively and include doctor specialties.
+        """
+        return [
+            snapshot.provider(position)
+            for snapshot, position in self._view.with_specialties(
+                specialties, match_all
+            )
+        ]
+
+    def fetch_nearest(
+        self, geo_location: GeoLocation, k: int
+    ) -> List[Tuple[Provider, float]]:
+        return [
+            (snapshot.provider(position), distance)
+            for snapshot, position, distance in self._view.nearest(geo_location, k)
+        ]
+
+    def fetch_by_providers(self, **address: dict[str, str]) -> List[Provider]:
+        """Providers matching an address, see `split_address`."""
+        origin, radius_km, parts = split_address(address)
+        if origin is None:
+            candidates = [provider for _, provider in self._view.providers()]
+        else:
+            candidates = [
+                provider for provider, _ in self.fetch_within_radius(origin, radius_km)
+            ]
+        return [provider for provider in candidates if matches_address(provider, parts)]
+
+    def fetch_by_query(
+        self, query_id: str, filtered_providers: List[Provider]
+    ) -> List[Provider]:
+        return filtered_providers
+
+
+class SqliteProviderRepo(
+    IAsyncSpatialProviderRepository[Provider], InterfaceProtocolCheckMixin
+):
+    """Provider repository over the SpatiaLite provider table.
+
+    Proximity queries first select candidate rows from the R-tree spatial index
+    on provider.geopoint with the bounding box of the search circle, then run
+    the exact distance check on those candidates only. Without the index
+    (use_spatial_index=False) every row is read and checked.
+
+    Provider filters are pushed down into the same statement, see
+    filter_clauses, leaving SQLite's planner to choose between the R-tree and
+    the facility type / ownership / stars index from the ANALYZE statistics.
+    """
+
+    def __init__(
+        self, session: AsyncSessionWrapper, use_spatial_index: bool = True
+    ) -> None:
+        self._session = session
+        self._use_spatial_index = use_spatial_index
+
+    @staticmethod
+    def bounding_box_clause(
+        geo_location: GeoLocation, radius_km: float
+    ) -> ColumnElement[bool]:
+        """R-tree prefilter for provider rows inside a circle's bounding box."""
+        min_lat, max_lat, lng_ranges = bounding_box(geo_location, radius_km)
+        min_lat, max_lat = min_lat - RTREE_SLACK_DEG, max_lat + RTREE_SLACK_DEG
+        lng_ranges = [
+            (min_lng - RTREE_SLACK_DEG, max_lng + RTREE_SLACK_DEG)
+            for min_lng, max_lng in lng_ranges
+        ]
+        clauses: List[ColumnElement[bool]] = [
+            text(
+                "provider.rowid IN (SELECT pkid FROM idx_provider_geopoint "
+                f"WHERE xmin <= :max_lat_{n} AND xmax >= :min_lat_{n} "
+                f"AND ymin <= :max_lng_{n} AND ymax >= :min_lng_{n})"
+            ).bindparams(
+                **{
+                    f"min_lat_{n}": min_lat,
+                    f"max_lat_{n}": max_lat,
+                    f"min_lng_{n}": min_lng,
+                    f"max_lng_{n}": max_lng,
+                }
+            )
+            for n, (min_lng, max_lng) in enumerate(lng_ranges)
+        ]
+        return or_(*clauses)
+
+    @staticmethod
+    def filter_clauses(provider_filter: ProviderFilter) -> List[ColumnElement[bool]]:
+        """SQL predicates on provider rows for a provider filter."""
+        provider = models.Provider
+        clauses: List[ColumnElement[bool]] = []
+        if provider_filter.facility_types:
+            clauses.append(
+                provider.facility_type.in_(  # type: ignore[attr-defined]
+                    sorted(kind.value for kind in provider_filter.facility_types)
+                )
+            )
+        if provider_filter.ownerships:
+            clauses.append(
+                provider.ownership_type.in_(  # type: ignore[attr-defined]
+                    sorted(kind.value for kind in provider_filter.ownerships)
+                )
+            )
+        if provider_filter.min_stars is not None:
+            clauses.append(provider.stars >= provider_filter.min_stars)  # type: ignore[arg-type]
+        if provider_filter.specialties:
+            specialties = [
+                text(SPECIALTY_SQL.format(n=n)).bindparams(
+                    **{f"specialty_{n}": normalize_specialty(name)}
+                )
+                for n, name in enumerate(sorted(provider_filter.specialties))
+            ]
+            clauses.append(
+                and_(*specialties)
+                if provider_filter.match_all_specialties
+                else or_(*specialties)
+            )
+        if provider_filter.max_fee is not None:
+            clauses.append(
+                text(MAX_FEE_SQL).bindparams(max_fee=provider_filter.max_fee)
+            )
+        return clauses
+
+    async def _candidates(
+        self,
+        geo_location: GeoLocation,
+        radius_km: float,
+        provider_filter: ProviderFilter | None = None,
+    ) -> List[Tuple[Provider, float]]:
+        stmt = select(models.Provider)
+        if self._use_spatial_index:
+            stmt = stmt.where(self.bounding_box_clause(geo_location, radius_km))
+        if provider_filter is not None:
+            stmt = stmt.where(*self.filter_clauses(provider_filter))
+        rows = await self._session.exec(stmt)
+        return [
+            (provider, haversine_km(geo_location, provider.geo_location))
+            for provider in map(provider_from_row, rows)
+        ]
+
+    async def fetch_within_radius(
+        self,
+        geo_location: GeoLocation,
+        radius_km: float,
+        provider_filter: ProviderFilter | None = None,
+    ) -> List[Tuple[Provider, float]]:
+        candidates = await self._candidates(geo_location, radius_km, provider_filter)
+        return sorted(
+            (match for match in candidates if match[1] <= radius_km),
+            key=lambda match: match[1],
+        )
+
+    async def fetch_nearest(
+        self, geo_location: GeoLocation, k: int
+    ) -> List[Tuple[Provider, float]]:
+        radius_km = NEAREST_START_RADIUS_KM
+        while True:
+            within = await self.fetch_within_radius(geo_location, radius_km)
+            if len(within) >= k or radius_km >= MAX_SEARCH_RADIUS_KM:
+                return within[:k]
+            radius_km = min(radius_km * 4, MAX_SEARCH_RADIUS_KM)
+
+    async def fetch_by_providers(self, **address: dict[str, str]) -> List[Provider]:
+        """Providers matching an address, see `split_address`."""
+        origin, radius_km, parts = split_address(address)
+        if origin is None:
+            rows = await self._session.exec(select(models.Provider))
+            candidates = [provider_from_row(row) for row in rows]
+        else:
+            candidates = [
+                provider
+                for provider, _ in await self.fetch_within_radius(origin, radius_km)
+            ]
+        return [provider for provider in candidates if matches_address(provider, parts)]
+
+    async def fetch_by_query(
+        self, query_id: str, filtered_providers: List[Provider]
+    ) -> List[Provider]:
+        return filtered_providers
+
+
+# Repos kept in sync with the provider table, see track_provider_changes.
+_tracked_repos: weakref.WeakSet[InMemoryProviderRepo] = weakref.WeakSet()
+PROVIDER_CHANGES_KEY = "provider_changes"
+
+
+def track_provider_changes(repo: InMemoryProviderRepo) -> None:
+    """Keeps repo in sync with committed ORM writes to the provider table.
+
+    Changes are staged per session during flush and only applied to the index
+    once the transaction commits, so rolled back writes never leak into it.
+    The listeners are registered once for every tracked repo, and repos are
+    held weakly, so tracking does not keep them alive.
+    """
+    _tracked_repos.add(repo)
+
+
+def untrack_provider_changes(repo: InMemoryProviderRepo) -> None:
+    _tracked_repos.discard(repo)
+
+
+def _stage(target: models.Provider, provider: Provider | None) -> None:
+    if _tracked_repos and (session := object_session(target)) is not None:
+        session.info.setdefault(PROVIDER_CHANGES_KEY, []).append(
+            (target.provider_id, provider)
+        )
+
+
+@event.listens_for(models.Provider, "after_insert")
+@event.listens_for(models.Provider, "after_update")
+def _stage_upsert(_mapper: Mapper, _connection, target: models.Provider) -> None:
+    _stage(target, provider_from_row(target))
+
+
+@event.listens_for(models.Provider, "after_delete")
+def _stage_delete(_mapper: Mapper, _connection, target: models.Provider) -> None:
+    _stage(target, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_staged(session: Session) -> None:
+    changes = session.info.pop(PROVIDER_CHANGES_KEY, ())
+    if changes:
+        for repo in list(_tracked_repos):
+            repo.apply_changes(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged(session: Session) -> None:
+    session.info.pop(PROVIDER_CHANGES_KEY, None)
@@ -0,0 +1,162 @@
+"""Two tier cache of facilities found for a customer's query.
+
+The memory tier is an LRU serving repeated polls of the same query. The SQLite
+tier keeps results across restarts and for queries evicted from memory. Both
+tiers expire entries after ttl_seconds; expired rows are deleted periodically.
+Both hold the results serialized to JSON, so responses are sent as stored.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Iterable, List, Tuple
+
+from pydantic import TypeAdapter
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.dto import FacilitiesResult
+from xcov19.infra import models
+from xcov19.services.geolocation import SERIALIZATION_SECONDS
+from xcov19.utils.cache import TTLCache
+
+result_logger = logging.getLogger(__name__)
+
+type ResultKey = Tuple[str, str]
+
+facilities_adapter = TypeAdapter(List[FacilitiesResult])
+
+
+class FacilitiesResultStore:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSessionWrapper],
+        cache_size: int = 10_000,
+        ttl_seconds: float = 60 * 60,
+        eviction_interval_seconds: float = 5 * 60,
+    ) -> None:
+        self._session_factory = session_factory
+        self._ttl = ttl_seconds
+        self._eviction_interval = eviction_interval_seconds
+        # Wall clock, so memory and database entries expire together.
+        self.cache: TTLCache[ResultKey, bytes] = TTLCache(
+            cache_size, ttl_seconds, clock=time.time
+        )
+        self.db_hits = 0
+        self.db_misses = 0
+        self.expired_rows = 0
+        self._eviction_task: asyncio.Task | None = None
+
+    @property
+    def hits(self) -> int:
+        return self.cache.hits + self.db_hits
+
+    @property
+    def misses(self) -> int:
+        return self.db_misses
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    async def get(self, cust_id: str, query_id: str) -> List[FacilitiesResult] | None:
+        """Returns cached results, or None when the query has none or expired."""
+        results = await self.get_json(cust_id, query_id)
+        return None if results is None else facilities_adapter.validate_json(results)
+
+    async def get_json(self, cust_id: str, query_id: str) -> bytes | None:
+        """Returns cached results as JSON, without parsing them."""
+        key = (cust_id, query_id)
+        if (results := self.cache.get(key)) is not None:
+            return results
+        async with self._session_factory() as session:
+            row = (
+                await session.exec(
+                    select(models.FacilitiesResultSet).where(
+                        models.FacilitiesResultSet.cust_id == cust_id,
+                        models.FacilitiesResultSet.query_id == query_id,
+                        models.FacilitiesResultSet.expires_at > time.time(),
+                    )
+                )
+            ).first()
+        if row is None:
+            self.db_misses += 1
+            return None
+        self.db_hits += 1
+        self.cache.set(key, row.results)
+        return row.results
+
+    async def put(
+        self, cust_id: str, query_id: str, results: List[FacilitiesResult]
+    ) -> None:
+        await self.put_many([(cust_id, query_id, results)])
+
+    async def put_many(
+        self, entries: Iterable[Tuple[str, str, List[FacilitiesResult]]]
+    ) -> None:
+        """Stores the results of several queries in a single transaction."""
+        expires_at = time.time() + self._ttl
+        with SERIALIZATION_SECONDS.time():
+            rows = [
+                {
+                    "cust_id": cust_id,
+                    "query_id": query_id,
+                    "results": facilities_adapter.dump_json(results),
+                    "expires_at": expires_at,
+                }
+                for cust_id, query_id, results in entries
+            ]
+        if not rows:
+            return
+        upsert = insert(models.FacilitiesResultSet)
+        async with self._session_factory() as session:
+            await session.exec(
+                upsert.on_conflict_do_update(
+                    index_elements=["cust_id", "query_id"],
+                    set_={
+                        "results": upsert.excluded.results,
+                        "expires_at": upsert.excluded.expires_at,
+                    },
+                ),
+                params=rows,
+            )
+            await session.commit()
+        # Only once committed, memory never serves results the database lost.
+        for row in rows:
+            self.cache.set((row["cust_id"], row["query_id"]), row["results"])
+
+    async def evict_expired(self) -> int:
+        """Deletes expired rows, returning how many were removed."""
+        async with self._session_factory() as session:
+            result = await session.exec(
+                delete(models.FacilitiesResultSet).where(
+                    models.FacilitiesResultSet.expires_at <= time.time()  # type: ignore[arg-type]
+                )
+            )
+            await session.commit()
+        self.expired_rows += result.rowcount
+        return result.rowcount
+
+    async def _evict_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._eviction_interval)
+            try:
+                await self.evict_expired()
+            except Exception:
+                result_logger.exception("Evicting expired facilities results failed.")
+
+    def start(self) -> None:
+        if self._eviction_task is None:
+            self._eviction_task = asyncio.create_task(
+                self._evict_periodically(), name="facilities-result-eviction"
+            )
+
+    async def stop(self) -> None:
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            await asyncio.gather(self._eviction_task, return_exceptions=True)
+            self._eviction_task = None
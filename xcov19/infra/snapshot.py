@@ -0,0 +1,601 @@
+"""Read optimized, columnar snapshot of the provider registry.
+
+Searched fields are held as parallel arrays (struct of arrays): coordinates,
+stars, reviews, and facility type and ownership as small integer codes into
+interned enum tuples. Everything else lives in a slotted ProviderRecord, with
+available doctors kept as their raw JSON text. Searches and ranking read the
+arrays only; domain Provider objects are built just for the results returned.
+A SpecialtyIndex and an AttributeIndex over the same positions answer
+specialty, facility type, ownership and stars filters, see query_planner.
+
+A snapshot is never modified once published, so readers on other threads can
+keep using the one they hold while a newer one is swapped in. Committed
+changes are layered on top as small segment snapshots, see SnapshotView.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import heapq
+import json
+import math
+import sys
+from array import array
+from typing import Collection, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+from sqlalchemy import LargeBinary, Text, func, select, type_coerce
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.domain.models import GeoLocation
+from xcov19.domain.models.provider import (
+    Contact,
+    Doctor,
+    FacilityEstablishment,
+    FacilityOwnership,
+    Provider,
+)
+from xcov19.infra import models
+from xcov19.infra.spatial import PositionGridIndex
+from xcov19.infra.specialty_index import SpecialtyIndex, normalize_specialties
+
+type ProviderId = str
+
+FACILITY_TYPES: Tuple[FacilityEstablishment, ...] = tuple(FacilityEstablishment)
+OWNERSHIPS: Tuple[FacilityOwnership, ...] = tuple(FacilityOwnership)
+FACILITY_TYPE_CODES = {value: code for code, value in enumerate(FACILITY_TYPES)}
+OWNERSHIP_CODES = {value: code for code, value in enumerate(OWNERSHIPS)}
+
+LOAD_BATCH_SIZE = 10_000
+# Segments are not merged into ones larger than this, bounding the time a
+# commit spends merging them to a few milliseconds.
+MAX_SEGMENT_MERGE = 2048
+
+type AttributeKey = Tuple[str, int]
+
+
+def summarize_doctors(doctors_json: str) -> Tuple[List[str], float]:
+    """Specialties of all doctors in an available_doctors JSON list, and the
+    lowest fee among them (infinite without doctors)."""
+    if doctors_json in ("", "[]"):
+        return [], math.inf
+    doctors = json.loads(doctors_json)
+    return (
+        [
+            specialty
+            for doctor in doctors
+            for specialty in doctor.get("specialties") or ()
+        ],
+        min((doctor["fee"] for doctor in doctors), default=math.inf),
+    )
+
+
+class AttributeIndex:
+    """Sorted positions per (attribute, code) for facility type, ownership and
+    stars, e.g. ("stars", 4)."""
+
+    __slots__ = ("_postings",)
+
+    _EMPTY = array("I")
+
+    def __init__(self) -> None:
+        self._postings: Dict[AttributeKey, array] = {}
+
+    def add(self, position: int, keys: Iterable[AttributeKey]) -> None:
+        for key in keys:
+            postings = self._postings.get(key)
+            if postings is None:
+                postings = self._postings[key] = array("I")
+            postings.append(position)
+
+    def positions(self, attribute: str, code: int) -> array:
+        return self._postings.get((attribute, code), self._EMPTY)
+
+
+class ProviderRecord:
+    """Provider fields that are only needed to build results."""
+
+    __slots__ = ("provider_id", "name", "address", "contact", "doctors_json")
+
+    def __init__(
+        self,
+        provider_id: ProviderId,
+        name: str,
+        address: str,
+        contact: str,
+        doctors_json: str,
+    ) -> None:
+        self.provider_id = provider_id
+        self.name = name
+        self.address = address
+        self.contact = contact
+        self.doctors_json = doctors_json
+
+
+class ProviderSnapshot:
+    """Columnar provider registry with a grid index over row positions.
+
+    The grid index reads coordinates from lats and lngs rather than keeping
+    its own copy of them.
+    """
+
+    __slots__ = (
+        "cell_size_km",
+        "positions",
+        "lats",
+        "lngs",
+        "stars",
+        "reviews",
+        "facility_types",
+        "ownerships",
+        "min_fees",
+        "specialties",
+        "indexed_specialties",
+        "records",
+        "index",
+        "specialty_index",
+        "attribute_index",
+        "_specialty_sets",
+    )
+
+    def __init__(self, cell_size_km: float = 5.0) -> None:
+        self.cell_size_km = cell_size_km
+        self.positions: Dict[ProviderId, int] = {}
+        self.lats = array("d")
+        self.lngs = array("d")
+        self.stars = array("b")
+        self.reviews = array("q")
+        self.facility_types = array("B")
+        self.ownerships = array("B")
+        # Lowest doctor fee of each provider, inf when it lists no doctors.
+        self.min_fees = array("d")
+        # Tuples of interned names, shared by every provider with the same set.
+        self.specialties: List[Tuple[str, ...]] = []
+        # Normalized provider and doctor specialties each position is indexed
+        # under, so copying a provider does not decode its doctors again.
+        self.indexed_specialties: List[Tuple[str, ...]] = []
+        self.records: List[ProviderRecord] = []
+        self.index = PositionGridIndex(self.lats, self.lngs, cell_size_km)
+        self.specialty_index = SpecialtyIndex()
+        self.attribute_index = AttributeIndex()
+        self._specialty_sets: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, provider_id: object) -> bool:
+        return provider_id in self.positions
+
+    def append(
+        self,
+        provider_id: ProviderId,
+        name: str,
+        address: str,
+        geo_location: GeoLocation,
+        contact: str,
+        facility_type: str,
+        ownership: str,
+        specialties: Sequence[str],
+        stars: int,
+        reviews: int,
+        doctors_json: str,
+        doctor_specialties: Iterable[str] = (),
+        min_fee: float = math.inf,
+    ) -> None:
+        """Adds a provider while the snapshot is being built.
+
+        The provider is indexed under its own and its doctors' specialties.
+        """
+        position = len(self.records)
+        lat, lng = geo_location
+        self.positions[provider_id] = position
+        self.lats.append(lat)
+        self.lngs.append(lng)
+        self.stars.append(stars)
+        self.reviews.append(reviews)
+        facility_type_code = FACILITY_TYPE_CODES[FacilityEstablishment(facility_type)]
+        ownership_code = OWNERSHIP_CODES[FacilityOwnership(ownership)]
+        self.facility_types.append(facility_type_code)
+        self.ownerships.append(ownership_code)
+        self.min_fees.append(min_fee)
+        names = self._shared(specialties)
+        self.specialties.append(names)
+        indexed = self._shared(
+            sorted(normalize_specialties((*names, *doctor_specialties)))
+        )
+        self.indexed_specialties.append(indexed)
+        self.records.append(
+            ProviderRecord(provider_id, name, address, contact, doctors_json)
+        )
+        self.index.add(position)
+        self.specialty_index.add(position, indexed)
+        self.attribute_index.add(
+            position,
+            (
+                ("facility_type", facility_type_code),
+                ("ownership", ownership_code),
+                ("stars", stars),
+            ),
+        )
+
+    def _shared(self, names: Iterable[str]) -> Tuple[str, ...]:
+        """Tuple of interned names, shared by every equal tuple."""
+        shared = tuple(sys.intern(name) for name in names)
+        return self._specialty_sets.setdefault(shared, shared)
+
+    def append_provider(self, provider_id: ProviderId, provider: Provider) -> None:
+        self.append(
+            provider_id,
+            provider.name,
+            provider.address,
+            provider.geo_location,
+            provider.contact.value,
+            provider.facility_type,
+            provider.ownership,
+            provider.specialties,
+            provider.stars,
+            provider.reviews,
+            json.dumps(
+                [dataclasses.asdict(doctor) for doctor in provider.available_doctors]
+            ),
+            [
+                specialty
+                for doctor in provider.available_doctors
+                for specialty in doctor.specialties
+            ],
+            min(
+                (doctor.fee for doctor in provider.available_doctors), default=math.inf
+            ),
+        )
+
+    def copy_from(self, other: ProviderSnapshot, position: int) -> None:
+        """Appends a provider of another snapshot without decoding it."""
+        record = other.records[position]
+        self.append(
+            record.provider_id,
+            record.name,
+            record.address,
+            (other.lats[position], other.lngs[position]),
+            record.contact,
+            FACILITY_TYPES[other.facility_types[position]],
+            OWNERSHIPS[other.ownerships[position]],
+            other.specialties[position],
+            other.stars[position],
+            other.reviews[position],
+            record.doctors_json,
+            other.indexed_specialties[position],
+            other.min_fees[position],
+        )
+
+    @classmethod
+    def from_providers(
+        cls, providers: Iterable[Tuple[ProviderId, Provider]], cell_size_km: float = 5.0
+    ) -> ProviderSnapshot:
+        snapshot = cls(cell_size_km)
+        for provider_id, provider in providers:
+            snapshot.append_provider(provider_id, provider)
+        return snapshot
+
+    def provider_id(self, position: int) -> ProviderId:
+        return self.records[position].provider_id
+
+    def provider(self, position: int) -> Provider:
+        """Builds the domain Provider at a position."""
+        record = self.records[position]
+        return Provider(
+            name=record.name,
+            address=record.address,
+            geo_location=(self.lats[position], self.lngs[position]),
+            contact=Contact(record.contact),
+            facility_type=FACILITY_TYPES[self.facility_types[position]],
+            ownership=OWNERSHIPS[self.ownerships[position]],
+            specialties=list(self.specialties[position]),
+            available_doctors=[
+                Doctor(**doctor) for doctor in json.loads(record.doctors_json)
+            ],
+            stars=self.stars[position],
+            reviews=self.reviews[position],
+        )
+
+
+type Hit = Tuple[ProviderSnapshot, int, float]
+
+
+class SnapshotCandidates:
+    """Columns of the providers a snapshot search found, by ascending distance."""
+
+    __slots__ = (
+        "_hits",
+        "lats",
+        "lngs",
+        "stars",
+        "reviews",
+        "specialties",
+        "distances_km",
+    )
+
+    def __init__(self, hits: List[Hit]) -> None:
+        self._hits = hits
+        self.lats = [snapshot.lats[position] for snapshot, position, _ in hits]
+        self.lngs = [snapshot.lngs[position] for snapshot, position, _ in hits]
+        self.stars = [snapshot.stars[position] for snapshot, position, _ in hits]
+        self.reviews = [snapshot.reviews[position] for snapshot, position, _ in hits]
+        # What specialty filters match: normalized, including doctors'.
+        self.specialties = [
+            snapshot.indexed_specialties[position] for snapshot, position, _ in hits
+        ]
+        self.distances_km = [distance for _, _, distance in hits]
+
+    def __len__(self) -> int:
+        return len(self._hits)
+
+    def provider_id(self, index: int) -> ProviderId:
+        snapshot, position, _ = self._hits[index]
+        return snapshot.provider_id(position)
+
+    def provider(self, index: int) -> Provider:
+        snapshot, position, _ = self._hits[index]
+        return snapshot.provider(position)
+
+
+class SnapshotView:
+    """A published snapshot plus the provider changes committed since.
+
+    Changed providers are shadowed in the base snapshot and served from
+    segments, small snapshots of the providers each batch of changes upserted.
+    A new view only builds the segment of its own changes, then merges trailing
+    segments of similar size up to MAX_SEGMENT_MERGE rows, dropping rows
+    superseded since. Once the changes grow past
+    compact_after, compacted() folds everything into a new base snapshot, see
+    InMemoryProviderRepo for when that runs.
+    """
+
+    __slots__ = ("base", "changes", "segments", "_owners", "_shadowed")
+
+    def __init__(
+        self,
+        base: ProviderSnapshot,
+        changes: Mapping[ProviderId, Provider | None] | None = None,
+        segments: Tuple[ProviderSnapshot, ...] = (),
+        owners: Mapping[ProviderId, ProviderSnapshot] | None = None,
+        shadowed: int = 0,
+    ) -> None:
+        self.base = base
+        self.changes: Mapping[ProviderId, Provider | None] = changes or {}
+        self.segments = segments
+        # Segment serving the current version of each upserted provider.
+        self._owners: Mapping[ProviderId, ProviderSnapshot] = owners or {}
+        # Providers of the base snapshot that changes replace or remove.
+        self._shadowed = shadowed
+
+    def __len__(self) -> int:
+        return len(self.base) - self._shadowed + len(self._owners)
+
+    @property
+    def compact_after(self) -> int:
+        return max(1024, len(self.base) // 50)
+
+    @property
+    def needs_compaction(self) -> bool:
+        return len(self.changes) >= self.compact_after
+
+    def get(self, provider_id: ProviderId) -> Provider | None:
+        if provider_id in self.changes:
+            return self.changes[provider_id]
+        position = self.base.positions.get(provider_id)
+        return None if position is None else self.base.provider(position)
+
+    def _live(self, segment: ProviderSnapshot) -> Iterator[Tuple[ProviderId, int]]:
+        """Providers of a segment that no later segment superseded."""
+        owners = self._owners
+        for provider_id, position in segment.positions.items():
+            if owners.get(provider_id) is segment:
+                yield provider_id, position
+
+    def providers(self) -> Iterator[Tuple[ProviderId, Provider]]:
+        for provider_id, position in self.base.positions.items():
+            if provider_id not in self.changes:
+                yield provider_id, self.base.provider(position)
+        for segment in self.segments:
+            for provider_id, position in self._live(segment):
+                yield provider_id, segment.provider(position)
+
+    def snapshots(self) -> Tuple[ProviderSnapshot, ...]:
+        """The base snapshot followed by the segments."""
+        return (self.base, *self.segments)
+
+    def visible(self, snapshot: ProviderSnapshot, matches) -> Iterator[Hit]:
+        """Hits for (position, distance) matches not shadowed by changes."""
+        if snapshot is self.base:
+            changes = self.changes
+            for position, distance in matches:
+                if snapshot.provider_id(position) not in changes:
+                    yield snapshot, position, distance
+            return
+        owners = self._owners
+        for position, distance in matches:
+            if owners.get(snapshot.provider_id(position)) is snapshot:
+                yield snapshot, position, distance
+
+    def within_radius(self, center: GeoLocation, radius_km: float) -> List[Hit]:
+        """Providers within radius_km of center by ascending distance."""
+        hits = [
+            hit
+            for snapshot in self.snapshots()
+            for hit in self.visible(
+                snapshot, snapshot.index.within_radius(center, radius_km)
+            )
+        ]
+        if self.segments:
+            hits.sort(key=lambda hit: hit[2])
+        return hits
+
+    def with_specialties(
+        self, specialties: Collection[str], match_all: bool = True
+    ) -> List[Tuple[ProviderSnapshot, int]]:
+        """Providers offering all (or with match_all=False any) specialties."""
+        found = []
+        for snapshot in self.snapshots():
+            positions = snapshot.specialty_index.matching(specialties, match_all)
+            found.extend(
+                (snapshot, position)
+                for _, position, _ in self.visible(
+                    snapshot, ((position, 0.0) for position in positions)
+                )
+            )
+        return found
+
+    def nearest(self, center: GeoLocation, k: int) -> List[Hit]:
+        # Shadowed and superseded providers may take some of the k nearest
+        # places of their snapshot.
+        hidden = self._shadowed + sum(map(len, self.segments)) - len(self._owners)
+        return heapq.nsmallest(
+            k,
+            (
+                hit
+                for snapshot in self.snapshots()
+                for hit in self.visible(
+                    snapshot, snapshot.index.nearest(center, k + hidden)
+                )
+            ),
+            key=lambda hit: hit[2],
+        )
+
+    def with_changes(
+        self, changes: Iterable[Tuple[ProviderId, Provider | None]]
+    ) -> SnapshotView:
+        """A new view with changes applied on top of this one."""
+        batch = dict(changes)
+        if not batch:
+            return self
+        base, cell_size_km = self.base, self.base.cell_size_km
+        segment = ProviderSnapshot.from_providers(
+            (
+                (provider_id, provider)
+                for provider_id, provider in batch.items()
+                if provider is not None
+            ),
+            cell_size_km,
+        )
+        owners = dict(self._owners)
+        for provider_id, provider in batch.items():
+            if provider is None:
+                owners.pop(provider_id, None)
+            else:
+                owners[provider_id] = segment
+        segments = [*self.segments, segment] if len(segment) else [*self.segments]
+        while (
+            len(segments) > 1
+            and len(segments[-2]) <= len(segments[-1])
+            and len(segments[-2]) + len(segments[-1]) <= MAX_SEGMENT_MERGE
+        ):
+            merged = ProviderSnapshot(cell_size_km)
+            for older in segments[-2:]:
+                for provider_id, position in older.positions.items():
+                    if owners.get(provider_id) is older:
+                        merged.copy_from(older, position)
+                        owners[provider_id] = merged
+            segments[-2:] = [merged]
+        shadowed = self._shadowed + sum(
+            1
+            for provider_id in batch
+            if provider_id not in self.changes and provider_id in base
+        )
+        return SnapshotView(
+            base, {**self.changes, **batch}, tuple(segments), owners, shadowed
+        )
+
+    def compacted(self) -> ProviderSnapshot:
+        """A snapshot of every provider of the view.
+
+        Reads the view only, so it can run on another thread.
+        """
+        compacted = ProviderSnapshot(self.base.cell_size_km)
+        for provider_id, position in self.base.positions.items():
+            if provider_id not in self.changes:
+                compacted.copy_from(self.base, position)
+        for segment in self.segments:
+            for _, position in self._live(segment):
+                compacted.copy_from(segment, position)
+        return compacted
+
+    def rebased(
+        self, compacted: ProviderSnapshot, source: SnapshotView
+    ) -> SnapshotView:
+        """This view over compacted, the compaction of an older view source.
+
+        Changes applied since source are replayed on top of compacted.
+        """
+        missing = object()
+        later = [
+            (provider_id, provider)
+            for provider_id, provider in self.changes.items()
+            if source.changes.get(provider_id, missing) is not provider
+        ]
+        return SnapshotView(compacted).with_changes(later)
+
+
+def append_rows(snapshot: ProviderSnapshot, rows: Sequence[Sequence]) -> None:
+    """Appends provider rows selected by load_snapshot to snapshot."""
+    geopoints = models.decode_points([row[3] for row in rows])
+    for (
+        provider_id,
+        name,
+        address,
+        _,
+        contact,
+        facility_type,
+        ownership,
+        specialties,
+        stars,
+        reviews,
+        doctors_json,
+    ), geopoint in zip(rows, geopoints):
+        snapshot.append(
+            provider_id,
+            name,
+            address,
+            geopoint,
+            str(contact),
+            facility_type,
+            ownership,
+            specialties,
+            stars,
+            reviews,
+            doctors_json or "[]",
+            *summarize_doctors(doctors_json or "[]"),
+        )
+
+
+async def load_snapshot(
+    session: AsyncSessionWrapper,
+    cell_size_km: float = 5.0,
+    batch_size: int = LOAD_BATCH_SIZE,
+) -> ProviderSnapshot:
+    """Builds a snapshot from the provider table, streaming rows in batches.
+
+    Reads plain column tuples rather than ORM objects. Geopoints are read as
+    WKB blobs and decoded a batch at a time by decode_points. The available
+    doctors JSON is decoded only to index doctor specialties and fees and is
+    kept as text. Batches are appended on a worker thread, the snapshot is not
+    published until it is complete.
+    """
+    table = models.Provider.__table__
+    statement = select(
+        table.c.provider_id,
+        table.c.name,
+        table.c.address,
+        func.AsBinary(table.c.geopoint, type_=LargeBinary),
+        table.c.contact,
+        table.c.facility_type,
+        table.c.ownership_type,
+        table.c.specialties,
+        table.c.stars,
+        table.c.reviews,
+        type_coerce(table.c.available_doctors, Text),
+    )
+    snapshot = ProviderSnapshot(cell_size_km)
+    result = await session.stream(statement)
+    async for rows in result.partitions(batch_size):
+        await asyncio.to_thread(append_rows, snapshot, rows)
+    return snapshot
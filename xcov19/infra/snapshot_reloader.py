@@ -0,0 +1,86 @@
+"""Periodic reload of the in-memory provider snapshot.
+
+InMemoryProviderRepo only follows provider writes committed through the ORM
+in this process, see track_provider_changes. Bulk imports run in other
+processes with Core statements, so the reloader polls the write counter SQL
+triggers keep in providerversion, see setup_provider_version, and rebuilds
+the snapshot once it moved. The new snapshot is built off the event loop and
+swapped in with a single assignment.
+"""
+
+import asyncio
+import logging
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.infra import models
+from xcov19.infra.repository import InMemoryProviderRepo
+
+reloader_logger = logging.getLogger(__name__)
+
+
+class SnapshotReloader:
+    """Reloads an InMemoryProviderRepo whenever the provider table changed.
+
+    The counter is read before loading, so writes committed while a snapshot
+    is being built, which it may have missed, trigger the next reload.
+    """
+
+    def __init__(
+        self,
+        repo: InMemoryProviderRepo,
+        session_factory: async_sessionmaker[AsyncSessionWrapper],
+        interval_seconds: float = 30.0,
+    ) -> None:
+        self._repo = repo
+        self._session_factory = session_factory
+        self._interval = interval_seconds
+        self.version: int | None = None
+        self.reloads = 0
+        self._reload_task: asyncio.Task | None = None
+
+    async def current_version(self) -> int:
+        async with self._session_factory() as session:
+            result = await session.exec(select(models.ProviderVersion.version))
+            return result.first() or 0
+
+    async def reload(self) -> None:
+        """Loads the provider table into the repo unconditionally."""
+        version = await self.current_version()
+        async with self._session_factory() as session:
+            await self._repo.load(session)
+        self.version = version
+        self.reloads += 1
+
+    async def reload_if_changed(self) -> bool:
+        """Reloads the repo if providers were written since the last load."""
+        if await self.current_version() == self.version:
+            return False
+        await self.reload()
+        return True
+
+    async def _reload_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                if await self.reload_if_changed():
+                    reloader_logger.info(
+                        f"Reloaded {len(self._repo)} providers "
+                        f"at version {self.version}."
+                    )
+            except Exception:
+                reloader_logger.exception("Reloading the provider snapshot failed.")
+
+    def start(self) -> None:
+        if self._reload_task is None:
+            self._reload_task = asyncio.create_task(
+                self._reload_periodically(), name="provider-snapshot-reload"
+            )
+
+    async def stop(self) -> None:
+        if self._reload_task is not None:
+            self._reload_task.cancel()
+            await asyncio.gather(self._reload_task, return_exceptions=True)
+            self._reload_task = None
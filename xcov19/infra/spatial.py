@@ -0,0 +1,226 @@
+"""In-process spatial index over geopoints.
+
+Points are bucketed into a fixed grid of square cells (in degrees). A radius
+query only visits the cells overlapping the bounding box of the circle and runs
+the exact haversine check on the points inside them, so lookups stay
+proportional to the local density rather than the size of the registry.
+
+GeoGridIndex keeps its own copy of every point and supports moves and
+removals. PositionGridIndex indexes append-only coordinate arrays it does not
+own, storing just the positions, for columnar snapshots.
+"""
+
+import heapq
+import math
+from abc import ABC, abstractmethod
+from array import array
+from collections import defaultdict
+from typing import (
+    Collection,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Set,
+    Tuple,
+)
+
+from xcov19.domain.models import GeoLocation
+from xcov19.utils.geo import KM_PER_DEGREE_LAT, bounding_box, haversine_km
+
+type Cell = Tuple[int, int]
+
+# Half of the earth's circumference, no two points are further apart.
+MAX_SEARCH_RADIUS_KM = 20038.0
+
+
+class _GridIndex[K](ABC):
+    """Searches over a uniform grid of cells holding keys."""
+
+    __slots__ = ("_cell_deg",)
+
+    def __init__(self, cell_size_km: float) -> None:
+        if cell_size_km <= 0:
+            raise ValueError("cell_size_km must be positive.")
+        self._cell_deg = cell_size_km / KM_PER_DEGREE_LAT
+
+    @property
+    @abstractmethod
+    def _cells(self) -> Mapping[Cell, Collection[K]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _point(self, key: K) -> GeoLocation:
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return (math.floor(lat / self._cell_deg), math.floor(lng / self._cell_deg))
+
+    def _buckets(
+        self, center: GeoLocation, radius_km: float
+    ) -> Iterator[Collection[K]]:
+        """Yields the cells overlapping the bounding box of the circle."""
+        cells = self._cells
+        min_lat, max_lat, lng_ranges = bounding_box(center, radius_km)
+        row_start, row_end = (
+            math.floor(min_lat / self._cell_deg),
+            math.floor(max_lat / self._cell_deg),
+        )
+        for min_lng, max_lng in lng_ranges:
+            col_start, col_end = (
+                math.floor(min_lng / self._cell_deg),
+                math.floor(max_lng / self._cell_deg),
+            )
+            # Scanning occupied cells is cheaper than probing a huge empty window.
+            if (row_end - row_start + 1) * (col_end - col_start + 1) > len(cells):
+                for (row, col), bucket in cells.items():
+                    if row_start <= row <= row_end and col_start <= col <= col_end:
+                        yield bucket
+                continue
+            for row in range(row_start, row_end + 1):
+                for col in range(col_start, col_end + 1):
+                    if bucket := cells.get((row, col)):
+                        yield bucket
+
+    def _candidates(self, center: GeoLocation, radius_km: float) -> Iterator[K]:
+        """Yields keys in cells overlapping the bounding box of the circle."""
+        for bucket in self._buckets(center, radius_km):
+            yield from bucket
+
+    def estimate(self, center: GeoLocation, radius_km: float) -> int:
+        """Upper bound of the keys within radius_km, without distance checks."""
+        return sum(len(bucket) for bucket in self._buckets(center, radius_km))
+
+    def within_radius(
+        self, center: GeoLocation, radius_km: float
+    ) -> List[Tuple[K, float]]:
+        """Keys within radius_km of center sorted by ascending distance."""
+        point = self._point
+        matches = []
+        for key in self._candidates(center, radius_km):
+            distance = haversine_km(center, point(key))
+            if distance <= radius_km:
+                matches.append((key, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+    def nearest(self, center: GeoLocation, k: int) -> List[Tuple[K, float]]:
+        """The k nearest keys to center sorted by ascending distance.
+
+        Expands the search radius until at least k points are found inside it,
+        at which point no point outside the radius can be closer.
+        """
+        if k <= 0 or not len(self):
+            return []
+        point = self._point
+        radius_km = self._cell_deg * KM_PER_DEGREE_LAT
+        while True:
+            distances = (
+                (key, haversine_km(center, point(key)))
+                for key in self._candidates(center, radius_km)
+            )
+            within = [match for match in distances if match[1] <= radius_km]
+            if len(within) >= k or radius_km >= MAX_SEARCH_RADIUS_KM:
+                return heapq.nsmallest(k, within, key=lambda match: match[1])
+            radius_km = min(radius_km * 2, MAX_SEARCH_RADIUS_KM)
+
+
+class GeoGridIndex[K: Hashable](_GridIndex[K]):
+    """Uniform grid index mapping keys to (lat, lng) points.
+
+    Supports incremental upserts and removals so it can be kept in sync with
+    the provider table without a rebuild.
+    """
+
+    __slots__ = ("_key_cells", "_points")
+
+    def __init__(self, cell_size_km: float = 5.0) -> None:
+        super().__init__(cell_size_km)
+        self._key_cells: Dict[Cell, Set[K]] = defaultdict(set)
+        self._points: Dict[K, GeoLocation] = {}
+
+    @property
+    def _cells(self) -> Mapping[Cell, Collection[K]]:
+        return self._key_cells
+
+    def _point(self, key: K) -> GeoLocation:
+        return self._points[key]
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._points
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self._points)
+
+    def get(self, key: K) -> GeoLocation | None:
+        return self._points.get(key)
+
+    def upsert(self, key: K, point: GeoLocation) -> None:
+        """Adds a point or moves an existing key to a new point."""
+        if key in self._points:
+            self.remove(key)
+        lat, lng = point
+        self._points[key] = (lat, lng)
+        self._key_cells[self._cell(lat, lng)].add(key)
+
+    def bulk_load(self, items: Iterable[Tuple[K, GeoLocation]]) -> None:
+        for key, point in items:
+            self.upsert(key, point)
+
+    def remove(self, key: K) -> None:
+        point = self._points.pop(key, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        bucket = self._key_cells[cell]
+        bucket.discard(key)
+        if not bucket:
+            del self._key_cells[cell]
+
+    def clear(self) -> None:
+        self._key_cells.clear()
+        self._points.clear()
+
+
+class PositionGridIndex(_GridIndex[int]):
+    """Grid index over positions of parallel latitude and longitude arrays.
+
+    Cells hold positions only, reading coordinates from the arrays, which are
+    only ever appended to.
+    """
+
+    __slots__ = ("_lats", "_lngs", "_position_cells", "_size")
+
+    def __init__(self, lats: array, lngs: array, cell_size_km: float = 5.0) -> None:
+        super().__init__(cell_size_km)
+        self._lats = lats
+        self._lngs = lngs
+        self._position_cells: Dict[Cell, array] = {}
+        self._size = 0
+
+    @property
+    def _cells(self) -> Mapping[Cell, Collection[int]]:
+        return self._position_cells
+
+    def _point(self, key: int) -> GeoLocation:
+        return (self._lats[key], self._lngs[key])
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, position: int) -> None:
+        """Indexes the coordinates at position of the arrays."""
+        cell = self._cell(self._lats[position], self._lngs[position])
+        if (bucket := self._position_cells.get(cell)) is None:
+            bucket = self._position_cells[cell] = array("I")
+        bucket.append(position)
+        self._size += 1
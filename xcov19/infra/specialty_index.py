@@ -0,0 +1,88 @@
+"""Inverted index from normalized specialty names to provider positions.
+
+Each specialty maps to a sorted array of the snapshot positions of providers
+offering it, either as a provider specialty or through one of its doctors.
+Arrays stay sorted for free because snapshots only ever append positions.
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from typing import Callable, Collection, Dict, Iterable, List, Set
+
+from xcov19.domain.models.provider import normalize_specialty
+
+
+def normalize_specialties(names: Iterable[str]) -> Set[str]:
+    return {normalized for name in names if (normalized := normalize_specialty(name))}
+
+
+def _contains(positions: array, position: int) -> bool:
+    found = bisect_left(positions, position)
+    return found < len(positions) and positions[found] == position
+
+
+class SpecialtyIndex:
+    __slots__ = ("_postings",)
+
+    _EMPTY = array("I")
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def add(self, position: int, specialties: Iterable[str]) -> None:
+        """Indexes a position, which must be larger than any indexed before."""
+        for name in normalize_specialties(specialties):
+            postings = self._postings.get(name)
+            if postings is None:
+                postings = self._postings[name] = array("I")
+            postings.append(position)
+
+    def positions(self, specialty: str) -> array:
+        """Sorted positions of the providers offering a specialty."""
+        return self._postings.get(normalize_specialty(specialty), self._EMPTY)
+
+    def matching(
+        self, specialties: Collection[str], match_all: bool = True
+    ) -> List[int]:
+        """Sorted positions offering all (or with match_all=False any) specialties.
+
+        Blank names are offered by no provider, so none match without others.
+        """
+        postings = [self.positions(name) for name in normalize_specialties(specialties)]
+        if not postings:
+            return []
+        if not match_all:
+            return sorted(set().union(*postings))
+        postings.sort(key=len)
+        found = set(postings[0])
+        for other in postings[1:]:
+            if not found:
+                break
+            found.intersection_update(other)
+        return sorted(found)
+
+    def matcher(
+        self, specialties: Collection[str], match_all: bool = True
+    ) -> Callable[[int], bool]:
+        """Predicate on positions for intersecting with another candidate set.
+
+        Checks each position by binary search, so filtering k candidates costs
+        O(k log n) regardless of how many providers offer the specialties.
+        Matches the same positions as matching.
+        """
+        postings = [self.positions(name) for name in normalize_specialties(specialties)]
+        if not postings:
+            return lambda position: False
+        if match_all:
+            postings.sort(key=len)
+            return lambda position: all(
+                _contains(positions, position) for positions in postings
+            )
+        return lambda position: any(
+            _contains(positions, position) for positions in postings
+        )
@@ -0,0 +1,150 @@
+"""Write-behind buffer for the Patient, Location and Query rows of queries.
+
+Work queue workers hand their batches to one WriteBehindBuffer instead of
+each committing its own transaction, which on SQLite would queue them all
+behind the database write lock. The buffer collects the writes of every
+worker and commits them together every `flush_interval_ms`, or as soon as
+`max_rows` patients are waiting. Callers await a future that resolves only
+once their rows are committed, or raises if the transaction failed, so a
+job is never acknowledged before its rows are durable.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import List, Set, Tuple
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.domain.models.patient import Patient
+from xcov19.infra.location_cache import LocationCache
+from xcov19.infra.patient_store import (
+    stage_diagnosis_queries,
+    stage_geolocation_queries,
+)
+
+buffer_logger = logging.getLogger(__name__)
+
+type PendingWrite[R] = Tuple[List[Patient], asyncio.Future[R]]
+
+
+class WriteBehindBuffer:
+    """Groups concurrent patient query writes into single transactions.
+
+    Transactions run one at a time; writes submitted meanwhile go into the
+    next one. Stopping the buffer commits everything still buffered.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSessionWrapper],
+        flush_interval_ms: float = 10.0,
+        max_rows: int = 500,
+        locations: LocationCache | None = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self.locations = locations
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max_rows
+        self._geolocation: List[PendingWrite[None]] = []
+        self._diagnosis: List[PendingWrite[List[Patient]]] = []
+        self._rows = 0
+        self._timer: asyncio.TimerHandle | None = None
+        # Held while a transaction runs, see OrphanSweeper.
+        self.write_lock = asyncio.Lock()
+        self._writes: Set[asyncio.Task] = set()
+        self._stopped = False
+        self.transactions = 0
+        self.rows_written = 0
+
+    def __len__(self) -> int:
+        """Patients waiting for the next transaction."""
+        return self._rows
+
+    async def persist_geolocation_queries(self, patients: List[Patient]) -> None:
+        """Stores Patient, Location and Query rows, see stage_geolocation_queries."""
+        await self._submit(self._geolocation, patients)
+
+    async def attach_diagnosis_queries(self, patients: List[Patient]) -> List[Patient]:
+        """Sets the query text of stored queries, returns those not stored yet.
+
+        Geolocation queries buffered in the same transaction count as stored.
+        """
+        return await self._submit(self._diagnosis, patients)
+
+    def _submit[R](
+        self, pending: List[PendingWrite[R]], patients: List[Patient]
+    ) -> asyncio.Future[R]:
+        if self._stopped:
+            raise RuntimeError("Write buffer is stopped.")
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[R] = loop.create_future()
+        pending.append((patients, future))
+        self._rows += len(patients)
+        if self._rows >= self.max_rows:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self.flush)
+        return future
+
+    def flush(self) -> asyncio.Task | None:
+        """Starts a transaction with every write buffered so far."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not (self._geolocation or self._diagnosis):
+            return None
+        geolocation, diagnosis = self._geolocation, self._diagnosis
+        self._geolocation, self._diagnosis, self._rows = [], [], 0
+        task = asyncio.get_running_loop().create_task(
+            self._write(geolocation, diagnosis)
+        )
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+        return task
+
+    async def _write(
+        self,
+        geolocation: List[PendingWrite[None]],
+        diagnosis: List[PendingWrite[List[Patient]]],
+    ) -> None:
+        geolocation_patients = [p for patients, _ in geolocation for p in patients]
+        diagnosis_patients = [p for patients, _ in diagnosis for p in patients]
+        try:
+            async with self.write_lock, self._session_factory() as session:
+                upserted = await stage_geolocation_queries(
+                    session, geolocation_patients, self.locations
+                )
+                not_stored = await stage_diagnosis_queries(session, diagnosis_patients)
+                await session.commit()
+            if self.locations is not None:
+                self.locations.update(upserted)
+        except Exception as error:
+            buffer_logger.exception("Buffered patient query writes failed.")
+            for _, future in (*geolocation, *diagnosis):
+                if not future.done():
+                    future.set_exception(error)
+            return
+        self.transactions += 1
+        self.rows_written += len(geolocation_patients) + len(diagnosis_patients)
+        for _, future in geolocation:
+            if not future.done():
+                future.set_result(None)
+        not_stored_ids = {patient.query_id for patient in not_stored}
+        for patients, future in diagnosis:
+            if not future.done():
+                future.set_result(
+                    [
+                        patient
+                        for patient in patients
+                        if patient.query_id in not_stored_ids
+                    ]
+                )
+
+    async def stop(self) -> None:
+        """Rejects new writes and waits for everything buffered to commit."""
+        self._stopped = True
+        self.flush()
+        await asyncio.gather(*self._writes, return_exceptions=True)
@@ -0,0 +1,114 @@
+"""Asynchronous reverse geocoding for the geolocation service.
+
+`CachedReverseGeocoder` sits in front of any `ReverseGeocoderBackend` and:
+
+1. Quantizes coordinates into cells of `cell_precision` decimal places so that
+   nearby lookups share one result.
+2. Serves repeat cells from a bounded TTL/LRU cache.
+3. Coalesces concurrent lookups of the same cell into a single pending future.
+4. Batches distinct cells arriving within `batch_window_ms` into one backend
+   call of at most `max_batch_size` cells.
+
+An instance is a drop-in async `reverse_geo_lookup_svc` for
+`GeolocationQueryService.resolve_coordinates`.
+"""
+
+from __future__ import annotations
+
+import abc
+import asyncio
+from typing import Dict, List, Protocol
+
+from xcov19.domain.models import GeoLocation
+from xcov19.dto import Address, LocationQueryJSON
+from xcov19.utils.cache import TTLCache
+
+type Cell = GeoLocation
+
+
+def quantize(geo_location: GeoLocation, precision: int) -> Cell:
+    """Snaps a point to the centre of its cell of `precision` decimal places."""
+    lat, lng = geo_location
+    return (round(lat, precision), round(lng, precision))
+
+
+class ReverseGeocoderBackend(Protocol):
+    """Resolves points to Address fields, one dict per point, in order."""
+
+    @abc.abstractmethod
+    async def reverse_many(self, geo_locations: List[GeoLocation]) -> List[dict]:
+        raise NotImplementedError
+
+
+class CachedReverseGeocoder:
+    def __init__(
+        self,
+        backend: ReverseGeocoderBackend,
+        cache_size: int = 100_000,
+        ttl_seconds: float | None = 24 * 60 * 60,
+        cell_precision: int = 3,
+        batch_window_ms: float = 5.0,
+        max_batch_size: int = 64,
+    ) -> None:
+        self._backend = backend
+        self._cell_precision = cell_precision
+        self._batch_window = batch_window_ms / 1000
+        self._max_batch_size = max_batch_size
+        self.cache: TTLCache[Cell, Address] = TTLCache(cache_size, ttl_seconds)
+        self._pending: Dict[Cell, asyncio.Future[Address]] = {}
+        self._batch: List[Cell] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.coalesced = 0
+
+    async def __call__(self, query: LocationQueryJSON) -> dict:
+        address = await self.reverse((query.location.lat, query.location.lng))
+        return address.model_dump()
+
+    async def reverse(self, geo_location: GeoLocation) -> Address:
+        cell = quantize(geo_location, self._cell_precision)
+        if (address := self.cache.get(cell)) is not None:
+            return address
+        if (pending := self._pending.get(cell)) is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        loop = asyncio.get_running_loop()
+        future = self._pending[cell] = loop.create_future()
+        self._batch.append(cell)
+        if len(self._batch) >= self._max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._batch_window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._batch = self._batch, []
+        if batch:
+            task = asyncio.create_task(self._resolve(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, batch: List[Cell]) -> None:
+        try:
+            results = await self._backend.reverse_many(batch)
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"Reverse geocoder returned {len(results)} results "
+                    f"for {len(batch)} locations."
+                )
+            addresses = [Address(**fields) for fields in results]
+        except Exception as e:
+            for cell in batch:
+                self._pending.pop(cell).set_exception(e)
+            return
+        except BaseException:
+            # Cancelled or interrupted, waiters must not hang on the cells.
+            for cell in batch:
+                self._pending.pop(cell).cancel()
+            raise
+        for cell, address in zip(batch, addresses):
+            self.cache.set(cell, address)
+            self._pending.pop(cell).set_result(address)
@@ -1,13 +1,44 @@
 from __future__ import annotations
 
 import abc
-from typing import TypeVar, Protocol, Callable, List
+from typing import Awaitable, ClassVar, Hashable, TypeVar, Protocol, Callable, List
 
-from xcov19.dto import LocationQueryJSON, Address, FacilitiesResult
+from xcov19.domain.models.provider import Provider, ProviderFilter
+from xcov19.domain.repository_interface import ISpatialProviderRepository
+from xcov19.dto import (
+    LocationQueryJSON,
+    Address,
+    FacilitiesResult,
+    FacilityFilters,
+    GeoLocation,
+)
+from xcov19.services.geocoding import quantize
+from xcov19.services.ranking import rank_candidates
+from xcov19.utils.executor import BoundedExecutor, run_lookup
+from xcov19.utils.geo import estimate_travel_minutes
+from xcov19.utils.metrics import registry
 from xcov19.utils.mixins import InterfaceProtocolCheckMixin
+from xcov19.utils.single_flight import SingleFlight
 
 T = TypeVar("T", bound=LocationQueryJSON)
 
+DEFAULT_SEARCH_RADIUS_KM = 10.0
+# FacilitiesResult.rank is bounded to 20 results per query.
+MAX_FACILITIES = 20
+
+# Lookups on a process lookup_executor record these in the worker processes,
+# where they are not scraped.
+STAGE_SECONDS = registry.histogram(
+    "xcov19_geolocation_stage_seconds",
+    "Seconds spent per stage of geolocation queries.",
+    ["stage"],
+)
+GEOCODE_SECONDS = STAGE_SECONDS.labels("geocode")
+SEARCH_SECONDS = STAGE_SECONDS.labels("search")
+RANKING_SECONDS = STAGE_SECONDS.labels("ranking")
+RESULTS_SECONDS = STAGE_SECONDS.labels("results")
+SERIALIZATION_SECONDS = STAGE_SECONDS.labels("serialization")
+
 
 # Application services
 
@@ -17,16 +48,15 @@ class LocationQueryServiceInterface[T: LocationQueryJSON](Protocol):
     1. Searches and fetches existing processed results by query_id for a cust_id
     2. Resolves coordinates from a given geolocation.
     3. Fetches all facilities from a given set of records for a
-    given radius from geolocation.
+    given radius from geolocation, restricted by the query's filters.
 
-    Radius is default for now.
-    # TODO: Filter to be added
+    Radius is default unless the filters set a smaller max_distance_km.
     """
 
     @classmethod
     @abc.abstractmethod
     async def resolve_coordinates(
-        cls, reverse_geo_lookup_svc: Callable[[T], dict], query: T
+        cls, reverse_geo_lookup_svc: Callable[[T], dict | Awaitable[dict]], query: T
     ) -> Address:
         raise NotImplementedError
 
@@ -34,35 +64,205 @@ class LocationQueryServiceInterface[T: LocationQueryJSON](Protocol):
     @abc.abstractmethod
     async def fetch_facilities(
         cls,
-        reverse_geo_lookup_svc: Callable[[T], dict],
+        reverse_geo_lookup_svc: Callable[[T], dict | Awaitable[dict]],
         query: T,
-        patient_query_lookup_svc: Callable[[Address, T], List[FacilitiesResult]],
+        patient_query_lookup_svc: Callable[
+            [Address, T], List[FacilitiesResult] | Awaitable[List[FacilitiesResult]]
+        ],
     ) -> List[FacilitiesResult] | None:
         raise NotImplementedError
 
 
+def coalescing_key(
+    query: LocationQueryJSON, cell_precision: int, *services: Callable
+) -> Hashable:
+    """Queries with equal keys share one fetch_facilities computation: same
+    lookup services, same cell of cell_precision decimal places, same filters."""
+    cell = quantize((query.location.lat, query.location.lng), cell_precision)
+    return (*services, cell, query.filters.model_dump_json())
+
+
 class GeolocationQueryService(
     LocationQueryServiceInterface[LocationQueryJSON], InterfaceProtocolCheckMixin
 ):
+    """Geolocation lookups, coalescing concurrent queries from one geocell.
+
+    With a coalescer set, concurrent fetch_facilities calls with the same
+    coalescing_key share one lookup and its results. Those are computed from
+    the location of the first query, which is at most one cell away from the
+    others.
+    """
+
+    # Runs sync lookup services off the event loop. Set on the subclasses
+    # geolocation_service returns, never on this class.
+    lookup_executor: ClassVar[BoundedExecutor | None] = None
+    coalescer: ClassVar[
+        SingleFlight[Hashable, List[FacilitiesResult] | None] | None
+    ] = None
+    coalesce_cell_precision: ClassVar[int] = 3
+
     @classmethod
     async def resolve_coordinates(
         cls,
-        reverse_geo_lookup_svc: Callable[[LocationQueryJSON], dict],
+        reverse_geo_lookup_svc: Callable[[LocationQueryJSON], dict | Awaitable[dict]],
         query: LocationQueryJSON,
     ) -> Address:
-        """Resolves to address by geo reverse lookup."""
-        return Address(**reverse_geo_lookup_svc(query))
+        """Resolves to address by geo reverse lookup.
+
+        The lookup service may be sync or async, e.g. a CachedReverseGeocoder.
+        """
+        with GEOCODE_SECONDS.time():
+            address = await run_lookup(
+                cls.lookup_executor, reverse_geo_lookup_svc, query
+            )
+        return Address(**address)
 
     @classmethod
     async def fetch_facilities(
         cls,
-        reverse_geo_lookup_svc: Callable[[LocationQueryJSON], dict],
+        reverse_geo_lookup_svc: Callable[[LocationQueryJSON], dict | Awaitable[dict]],
         query: LocationQueryJSON,
         patient_query_lookup_svc: Callable[
             [Address, LocationQueryJSON],
-            List[FacilitiesResult],
+            List[FacilitiesResult] | Awaitable[List[FacilitiesResult]],
         ],
     ) -> List[FacilitiesResult] | None:
-        """Fetches facilities for a query location for a query id for a customer."""
-        patient_address = await cls.resolve_coordinates(reverse_geo_lookup_svc, query)
-        return patient_query_lookup_svc(patient_address, query) or None
+        """Fetches facilities for a query location for a query id for a customer.
+
+        Sync lookup services run on lookup_executor so a slow or CPU heavy
+        lookup does not stall other requests.
+        """
+
+        async def lookup() -> List[FacilitiesResult] | None:
+            patient_address = await cls.resolve_coordinates(
+                reverse_geo_lookup_svc, query
+            )
+            facilities = await run_lookup(
+                cls.lookup_executor, patient_query_lookup_svc, patient_address, query
+            )
+            return facilities or None
+
+        if cls.coalescer is None:
+            return await lookup()
+        key = coalescing_key(
+            query,
+            cls.coalesce_cell_precision,
+            reverse_geo_lookup_svc,
+            patient_query_lookup_svc,
+        )
+        return await cls.coalescer.run(key, lookup)
+
+
+def geolocation_service(
+    lookup_executor: BoundedExecutor | None = None,
+    coalescer: SingleFlight[Hashable, List[FacilitiesResult] | None] | None = None,
+    coalesce_cell_precision: int = 3,
+) -> type[GeolocationQueryService]:
+    """A GeolocationQueryService with its own lookup executor and coalescer.
+
+    Returns a subclass rather than setting them on GeolocationQueryService, so
+    every application, and every test, gets its own.
+    """
+    return type(
+        GeolocationQueryService.__name__,
+        (GeolocationQueryService,),
+        {
+            "lookup_executor": lookup_executor,
+            "coalescer": coalescer,
+            "coalesce_cell_precision": coalesce_cell_precision,
+        },
+    )
+
+
+def facility_result_from_provider(
+    provider: Provider,
+    distance_km: float,
+    rank: int,
+    estimated_time: float | None = None,
+) -> FacilitiesResult:
+    """Maps a domain Provider at a distance from the patient to a result."""
+    lat, lng = provider.geo_location
+    return FacilitiesResult(
+        name=provider.name,
+        address=Address(street=provider.address),
+        geolocation=GeoLocation(lat=lat, lng=lng),
+        contact=provider.contact.value,
+        facility_type=provider.facility_type.value,
+        ownership=provider.ownership.value,
+        specialties=provider.specialties,
+        stars=provider.stars,
+        reviews=provider.reviews,
+        rank=rank,
+        estimated_time=estimate_travel_minutes(distance_km)
+        if estimated_time is None
+        else estimated_time,
+    )
+
+
+def provider_filter(filters: FacilityFilters) -> ProviderFilter | None:
+    """Maps the filters of a location query, None when nothing is filtered."""
+    if not (
+        filters.facility_type
+        or filters.ownership
+        or filters.min_stars
+        or filters.specialties
+        or filters.max_fee is not None
+    ):
+        return None
+    return ProviderFilter(
+        facility_types=frozenset(filters.facility_type),
+        ownerships=frozenset(filters.ownership),
+        min_stars=filters.min_stars,
+        specialties=frozenset(filters.specialties),
+        match_all_specialties=filters.match_all_specialties,
+        max_fee=filters.max_fee,
+    )
+
+
+def nearby_facilities_lookup(
+    repo: ISpatialProviderRepository[Provider],
+    radius_km: float = DEFAULT_SEARCH_RADIUS_KM,
+    limit: int = MAX_FACILITIES,
+) -> Callable[[Address, LocationQueryJSON], List[FacilitiesResult]]:
+    """Builds a patient_query_lookup_svc ranking providers near the patient.
+
+    Facilities within radius_km, or the query's smaller max_distance_km, that
+    match its filters are ranked by distance, stars, reviews and the requested
+    specialties, see xcov19.services.ranking.
+    """
+
+    max_results = min(limit, MAX_FACILITIES)
+
+    def lookup(address: Address, query: LocationQueryJSON) -> List[FacilitiesResult]:
+        origin = (query.location.lat, query.location.lng)
+        filters = query.filters
+        search_radius_km = min(radius_km, filters.max_distance_km or radius_km)
+        with SEARCH_SECONDS.time():
+            candidates = repo.fetch_candidates_within_radius(
+                origin, search_radius_km, provider_filter(filters)
+            )
+        with RANKING_SECONDS.time():
+            ranked = rank_candidates(
+                origin,
+                lats=candidates.lats,
+                lngs=candidates.lngs,
+                stars=candidates.stars,
+                reviews=candidates.reviews,
+                specialties=candidates.specialties,
+                wanted_specialties=filters.specialties,
+                radius_km=search_radius_km,
+                limit=max_results,
+                distances_km=candidates.distances_km,
+            )
+        with RESULTS_SECONDS.time():
+            return [
+                facility_result_from_provider(
+                    candidates.provider(candidate.index),
+                    candidate.distance_km,
+                    candidate.rank,
+                    candidate.estimated_minutes,
+                )
+                for candidate in ranked
+            ]
+
+    return lookup
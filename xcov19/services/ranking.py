@@ -0,0 +1,167 @@
+"""Distance, travel time and composite rank of candidate facilities.
+
+Candidates are scored together from column arrays (latitudes, stars, reviews,
+...) rather than one provider object at a time, as vectorized NumPy array
+operations.
+
+The composite score is a weighted sum of per candidate scores in [0, 1]:
+
+- distance: 1 at the patient's location, 0 at or beyond radius_km
+- stars: 0 for 1 star, 1 for 5 stars
+- reviews: log scaled review count relative to the most reviewed candidate
+- specialty: share of the requested specialties the facility or its doctors
+  offer
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from itertools import chain
+from typing import Collection, List, Sequence
+
+import numpy as np
+
+from xcov19.domain.models import GeoLocation
+from xcov19.domain.models.provider import normalize_specialty
+from xcov19.utils.geo import (
+    DEFAULT_TRAVEL_SPEED_KMPH,
+    EARTH_RADIUS_KM,
+    estimate_travel_minutes,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class RankingWeights:
+    distance: float = 0.5
+    stars: float = 0.2
+    reviews: float = 0.1
+    specialty: float = 0.2
+
+
+DEFAULT_WEIGHTS = RankingWeights()
+
+
+@dataclass(frozen=True, slots=True)
+class RankedCandidate:
+    # position of the candidate in the ranked arrays.
+    index: int
+    rank: int
+    distance_km: float
+    estimated_minutes: float
+    score: float
+
+
+def haversine_km_many(
+    origin: GeoLocation, lats: Sequence[float], lngs: Sequence[float]
+) -> np.ndarray:
+    """Great circle distances from origin to each (lats[i], lngs[i]) in km."""
+    lat, lng = origin
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    d_lambda = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+    a = (
+        np.sin((phi2 - phi1) / 2) ** 2
+        + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def specialty_match(
+    candidate_specialties: Sequence[Collection[str]], wanted: Collection[str]
+) -> np.ndarray:
+    """Share of the wanted specialties each candidate offers, 1 if none wanted.
+
+    Wanted names are normalized, see normalize_specialty. Offered names must
+    already be normalized and unique per candidate, as the snapshot's indexed
+    specialties are.
+    """
+    wanted = sorted(frozenset(map(normalize_specialty, wanted)))
+    count = len(candidate_specialties)
+    if not wanted:
+        return np.ones(count)
+    lengths = np.fromiter(map(len, candidate_specialties), dtype=np.intp, count=count)
+    offered = np.array(list(chain.from_iterable(candidate_specialties)), dtype=str)
+    owners = np.repeat(np.arange(count), lengths)
+    matches = np.bincount(
+        owners, weights=np.isin(offered, wanted).astype(np.float64), minlength=count
+    )
+    return matches / len(wanted)
+
+
+def composite_scores(
+    distances_km: Sequence[float],
+    stars: Sequence[float],
+    reviews: Sequence[float],
+    specialty_scores: Sequence[float],
+    radius_km: float,
+    weights: RankingWeights = DEFAULT_WEIGHTS,
+) -> np.ndarray:
+    distance = 1.0 - np.minimum(np.asarray(distances_km) / radius_km, 1.0)
+    star = (np.clip(np.asarray(stars, dtype=np.float64), 1, 5) - 1) / 4
+    log_reviews = np.log1p(np.maximum(np.asarray(reviews, dtype=np.float64), 0))
+    top = log_reviews.max(initial=0.0)
+    review = log_reviews / top if top else np.zeros_like(log_reviews)
+    return (
+        weights.distance * distance
+        + weights.stars * star
+        + weights.reviews * review
+        + weights.specialty * np.asarray(specialty_scores, dtype=np.float64)
+    )
+
+
+def top_k(scores: Sequence[float], distances_km: Sequence[float], k: int) -> List[int]:
+    """Indices of the k best scores, nearest first among equal scores."""
+    count = len(scores)
+    if k <= 0 or not count:
+        return []
+    scores = np.asarray(scores)
+    distances = np.asarray(distances_km)
+    if k < count:
+        # Partition first so only k candidates get sorted.
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(count)
+    order = np.lexsort((distances[best], -scores[best]))
+    return best[order].tolist()
+
+
+def rank_candidates(
+    origin: GeoLocation,
+    lats: Sequence[float],
+    lngs: Sequence[float],
+    stars: Sequence[float],
+    reviews: Sequence[float],
+    specialties: Sequence[Collection[str]],
+    wanted_specialties: Collection[str] = (),
+    radius_km: float = 10.0,
+    limit: int = 20,
+    weights: RankingWeights = DEFAULT_WEIGHTS,
+    speed_kmph: float = DEFAULT_TRAVEL_SPEED_KMPH,
+    distances_km: Sequence[float] | None = None,
+) -> List[RankedCandidate]:
+    """Ranks candidates by composite score, best first, up to limit.
+
+    Pass distances_km when the candidate search already computed them.
+    """
+    if distances_km is None:
+        distances_km = haversine_km_many(origin, lats, lngs)
+    scores = composite_scores(
+        distances_km,
+        stars,
+        reviews,
+        specialty_match(specialties, wanted_specialties),
+        radius_km,
+        weights,
+    )
+    return [
+        RankedCandidate(
+            index=index,
+            rank=rank,
+            distance_km=float(distances_km[index]),
+            estimated_minutes=estimate_travel_minutes(
+                float(distances_km[index]), speed_kmph
+            ),
+            score=float(scores[index]),
+        )
+        for rank, index in enumerate(top_k(scores, distances_km, limit), start=1)
+    ]
@@ -0,0 +1,231 @@
+"""End-to-end benchmark of the geo and diagnose endpoints.
+
+Seeds a synthetic provider registry into a fresh SpatiaLite database, starts
+the application in-process and drives it through BlackSheep's TestClient at a
+fixed concurrency. Scenarios:
+
+- geo: POST /geo, accepting a location query
+- diagnose: POST /diagnose, attaching a query text
+- geo_results: POST /geo, then poll GET /geo/{query_id} until the workers
+  have stored the facilities, the latency a patient actually waits
+
+Prints throughput and p50/p95/p99 latency per scenario as JSON. With a
+baseline, exits with status 1 when a scenario regressed by more than the
+tolerance. Run with:
+
+    python -m xcov19.tests.benchmarks.endpoints --providers 100000 \\
+        --baseline xcov19/tests/benchmarks/baselines/endpoints.json
+
+Baselines depend on the machine, so none is committed. Record one with
+--update-baseline, later runs compare against it and fail when it is missing.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from xcov19.tests.benchmarks.spatial_index import seed_providers
+from xcov19.tests.data.synthetic import CITY_CENTERS, SPECIALTIES
+
+SCENARIOS = ("geo", "diagnose", "geo_results")
+# Polling interval of geo_results while the query is being processed.
+POLL_INTERVAL_SECONDS = 0.005
+RESULTS_TIMEOUT_SECONDS = 30.0
+
+type Request = Callable[[int], Awaitable[None]]
+
+
+def percentile(latencies: List[float], pct: int) -> float:
+    return statistics.quantiles(latencies, n=100, method="inclusive")[pct - 1]
+
+
+def summarize(latencies: List[float], seconds: float, concurrency: int) -> Dict:
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "throughput_rps": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(max(latencies), 3),
+    }
+
+
+def regressions(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Scenarios slower, or with lower throughput, than baseline by tolerance."""
+    setup = ("providers", "requests", "concurrency")
+    if (current := [report[key] for key in setup]) != (
+        expected_setup := [baseline.get(key) for key in setup]
+    ):
+        return [f"baseline was recorded with {setup} {expected_setup}, not {current}"]
+    found = []
+    for scenario, result in report["scenarios"].items():
+        if (expected := baseline.get("scenarios", {}).get(scenario)) is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if result[key] > expected[key] * (1 + tolerance):
+                found.append(
+                    f"{scenario} {key} {result[key]} > baseline {expected[key]}"
+                )
+        if result["throughput_rps"] < expected["throughput_rps"] * (1 - tolerance):
+            found.append(
+                f"{scenario} throughput_rps {result['throughput_rps']} "
+                f"< baseline {expected['throughput_rps']}"
+            )
+    return found
+
+
+async def drive(request: Request, requests: int, concurrency: int) -> Dict:
+    """Runs requests with at most concurrency in flight."""
+    latencies: List[float] = []
+    numbers = itertools.count()
+
+    async def client() -> None:
+        while (n := next(numbers)) < requests:
+            started = time.perf_counter()
+            await request(n)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, concurrency)
+
+
+def location_query(rng: random.Random, query_id: str) -> Dict:
+    lat, lng = rng.choice(CITY_CENTERS)
+    query = {
+        "location": {"lat": rng.gauss(lat, 0.1), "lng": rng.gauss(lng, 0.1)},
+        "cust_id": {"cust_id": f"cust-{rng.randrange(10_000)}"},
+        "query_id": {"query_id": query_id},
+    }
+    if rng.random() < 0.3:
+        query["filters"] = {"specialties": [rng.choice(SPECIALTIES[:6])]}
+    return query
+
+
+async def run(providers: int, requests: int, concurrency: int) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_url = f"sqlite+aiosqlite:///{Path(tmp_dir) / 'benchmark.db'}"
+        # Settings are read when the application module is imported.
+        os.environ["APP_DB_ENGINE_URL"] = db_url
+        from blacksheep import Content
+        from blacksheep.testing import TestClient
+
+        from xcov19.app.database import setup_database
+        from xcov19.app.main import app
+        from xcov19.app.settings import FromOriginMatchHeader, load_settings
+
+        engine = create_async_engine(db_url)
+        await setup_database(engine, load_settings().database)
+        started = time.perf_counter()
+        await seed_providers(engine, providers)
+        seed_seconds = time.perf_counter() - started
+        await engine.dispose()
+
+        await app.start()
+        try:
+            client = TestClient(app)
+            headers = {"X-Origin-Match-Header": FromOriginMatchHeader.secret}
+            rng = random.Random(requests)
+
+            def post(path: str, body: Dict):
+                return client.post(
+                    path,
+                    headers=headers,
+                    content=Content(b"application/json", json.dumps(body).encode()),
+                )
+
+            async def geo(n: int) -> None:
+                response = await post("/geo", location_query(rng, f"geo-{n}"))
+                assert response.status == 202, response.status
+
+            async def diagnose(n: int) -> None:
+                response = await post(
+                    "/diagnose",
+                    {"query": "fever and cough", "query_id": {"query_id": f"geo-{n}"}},
+                )
+                assert response.status == 202, response.status
+
+            async def geo_results(n: int) -> None:
+                query = location_query(rng, str(uuid.uuid4()))
+                response = await post("/geo", query)
+                assert response.status == 202, response.status
+                path = f"/geo/{query['query_id']['query_id']}"
+                cust_id = query["cust_id"]["cust_id"]
+                async with asyncio.timeout(RESULTS_TIMEOUT_SECONDS):
+                    while (
+                        await client.get(
+                            path, headers=headers, query={"cust_id": cust_id}
+                        )
+                    ).status == 404:
+                        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+            scenarios: Dict[str, Request] = {
+                "geo": geo,
+                "diagnose": diagnose,
+                "geo_results": geo_results,
+            }
+            return {
+                "providers": providers,
+                "requests": requests,
+                "concurrency": concurrency,
+                "seed_seconds": round(seed_seconds, 2),
+                "scenarios": {
+                    name: await drive(scenarios[name], requests, concurrency)
+                    for name in SCENARIOS
+                },
+            }
+        finally:
+            await app.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").splitlines()[0])
+    parser.add_argument("--providers", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed regression against the baseline, as a fraction",
+    )
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+    if args.baseline is not None and not (
+        args.update_baseline or args.baseline.exists()
+    ):
+        sys.exit(
+            f"No baseline at {args.baseline}, record one on this machine with "
+            "--update-baseline (make bench-endpoints-baseline)."
+        )
+    report = asyncio.run(run(args.providers, args.requests, args.concurrency))
+    print(json.dumps(report, indent=2))
+    if args.baseline is None:
+        return
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Recorded baseline at {args.baseline}.", file=sys.stderr)
+        return
+    if found := regressions(
+        report, json.loads(args.baseline.read_text()), args.tolerance
+    ):
+        sys.exit("Regressions against baseline:\n" + "\n".join(found))
+
+
+if __name__ == "__main__":
+    main()
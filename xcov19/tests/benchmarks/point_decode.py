@@ -0,0 +1,115 @@
+"""Benchmarks reading provider geopoints as WKT text against binary WKB.
+
+Times decoding of the values SpatiaLite returns for provider.geopoint: the
+former `AsText` WKT parsing, the WKB PointType result processor, and the
+batched `decode_points`. With --db, also times bulk reads of every provider
+row from a seeded SpatiaLite database. Run with:
+
+    python -m xcov19.tests.benchmarks.point_decode --rows 100000 --db
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from xcov19.app.database import setup_database
+from xcov19.infra.models import PointType, Provider, decode_points, encode_point
+from xcov19.tests.benchmarks.spatial_index import seed_providers
+from xcov19.tests.data.synthetic import synthetic_provider_rows
+
+
+def decode_wkt(value: str) -> Tuple[float, float]:
+    """PointType's former result processor for AsText values."""
+    lat, lng = value[6:-1].split()
+    return float(lat), float(lng)
+
+
+def rows_per_second(rows: int, decode: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        decode()
+        best = min(best, time.perf_counter() - started)
+    return round(rows / best)
+
+
+def decode_report(rows: int, repeat: int) -> Dict[str, float]:
+    points = [row["geopoint"] for row in synthetic_provider_rows(rows)]
+    wkts = [f"POINT({lat} {lng})" for lat, lng in points]
+    wkbs = [encode_point(point) for point in points]
+    process = PointType().result_processor(sqlite.dialect(), None)
+    assert process is not None
+    return {
+        "wkt_rows_per_sec": rows_per_second(
+            rows, lambda: [decode_wkt(wkt) for wkt in wkts], repeat
+        ),
+        "wkb_rows_per_sec": rows_per_second(
+            rows, lambda: [process(wkb) for wkb in wkbs], repeat
+        ),
+        "wkb_batched_rows_per_sec": rows_per_second(
+            rows, lambda: decode_points(wkbs), repeat
+        ),
+    }
+
+
+async def time_reads(engine: AsyncEngine, rows: int, repeat: int) -> Dict[str, float]:
+    table = Provider.__table__
+    async with engine.connect() as conn:
+
+        async def read_wkt() -> Sequence:
+            result = await conn.execute(
+                select(table.c.provider_id, func.AsText(table.c.geopoint))
+            )
+            return [(provider_id, decode_wkt(wkt)) for provider_id, wkt in result]
+
+        async def read_wkb() -> Sequence:
+            result = await conn.execute(select(table.c.provider_id, table.c.geopoint))
+            return result.all()
+
+        report = {}
+        for name, read in (("wkt", read_wkt), ("wkb", read_wkb)):
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await read()
+                best = min(best, time.perf_counter() - started)
+            report[f"db_{name}_rows_per_sec"] = round(rows / best)
+    return report
+
+
+async def db_report(rows: int, repeat: int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{Path(tmp_dir) / 'providers.db'}"
+        )
+        try:
+            await setup_database(engine)
+            await seed_providers(engine, rows)
+            return await time_reads(engine, rows, repeat)
+        finally:
+            await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", action="store_true", help="also time database reads")
+    args = parser.parse_args()
+    report: Dict[str, object] = {"rows": args.rows}
+    report |= decode_report(args.rows, args.repeat)
+    if args.db:
+        report |= asyncio.run(db_report(args.rows, args.repeat))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
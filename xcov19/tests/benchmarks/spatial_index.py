@@ -0,0 +1,111 @@
+"""Benchmarks provider radius searches with and without the R-tree index.
+
+Seeds a fresh SpatiaLite database per registry size and times
+`SqliteProviderRepo.fetch_within_radius` using the bounding box prefilter
+against a full table scan. Run with:
+
+    python -m xcov19.tests.benchmarks.spatial_index --sizes 10000 100000 1000000
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from xcov19.app.database import SessionFactory, setup_database
+from xcov19.infra.models import Provider
+from xcov19.infra.repository import SqliteProviderRepo
+from xcov19.tests.data.synthetic import CITY_CENTERS, synthetic_provider_rows
+
+SEED_BATCH_SIZE = 10_000
+
+
+async def seed_providers(engine: AsyncEngine, count: int) -> None:
+    rows = synthetic_provider_rows(count)
+    while batch := list(itertools.islice(rows, SEED_BATCH_SIZE)):
+        async with engine.begin() as conn:
+            await conn.execute(insert(Provider.__table__), batch)
+
+
+async def time_searches(
+    engine: AsyncEngine, use_spatial_index: bool, queries: int, radius_km: float
+) -> List[float]:
+    """Latency in milliseconds of each radius search."""
+    rng = random.Random(queries)
+    latencies = []
+    session_factory = SessionFactory(engine)()
+    async with session_factory() as session:
+        repo = SqliteProviderRepo(session, use_spatial_index=use_spatial_index)
+        for _ in range(queries):
+            lat, lng = rng.choice(CITY_CENTERS)
+            origin = (rng.gauss(lat, 0.1), rng.gauss(lng, 0.1))
+            started = time.perf_counter()
+            await repo.fetch_within_radius(origin, radius_km)
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "queries": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "max_ms": round(max(latencies), 3),
+    }
+
+
+async def run(
+    sizes: List[int], queries: int, scan_queries: int, radius_km: float
+) -> List[Dict]:
+    report = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            db_path = Path(tmp_dir) / f"providers_{size}.db"
+            engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+            await setup_database(engine)
+            started = time.perf_counter()
+            await seed_providers(engine, size)
+            seed_seconds = time.perf_counter() - started
+            indexed = await time_searches(engine, True, queries, radius_km)
+            scanned = await time_searches(engine, False, scan_queries, radius_km)
+            await engine.dispose()
+            report.append(
+                {
+                    "providers": size,
+                    "radius_km": radius_km,
+                    "seed_seconds": round(seed_seconds, 2),
+                    "rtree": summarize(indexed),
+                    "full_scan": summarize(scanned),
+                }
+            )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--scan-queries", type=int, default=3)
+    parser.add_argument("--radius-km", type=float, default=5.0)
+    args = parser.parse_args()
+    report = asyncio.run(
+        run(args.sizes, args.queries, args.scan_queries, args.radius_km)
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Micro-benchmarks of the per-request hot paths, at response sized inputs.
+
+- DTO parsing of location queries and facilities results
+- FacilitiesResult serialization, as the result store and controller do it
+- PointType bind and result processors
+- SQLModel hydration of provider rows and their mapping to domain entities
+
+Run with `make bench-micro`, other runs deselect the benchmark marker.
+"""
+
+import json
+import random
+from typing import List
+
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.dialects import sqlite
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from xcov19.dto import FacilitiesResult, LocationQueryJSON
+from xcov19.infra.models import PointType, Provider, encode_point
+from xcov19.infra.repository import provider_from_row, provider_result_from_row
+from xcov19.infra.result_store import facilities_adapter
+from xcov19.services.geolocation import facility_result_from_provider
+from xcov19.tests.data.synthetic import synthetic_provider_rows
+
+RESPONSE_SIZE = 200
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.fixture(scope="module")
+def provider_rows() -> List[dict]:
+    return list(synthetic_provider_rows(RESPONSE_SIZE))
+
+
+@pytest.fixture(scope="module")
+def provider_engine(provider_rows):
+    """Plain SQLite database of provider rows.
+
+    Stands in for SpatiaLite's WKB functions, which are no-ops for points
+    already stored as WKB.
+    """
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def add_geometry_functions(dbapi_conn, _connection_record):
+        dbapi_conn.create_function("GeomFromWKB", 2, lambda wkb, _srid: wkb)
+        dbapi_conn.create_function("AsBinary", 1, lambda wkb: wkb)
+
+    SQLModel.metadata.create_all(engine, tables=[Provider.__table__])
+    with engine.begin() as conn:
+        conn.execute(insert(Provider.__table__), provider_rows)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def facilities(provider_engine) -> List[FacilitiesResult]:
+    with Session(provider_engine) as session:
+        rows = session.exec(select(Provider)).all()
+    return [
+        facility_result_from_provider(provider_from_row(row), distance_km, rank)
+        for rank, (row, distance_km) in enumerate(
+            zip(rows, (i / 10 for i in range(len(rows)))), start=1
+        )
+        if rank <= 20
+    ] * (RESPONSE_SIZE // 20)
+
+
+def test_location_query_parsing(benchmark):
+    rng = random.Random(1)
+    payloads = [
+        json.dumps(
+            {
+                "location": {"lat": rng.uniform(8, 30), "lng": rng.uniform(70, 90)},
+                "cust_id": {"cust_id": f"cust-{n}"},
+                "query_id": {"query_id": f"query-{n}"},
+                "filters": {"specialties": ["cardiology"], "min_stars": 3},
+            }
+        )
+        for n in range(RESPONSE_SIZE)
+    ]
+    queries = benchmark(
+        lambda: [LocationQueryJSON.model_validate_json(p) for p in payloads]
+    )
+    assert len(queries) == RESPONSE_SIZE
+
+
+def test_facilities_result_parsing(benchmark, facilities):
+    payload = facilities_adapter.dump_json(facilities)
+    parsed = benchmark(facilities_adapter.validate_json, payload)
+    assert parsed == facilities
+
+
+def test_facilities_result_dump_json(benchmark, facilities):
+    payload = benchmark(facilities_adapter.dump_json, facilities)
+    assert len(json.loads(payload)) == RESPONSE_SIZE
+
+
+def test_facilities_result_model_dump(benchmark, facilities):
+    """Generic dict path of blacksheep's json(), for comparison with dump_json."""
+    body = benchmark(
+        lambda: json.dumps([result.model_dump(mode="json") for result in facilities])
+    )
+    assert len(json.loads(body)) == RESPONSE_SIZE
+
+
+def test_point_bind_processor(benchmark, provider_rows):
+    bind = PointType().bind_processor(sqlite.dialect())
+    assert bind is not None
+    points = [row["geopoint"] for row in provider_rows]
+    wkbs = benchmark(lambda: [bind(point) for point in points])
+    assert wkbs[0] == encode_point(points[0])
+
+
+def test_point_result_processor(benchmark, provider_rows):
+    process = PointType().result_processor(sqlite.dialect(), None)
+    assert process is not None
+    wkbs = [encode_point(row["geopoint"]) for row in provider_rows]
+    points = benchmark(lambda: [process(wkb) for wkb in wkbs])
+    assert points[0] == provider_rows[0]["geopoint"]
+
+
+def test_provider_row_hydration(benchmark, provider_engine):
+    def hydrate():
+        with Session(provider_engine) as session:
+            return session.exec(select(Provider)).all()
+
+    rows = benchmark(hydrate)
+    assert len(rows) == RESPONSE_SIZE
+
+
+def test_provider_domain_mapping(benchmark, provider_engine):
+    with Session(provider_engine) as session:
+        rows = session.exec(select(Provider)).all()
+    providers = benchmark(lambda: [provider_from_row(row) for row in rows])
+    assert len(providers) == RESPONSE_SIZE
+
+
+def test_provider_result_mapping(benchmark, provider_engine):
+    """The /providers listing's mapping of rows to ProviderResult."""
+    with Session(provider_engine) as session:
+        rows = session.exec(select(Provider)).all()
+    results = benchmark(lambda: [provider_result_from_row(row) for row in rows])
+    assert len(results) == RESPONSE_SIZE
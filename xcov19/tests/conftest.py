@@ -1,4 +1,5 @@
-from collections.abc import Callable
+import inspect
+from collections.abc import Awaitable, Callable
 from typing import List
 
 from blacksheep.testing import TestClient
@@ -89,23 +90,27 @@ def dummy_patient_query_lookup_svc() -> Callable[[Address, LocationQueryJSON], l
 
 
 class StubLocationQueryServiceImpl(
-    LocationQueryServiceInterface, InterfaceProtocolCheckMixin
+    LocationQueryServiceInterface[LocationQueryJSON], InterfaceProtocolCheckMixin
 ):
     @classmethod
     async def resolve_coordinates(
         cls,
-        reverse_geo_lookup_svc: Callable[[LocationQueryJSON], dict],
+        reverse_geo_lookup_svc: Callable[[LocationQueryJSON], dict | Awaitable[dict]],
         query: LocationQueryJSON,
     ) -> Address:
-        return Address(**reverse_geo_lookup_svc(query))
+        address = reverse_geo_lookup_svc(query)
+        if inspect.isawaitable(address):
+            address = await address
+        return Address(**address)
 
     @classmethod
     async def fetch_facilities(
         cls,
-        reverse_geo_lookup_svc: Callable[[LocationQueryJSON], dict],
+        reverse_geo_lookup_svc: Callable[[LocationQueryJSON], dict | Awaitable[dict]],
         query: LocationQueryJSON,
         patient_query_lookup_svc: Callable[
-            [Address, LocationQueryJSON], List[FacilitiesResult]
+            [Address, LocationQueryJSON],
+            List[FacilitiesResult] | Awaitable[List[FacilitiesResult]],
         ],
     ) -> List[FacilitiesResult] | None:
         return [
@@ -126,7 +131,7 @@ class StubLocationQueryServiceImpl(
 
 
 @pytest.fixture(scope="class")
-def stub_location_srvc() -> LocationQueryServiceInterface:
+def stub_location_srvc() -> type[LocationQueryServiceInterface]:
     return StubLocationQueryServiceImpl
 
 
@@ -0,0 +1,79 @@
+"""Synthetic provider registry rows for benchmarks.
+
+Rows are plain dicts keyed by provider table column, ready for a bulk
+`insert(Provider.__table__)`. Facilities cluster around city centres with a
+gaussian spread so radius searches see realistic local densities.
+"""
+
+import random
+import uuid
+from typing import Dict, Iterator, List, Tuple
+
+from xcov19.domain.models.provider import FacilityEstablishment, FacilityOwnership
+
+# (lat, lng) of a few dense metros and smaller towns.
+CITY_CENTERS: List[Tuple[float, float]] = [
+    (28.6139, 77.2090),
+    (19.0760, 72.8777),
+    (12.9716, 77.5946),
+    (13.0827, 80.2707),
+    (22.5726, 88.3639),
+    (17.3850, 78.4867),
+    (26.9124, 75.7873),
+    (25.5941, 85.1376),
+    (11.0168, 76.9558),
+    (31.1048, 77.1734),
+]
+SPECIALTIES = [
+    "general",
+    "pediatrics",
+    "cardiology",
+    "orthopedics",
+    "gynecology",
+    "dermatology",
+    "ent",
+    "neurology",
+    "psychiatry",
+    "oncology",
+    "surgery",
+    "pulmonology",
+]
+
+
+def synthetic_provider_rows(count: int, seed: int = 1) -> Iterator[Dict]:
+    """Yields count provider rows, deterministic for a given seed."""
+    rng = random.Random(seed)
+    facility_types = list(FacilityEstablishment)
+    ownerships = list(FacilityOwnership)
+    # Specialty popularity follows a long tail, "general" being the most common.
+    specialty_weights = [1 / (rank + 1) for rank in range(len(SPECIALTIES))]
+    for n in range(count):
+        center_lat, center_lng = rng.choice(CITY_CENTERS)
+        specialties = sorted(
+            set(rng.choices(SPECIALTIES, specialty_weights, k=rng.randint(1, 4)))
+        )
+        yield {
+            "provider_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "name": f"Facility {n}",
+            "address": f"{n} Main Road",
+            "geopoint": (
+                round(rng.gauss(center_lat, 0.15), 6),
+                round(rng.gauss(center_lng, 0.15), 6),
+            ),
+            "contact": 910000000000 + n,
+            "facility_type": rng.choice(facility_types).value,
+            "ownership_type": rng.choice(ownerships).value,
+            "specialties": specialties,
+            "stars": rng.randint(1, 5),
+            "reviews": int(rng.paretovariate(1.5) * 10),
+            "available_doctors": [
+                {
+                    "name": f"Dr. {n}-{d}",
+                    "specialties": [specialty],
+                    "degree": ["MBBS"],
+                    "experience": rng.randint(1, 30),
+                    "fee": rng.choice([0, 100, 250, 500, 1000]),
+                }
+                for d, specialty in enumerate(specialties)
+            ],
+        }
@@ -8,7 +8,9 @@ from xcov19.app.database import (
     start_db_session,
 )
 from xcov19.app.settings import load_settings
-from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+from xcov19.infra.models import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
 
 
@@ -35,6 +37,21 @@ async def start_server(app: Application) -> AsyncGenerator[Application, None]:
             await app.stop()
 
 
+@asynccontextmanager
+async def start_plain_sqlite_engine() -> AsyncGenerator[AsyncEngine, None]:
+    """In-memory database with all tables, without SpatiaLite.
+
+    For unit tests of SQL that does not touch geometry functions.
+    """
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        yield engine
+    finally:
+        await engine.dispose()
+
+
 class SetUpTestDatabase:
     """Manages the lifecycle of the test database."""
 
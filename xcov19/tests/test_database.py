@@ -0,0 +1,125 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from rodi import Container
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import StaticPool
+
+from xcov19.app.database import (
+    apply_connection_profile,
+    configure_database_session,
+    in_memory_database,
+    migrate_query_created_at,
+    migrate_query_foreign_key_indexes,
+    prefill_pool,
+)
+from xcov19.app.settings import Database, Settings
+
+
+@pytest.mark.unit
+class ConnectionProfileTest(unittest.IsolatedAsyncioTestCase):
+    async def test_every_pooled_connection_gets_the_profile(self):
+        profile = Database(busy_timeout_ms=1234, cache_size_kib=1024)
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_async_engine(
+                f"sqlite+aiosqlite:///{Path(directory, 'xcov19.db')}"
+            )
+
+            @event.listens_for(engine.sync_engine, "connect")
+            def connect(dbapi_conn, _connection_record):
+                apply_connection_profile(dbapi_conn, profile)
+
+            pragmas = []
+            async with engine.connect() as first, engine.connect() as second:
+                for conn in (first, second):
+                    pragmas.append(
+                        [
+                            (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                            for name in (
+                                "journal_mode",
+                                "synchronous",
+                                "cache_size",
+                                "temp_store",
+                                "busy_timeout",
+                                "foreign_keys",
+                            )
+                        ]
+                    )
+            await engine.dispose()
+        # synchronous NORMAL is 1, temp_store MEMORY is 2.
+        self.assertEqual([["wal", 1, -1024, 2, 1234, 1]] * 2, pragmas)
+
+    async def test_prefill_pool_opens_connections_up_front(self):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_async_engine(
+                f"sqlite+aiosqlite:///{Path(directory, 'xcov19.db')}",
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=3,
+            )
+            await prefill_pool(engine, 3)
+            assert isinstance(engine.pool, AsyncAdaptedQueuePool)
+            checked_in = engine.pool.checkedin()
+            await engine.dispose()
+        self.assertEqual(3, checked_in)
+
+    def test_in_memory_urls(self):
+        for url in (
+            "sqlite+aiosqlite://",
+            "sqlite+aiosqlite:///:memory:",
+            "sqlite+aiosqlite:///file::memory:?uri=true",
+            "sqlite+aiosqlite:///file:xcov19?mode=memory&uri=true",
+        ):
+            self.assertTrue(in_memory_database(url), url)
+        self.assertFalse(in_memory_database("sqlite+aiosqlite:///xcov19.db"))
+
+    async def test_in_memory_database_is_shared_by_every_checkout(self):
+        container = Container()
+        configure_database_session(
+            container, Settings(db_engine_url="sqlite+aiosqlite://")
+        )
+        engine = container.resolve(AsyncEngine)
+        self.assertIsInstance(engine.pool, StaticPool)
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE patient (id INTEGER)"))
+        counts = []
+        for _ in range(6):
+            async with engine.connect() as conn:
+                counts.append(
+                    (await conn.execute(text("SELECT count(*) FROM patient"))).scalar()
+                )
+        await engine.dispose()
+        self.assertEqual([0] * 6, counts)
+
+    async def test_migrates_legacy_query_tables(self):
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "CREATE TABLE query (query_id TEXT PRIMARY KEY, query TEXT, "
+                    "patient_id TEXT, location_id TEXT)"
+                )
+            )
+            await conn.execute(
+                text("INSERT INTO query VALUES ('q1', 'cough', 'p1', 'l1')")
+            )
+            # Runs on every startup, the second run must be a no-op.
+            await migrate_query_created_at(conn)
+            await migrate_query_created_at(conn)
+            await migrate_query_foreign_key_indexes(conn)
+            await migrate_query_foreign_key_indexes(conn)
+            created_at = (
+                await conn.execute(text("SELECT created_at FROM query"))
+            ).scalar()
+            indexes = (await conn.execute(text("PRAGMA index_list(query)"))).fetchall()
+        await engine.dispose()
+        self.assertIsNotNone(created_at)
+        self.assertLessEqual(
+            {"ix_query_created_at", "ix_query_patient_id", "ix_query_location_id"},
+            {row[1] for row in indexes},
+        )
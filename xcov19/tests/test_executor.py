@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+import unittest
+
+import pytest
+
+from xcov19.utils.executor import (
+    BoundedExecutor,
+    ExecutorSaturatedError,
+    LookupTimeoutError,
+    run_lookup,
+)
+
+
+def current_thread_name() -> str:
+    return threading.current_thread().name
+
+
+@pytest.mark.unit
+class BoundedExecutorTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.executor = BoundedExecutor(
+            max_workers=1, queue_depth=1, timeout_seconds=1.0
+        )
+
+    def tearDown(self) -> None:
+        self.executor.shutdown()
+
+    async def test_sync_lookup_runs_off_event_loop(self):
+        thread_name = await run_lookup(self.executor, current_thread_name)
+        self.assertTrue(thread_name.startswith("xcov19-lookup"))
+
+    async def test_async_lookup_is_awaited_in_place(self):
+        async def lookup(value: int) -> int:
+            return value * 2
+
+        self.assertEqual(4, await run_lookup(self.executor, lookup, 2))
+
+    async def test_rejects_calls_beyond_capacity(self):
+        calls = [
+            asyncio.ensure_future(self.executor.run(time.sleep, 0.1)) for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        with self.assertRaises(ExecutorSaturatedError):
+            await self.executor.run(time.sleep, 0.1)
+        await asyncio.gather(*calls)
+        self.assertEqual(0, self.executor.in_flight)
+
+    async def test_times_out_slow_calls(self):
+        with self.assertRaises(LookupTimeoutError):
+            await self.executor.run(time.sleep, 0.5, timeout=0.05)
+        # The slot stays taken until the worker is actually done.
+        self.assertEqual(1, self.executor.in_flight)
+
+    async def test_process_pool_rejects_closures(self):
+        executor = BoundedExecutor(kind="process", max_workers=1)
+        try:
+            with self.assertRaises(TypeError):
+                await executor.run(lambda: 1)
+            self.assertEqual(3, await executor.run(len, "abc"))
+        finally:
+            executor.shutdown()
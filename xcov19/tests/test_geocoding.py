@@ -0,0 +1,92 @@
+import asyncio
+import unittest
+from typing import List
+
+import pytest
+
+from xcov19.dto import AnonymousId, Address, GeoLocation, LocationQueryJSON, QueryId
+from xcov19.infra.gazetteer import OfflineGazetteer
+from xcov19.services.geocoding import CachedReverseGeocoder, ReverseGeocoderBackend
+from xcov19.services.geolocation import GeolocationQueryService
+
+
+class CountingBackend(ReverseGeocoderBackend):
+    def __init__(self) -> None:
+        self.batches: List[list] = []
+
+    async def reverse_many(self, geo_locations: List[tuple]) -> List[dict]:
+        self.batches.append(list(geo_locations))
+        await asyncio.sleep(0)
+        return [{"city": f"{lat},{lng}"} for lat, lng in geo_locations]
+
+
+class HangingBackend(ReverseGeocoderBackend):
+    def __init__(self) -> None:
+        self.called = asyncio.Event()
+
+    async def reverse_many(self, geo_locations: List[tuple]) -> List[dict]:
+        self.called.set()
+        await asyncio.Event().wait()
+        return []
+
+
+@pytest.mark.unit
+class CachedReverseGeocoderTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.backend = CountingBackend()
+        self.geocoder = CachedReverseGeocoder(
+            self.backend, cell_precision=2, batch_window_ms=1
+        )
+
+    async def test_concurrent_lookups_in_same_cell_are_coalesced(self):
+        results = await asyncio.gather(
+            *(self.geocoder.reverse((12.9711, 77.5941)) for _ in range(10))
+        )
+        self.assertEqual(1, sum(len(batch) for batch in self.backend.batches))
+        self.assertTrue(
+            all(result == Address(city="12.97,77.59") for result in results)
+        )
+        self.assertEqual(9, self.geocoder.coalesced)
+
+    async def test_distinct_cells_are_batched_then_cached(self):
+        await asyncio.gather(
+            self.geocoder.reverse((12.97, 77.59)), self.geocoder.reverse((28.61, 77.2))
+        )
+        self.assertEqual([[(12.97, 77.59), (28.61, 77.2)]], self.backend.batches)
+        await self.geocoder.reverse((28.612, 77.201))
+        self.assertEqual(1, len(self.backend.batches))
+        self.assertEqual(1, self.geocoder.cache.hits)
+
+    async def test_cancelled_batch_releases_its_cells(self):
+        backend = HangingBackend()
+        geocoder = CachedReverseGeocoder(backend, max_batch_size=1)
+        lookup = asyncio.create_task(geocoder.reverse((12.97, 77.59)))
+        await backend.called.wait()
+        for task in geocoder._tasks:
+            task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await lookup
+        self.assertEqual({}, geocoder._pending)
+
+    async def test_resolves_coordinates_for_geolocation_service(self):
+        query = LocationQueryJSON(
+            location=GeoLocation(lat=12.97, lng=77.59),
+            cust_id=AnonymousId(cust_id="test_cust_id"),
+            query_id=QueryId(query_id="test_query_id"),
+        )
+        result = await GeolocationQueryService.resolve_coordinates(self.geocoder, query)
+        self.assertEqual(Address(city="12.97,77.59"), result)
+
+
+@pytest.mark.unit
+class OfflineGazetteerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_resolves_nearest_place_within_distance(self):
+        gazetteer = OfflineGazetteer(
+            [
+                {"lat": "12.97", "lng": "77.59", "city": "Bengaluru", "zip": "560001"},
+                {"lat": "13.08", "lng": "80.27", "city": "Chennai", "zip": "600001"},
+            ],
+            max_distance_km=20,
+        )
+        result = await gazetteer.reverse_many([(12.98, 77.6), (0.0, 0.0)])
+        self.assertEqual([{"city": "Bengaluru", "zip": "560001"}, {}], result)
@@ -28,10 +28,10 @@ class TestGeolocationAPI:
             },
         )
 
-        # The current implementation returns ok(), which is null in JSON
+        # The query is accepted for background processing.
         # response_text = await response.text()
         # assert response_text.lower() == "resource not found"
         # Assert the response
-        assert response.content_type() == b"text/plain; charset=utf-8"
-        # assert response.content == b''
-        assert response.status == 200
+        assert response.content_type() == b"application/json"
+        assert "job_id" in await response.json()
+        assert response.status == 202
@@ -0,0 +1,121 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+from blacksheep import Application, Request, Response
+from blacksheep.exceptions import NotFound
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from xcov19.app.errors import EXCEPTION_STATUSES, configure_error_handlers
+from xcov19.app.metrics import (
+    POOL_CHECKOUT_SECONDS,
+    QUERY_SECONDS,
+    REQUEST_SECONDS,
+    InstrumentedQueuePool,
+    instrument_engine,
+    timed_handler,
+)
+from xcov19.utils.metrics import CallbackMetric, MetricsRegistry
+from xcov19.utils.work_queue import QueueFullError
+
+
+@pytest.mark.unit
+class MetricsRegistryTest(unittest.TestCase):
+    def test_renders_prometheus_text_format(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("requests", "Requests.", ["route"])
+        requests.labels('/a"b').inc()
+        requests.labels('/a"b').inc(2)
+        latency = registry.histogram("latency_seconds", "Latency.", buckets=[0.1, 1])
+        for seconds in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(seconds)
+        registry.register(
+            CallbackMetric("depth", "Depth.", lambda: {("x",): 4}, ["queue"])
+        )
+        registry.register(CallbackMetric("hits", "Hits.", lambda: 7, kind="counter"))
+        self.assertEqual(
+            [
+                "# HELP requests_total Requests.",
+                "# TYPE requests_total counter",
+                'requests_total{route="/a\\"b"} 3',
+                "# HELP latency_seconds Latency.",
+                "# TYPE latency_seconds histogram",
+                'latency_seconds_bucket{le="0.1"} 2',
+                'latency_seconds_bucket{le="1"} 3',
+                'latency_seconds_bucket{le="+Inf"} 4',
+                "latency_seconds_sum 3.65",
+                "latency_seconds_count 4",
+                "# HELP depth Depth.",
+                "# TYPE depth gauge",
+                'depth{queue="x"} 4',
+                "# HELP hits_total Hits.",
+                "# TYPE hits_total counter",
+                "hits_total 7",
+            ],
+            registry.render().splitlines(),
+        )
+        with self.assertRaises(ValueError):
+            requests.labels()
+
+
+@pytest.mark.unit
+class RequestPathMetricsTest(unittest.IsolatedAsyncioTestCase):
+    async def test_requests_are_timed_per_route_and_status(self):
+        async def found(request: Request) -> Response:
+            return Response(200)
+
+        async def missing(request: Request) -> Response:
+            raise NotFound()
+
+        request = Request("GET", b"/geo/q1", None)
+        await timed_handler(found, "GET", "/geo/:query_id")(request)
+        with self.assertRaises(NotFound):
+            await timed_handler(missing, "GET", "/geo/:query_id")(request)
+        for status in ("200", "404"):
+            self.assertEqual(
+                1, REQUEST_SECONDS.labels("GET", "/geo/:query_id", status).count
+            )
+
+    async def test_handled_exceptions_are_timed_with_their_response_status(self):
+        async def shed(request: Request) -> Response:
+            raise QueueFullError("full")
+
+        async def broken(request: Request) -> Response:
+            raise RuntimeError("bug")
+
+        request = Request("POST", b"/diagnose", None)
+        for handler in (shed, broken):
+            with self.assertRaises(Exception):
+                await timed_handler(handler, "POST", "/diagnose")(request)
+        for status in ("429", "500"):
+            self.assertEqual(
+                1, REQUEST_SECONDS.labels("POST", "/diagnose", status).count
+            )
+
+    async def test_exception_statuses_match_the_error_handlers(self):
+        app = Application()
+        configure_error_handlers(app)
+        request = Request("GET", b"/", None)
+        for exception_type, status in EXCEPTION_STATUSES.items():
+            handler = app.exceptions_handlers[exception_type]
+            exception = exception_type.__new__(exception_type)
+            response = await handler(app, request, exception)
+            self.assertEqual(status, response.status, exception_type)
+
+    async def test_engine_times_pool_checkouts_and_statements(self):
+        checkouts = POOL_CHECKOUT_SECONDS.count
+        selects = QUERY_SECONDS.labels("SELECT").count
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_async_engine(
+                f"sqlite+aiosqlite:///{Path(directory) / 'metrics.db'}",
+                poolclass=InstrumentedQueuePool,
+            )
+            instrument_engine(engine)
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                await conn.execute(text("  select 2"))
+            await engine.dispose()
+        self.assertEqual(checkouts + 1, POOL_CHECKOUT_SECONDS.count)
+        self.assertEqual(selects + 2, QUERY_SECONDS.labels("SELECT").count)
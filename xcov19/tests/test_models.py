@@ -0,0 +1,47 @@
+import struct
+import unittest
+
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import sqlite
+
+from xcov19.infra.models import (
+    PointType,
+    Provider,
+    decode_point,
+    decode_points,
+    encode_point,
+)
+
+
+@pytest.mark.unit
+class PointTypeTest(unittest.TestCase):
+    def test_points_round_trip_as_wkb(self):
+        dialect = sqlite.dialect()
+        bind = PointType().bind_processor(dialect)
+        result = PointType().result_processor(dialect, None)
+        assert bind is not None and result is not None
+        wkb = bind((28.6139, 77.209))
+        self.assertEqual(21, len(wkb))
+        self.assertEqual((28.6139, 77.209), result(wkb))
+        self.assertIsNone(result(None))
+
+    def test_decodes_batches_and_big_endian_points(self):
+        points = [(12.97, 77.59), (-33.86, 151.2)]
+        big_endian = struct.pack(">BIdd", 0, 1, 1.5, -2.5)
+        self.assertEqual(points, decode_points([encode_point(p) for p in points]))
+        self.assertEqual(
+            [points[0], (1.5, -2.5)],
+            decode_points([encode_point(points[0]), big_endian]),
+        )
+        with self.assertRaises(ValueError):
+            decode_point(struct.pack("<BIdd", 1, 2, 0.0, 0.0))
+
+    def test_geopoint_sql_uses_spatialite_wkb_functions(self):
+        table = Provider.__table__
+        dialect = sqlite.dialect()
+        self.assertIn("GeomFromWKB(?, ?)", str(insert(table).compile(dialect=dialect)))
+        self.assertIn(
+            "AsBinary(provider.geopoint)",
+            str(select(table.c.geopoint).compile(dialect=dialect)),
+        )
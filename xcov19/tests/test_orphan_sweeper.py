@@ -0,0 +1,72 @@
+import unittest
+
+import pytest
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.domain.models.patient import Patient
+from xcov19.infra import models
+from xcov19.infra.location_cache import LocationCache
+from xcov19.infra.orphan_sweeper import OrphanSweeper, orphans_chunk
+from xcov19.infra.patient_store import persist_geolocation_queries
+from xcov19.tests.start_server import start_plain_sqlite_engine
+
+
+@pytest.mark.unit
+class OrphanSweeperTest(unittest.IsolatedAsyncioTestCase):
+    async def test_deletes_unreferenced_rows_in_chunks(self):
+        locations = LocationCache("off")
+        async with start_plain_sqlite_engine() as engine:
+            session_factory = async_sessionmaker(engine, class_=AsyncSessionWrapper)
+            async with session_factory() as session:
+                await persist_geolocation_queries(
+                    session,
+                    [
+                        Patient(f"c{n}", "", geo_location=(n, n), query_id=f"q{n}")
+                        for n in range(5)
+                    ],
+                    locations,
+                )
+                await session.commit()
+            async with engine.begin() as conn:
+                await conn.execute(
+                    delete(models.Query).where(col(models.Query.query_id) != "q0")
+                )
+            self.assertEqual(5, len(locations))
+            sweeper = OrphanSweeper(session_factory, chunk_size=3, locations=locations)
+            self.assertEqual(8, await sweeper.sweep())
+            self.assertEqual(
+                (4, 4), (sweeper.patients_deleted, sweeper.locations_deleted)
+            )
+            self.assertEqual(0, len(locations))
+            self.assertEqual(0, await sweeper.sweep())
+            async with session_factory() as session:
+                [patient] = (await session.exec(select(models.Patient))).all()
+                [location] = (await session.exec(select(models.Location))).all()
+        self.assertEqual("c0", patient.patient_id)
+        self.assertEqual((0, 0), (location.latitude, location.longitude))
+
+    async def test_orphan_checks_search_the_query_indexes(self):
+        async with start_plain_sqlite_engine() as engine:
+            async with engine.connect() as conn:
+                plans = []
+                for model, key in (
+                    (models.Patient, "patient_id"),
+                    (models.Location, "location_id"),
+                ):
+                    statement = orphans_chunk(model, key, 10).compile(
+                        engine.sync_engine, compile_kwargs={"literal_binds": True}
+                    )
+                    plan = await conn.execute(text(f"EXPLAIN QUERY PLAN {statement}"))
+                    plans.append([row[-1] for row in plan])
+        for key, plan in zip(("patient_id", "location_id"), plans):
+            self.assertTrue(
+                any(
+                    step.startswith("SEARCH query") and f"ix_query_{key}" in step
+                    for step in plan
+                ),
+                plan,
+            )
+            self.assertNotIn("SCAN query", plan)
@@ -0,0 +1,82 @@
+import unittest
+
+import pytest
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.domain.common import PageOptions, SortOrder
+from xcov19.infra import models
+from xcov19.infra.pagination import (
+    InvalidContinuationToken,
+    decode_token,
+    encode_token,
+    fetch_page,
+)
+from xcov19.tests.start_server import start_plain_sqlite_engine
+
+
+@pytest.mark.unit
+class KeysetPaginationTest(unittest.IsolatedAsyncioTestCase):
+    async def read_all_pages(
+        self, session: AsyncSessionWrapper, sort_order: SortOrder
+    ) -> list[list[str]]:
+        pages = []
+        options = PageOptions(limit=3, sort_order=sort_order)
+        while True:
+            page = await fetch_page(
+                session,
+                select(models.Location),
+                (col(models.Location.latitude), col(models.Location.location_id)),
+                options,
+            )
+            pages.append([location.location_id for location in page])
+            if page.continuation_id is None:
+                return pages
+            options = options.model_copy(
+                update={"continuation_id": page.continuation_id}
+            )
+
+    async def test_pages_follow_continuation_tokens(self):
+        async with start_plain_sqlite_engine() as engine:
+            async with AsyncSessionWrapper(engine) as session:
+                session.add_all(
+                    models.Location(
+                        location_id=f"l{n}", latitude=float(n % 4), longitude=n
+                    )
+                    for n in range(8)
+                )
+                await session.commit()
+                ascending = await self.read_all_pages(session, SortOrder.ASC)
+                descending = await self.read_all_pages(session, SortOrder.DESC)
+                page = await fetch_page(
+                    session,
+                    select(models.Location),
+                    (col(models.Location.location_id),),
+                    PageOptions(limit=100),
+                    with_total=True,
+                )
+        self.assertEqual(
+            [["l0", "l4", "l1"], ["l5", "l2", "l6"], ["l3", "l7"]], ascending
+        )
+        self.assertEqual(
+            [["l7", "l3", "l6"], ["l2", "l5", "l1"], ["l4", "l0"]], descending
+        )
+        self.assertEqual(8, page.total)
+        self.assertIsNone(page.continuation_id)
+
+    async def test_rejects_malformed_tokens(self):
+        async with start_plain_sqlite_engine() as engine:
+            async with AsyncSessionWrapper(engine) as session:
+                with self.assertRaises(InvalidContinuationToken):
+                    await fetch_page(
+                        session,
+                        select(models.Location),
+                        (col(models.Location.location_id),),
+                        PageOptions(continuation_id="not-a-token"),
+                    )
+
+    def test_rejects_tokens_with_non_scalar_keys(self):
+        self.assertEqual(["l1", 2], decode_token(encode_token(["l1", 2]), 2))
+        for key in ([["l1"]], [{"location_id": "l1"}]):
+            with self.assertRaises(InvalidContinuationToken):
+                decode_token(encode_token(key), 1)
@@ -0,0 +1,40 @@
+import unittest
+
+import pytest
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.domain.models.patient import Patient
+from xcov19.infra import models
+from xcov19.infra.patient_store import (
+    attach_diagnosis_queries,
+    persist_geolocation_queries,
+)
+from xcov19.tests.start_server import start_plain_sqlite_engine
+
+
+@pytest.mark.unit
+class PatientStoreWritesTest(unittest.IsolatedAsyncioTestCase):
+    async def test_geolocation_then_diagnosis_queries_are_stored(self):
+        async with start_plain_sqlite_engine() as engine:
+            async with AsyncSessionWrapper(engine) as session:
+                pending = await attach_diagnosis_queries(
+                    session,
+                    [Patient(cust_id="", query="fever", query_id="q1")],
+                )
+                self.assertEqual(1, len(pending))
+                await persist_geolocation_queries(
+                    session,
+                    [
+                        Patient("c1", "", geo_location=(1.0, 2.0), query_id="q1"),
+                        Patient("c2", "", geo_location=(1.0, 2.0), query_id="q2"),
+                    ],
+                )
+                pending = await attach_diagnosis_queries(session, pending)
+                self.assertEqual([], pending)
+                queries = (await session.exec(select(models.Query))).all()
+                locations = (await session.exec(select(models.Location))).all()
+        self.assertEqual(
+            {"q1": "fever", "q2": ""}, {q.query_id: q.query for q in queries}
+        )
+        self.assertEqual(1, len(locations))
@@ -0,0 +1,84 @@
+import pstats
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+from blacksheep import Request, Response
+
+from xcov19.app.middleware import profiling_middleware
+from xcov19.app.profiling import profiles_endpoint
+from xcov19.utils.profiling import RequestProfiler
+
+
+def slow_sum(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+@pytest.mark.unit
+class ProfilingMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+    async def handle(self, middleware, size: int, profile: bool) -> Response:
+        async def handler(request: Request) -> Response:
+            slow_sum(size)
+            return Response(200)
+
+        headers = [(b"X-Profile", b"token")] if profile else []
+        return await middleware(Request("GET", b"/geo", headers), handler)
+
+    async def test_profiles_requests_with_the_header_and_keeps_the_slowest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = RequestProfiler(directory, keep=2)
+            middleware = profiling_middleware(profiler, "X-Profile", "token")
+            await self.handle(middleware, 10, profile=False)
+            self.assertEqual(0, profiler.captured)
+            for size in (10, 200_000, 100_000, 50):
+                await self.handle(middleware, size, profile=True)
+            await profiler.drain()
+            self.assertEqual(4, profiler.captured)
+            slowest = profiler.slowest()
+            self.assertEqual(2, len(slowest))
+            self.assertGreater(slowest[0].duration_ms, slowest[1].duration_ms)
+            self.assertEqual(
+                sorted(record.file for record in slowest),
+                sorted(path.name for path in Path(directory).iterdir()),
+            )
+            stats = pstats.Stats(str(Path(directory) / slowest[0].file))
+            functions = stats.get_stats_profile().func_profiles
+            self.assertIn("slow_sum", functions)
+
+    async def test_ignores_the_header_without_a_matching_token(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = RequestProfiler(directory)
+            for token in (None, "other"):
+                middleware = profiling_middleware(profiler, "X-Profile", token)
+                await self.handle(middleware, 10, profile=True)
+            await profiler.drain()
+        self.assertEqual(0, profiler.captured)
+
+    async def test_writes_collapsed_stacks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = RequestProfiler(
+                directory, output_format="collapsed", sample_rate=1.0
+            )
+            await self.handle(
+                profiling_middleware(profiler, "X-Profile"), 100_000, False
+            )
+            await profiler.drain()
+            [record] = profiler.slowest()
+            lines = (Path(directory) / record.file).read_text().splitlines()
+        self.assertTrue(
+            any(line.startswith("slow_sum (test_profiling.py") for line in lines)
+        )
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+
+    async def test_profiles_endpoint_validates_the_limit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            endpoint = profiles_endpoint(RequestProfiler(directory))
+            for query, status in (
+                (b"", 200),
+                (b"?limit=2", 200),
+                (b"?limit=two", 400),
+                (b"?limit=-1", 400),
+            ):
+                response = await endpoint(Request("GET", b"/profiles" + query, []))
+                self.assertEqual(status, response.status, query)
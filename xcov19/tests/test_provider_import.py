@@ -0,0 +1,169 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from xcov19.app.database import setup_database
+from xcov19.infra.models import Provider
+from xcov19.infra.provider_import import (
+    ImportStats,
+    InvalidProviderRecord,
+    import_providers,
+    provider_row,
+    read_records,
+    valid_rows,
+)
+
+CSV_REGISTRY = """name,address,lat,lng,contact,facility_type,ownership,specialties,stars,reviews,available_doctors
+City Clinic,1 Main Road,28.61,77.2,+911234567890,clinic,private,general|ent,4,12,"[{""name"": ""Dr. A"", ""specialties"": [""ent""], ""degree"": [""MBBS""], ""experience"": 5, ""fee"": 200}]"
+Bad Clinic,2 Main Road,128.61,77.2,+911234567890,clinic,private,general,4,12,
+"""
+
+
+@pytest.mark.unit
+class ProviderImportTest(unittest.TestCase):
+    def test_reads_and_validates_csv_records(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, "registry.csv")
+            path.write_text(CSV_REGISTRY)
+            stats = ImportStats()
+            rows = list(valid_rows(read_records(path), stats))
+        self.assertEqual((2, 1), (stats.read, stats.rejected))
+        [row] = rows
+        self.assertEqual((28.61, 77.2), row["geopoint"])
+        self.assertEqual(911234567890, row["contact"])
+        self.assertEqual(["general", "ent"], row["specialties"])
+        self.assertEqual("Dr. A", row["available_doctors"][0]["name"])
+        # Ids without a provider_id column are stable across imports.
+        reimported = provider_row(
+            {
+                "name": "City Clinic",
+                "address": "1 Main Road",
+                "lat": 28.61,
+                "lng": 77.2,
+                "contact": "+911234567890",
+                "facility_type": "clinic",
+                "ownership": "private",
+                "stars": 5,
+            }
+        )
+        self.assertEqual(row["provider_id"], reimported["provider_id"])
+
+    def test_stores_normalized_specialties(self):
+        row = provider_row(
+            {
+                "name": "City Clinic",
+                "address": "1 Main Road",
+                "lat": 28.61,
+                "lng": 77.2,
+                "contact": "+911234567890",
+                "facility_type": "clinic",
+                "ownership": "private",
+                "stars": 5,
+                "specialties": "General_Medicine| general  medicine | |ENT",
+                "available_doctors": [
+                    {
+                        "name": "Dr. A",
+                        "specialties": ["Ear-Nose-Throat"],
+                        "degree": ["MBBS"],
+                        "experience": 5,
+                        "fee": 200,
+                    }
+                ],
+            }
+        )
+        self.assertEqual(["general medicine", "ent"], row["specialties"])
+        self.assertEqual(
+            ["ear nose throat"], row["available_doctors"][0]["specialties"]
+        )
+
+    def test_reads_jsonl_records(self):
+        record = {
+            "provider_id": "p1",
+            "name": "Lab",
+            "address": "3 Main Road",
+            "geopoint": [12.97, 77.59],
+            "contact": "08012345678",
+            "facility_type": "lab",
+            "ownership": "government",
+            "specialties": ["pathology"],
+            "stars": 4.6,
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, "registry.jsonl")
+            path.write_text(json.dumps(record) + "\n\n")
+            [raw] = read_records(path)
+        assert isinstance(raw, dict)
+        row = provider_row(raw)
+        self.assertEqual("p1", row["provider_id"])
+        self.assertEqual((12.97, 77.59), row["geopoint"])
+        self.assertEqual((5, 0), (row["stars"], row["reviews"]))
+
+    def test_rejects_malformed_jsonl_lines(self):
+        record = {
+            "name": "Lab",
+            "address": "3 Main Road",
+            "geopoint": [12.97, 77.59],
+            "contact": "08012345678",
+            "facility_type": "lab",
+            "ownership": "government",
+            "stars": 4,
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, "registry.jsonl")
+            path.write_text(
+                "\n".join([json.dumps(record), '{"name": "Cut', "[1, 2]"]) + "\n"
+            )
+            stats = ImportStats()
+            rows = list(valid_rows(read_records(path), stats))
+        self.assertEqual(["Lab"], [row["name"] for row in rows])
+        self.assertEqual((3, 2), (stats.read, stats.rejected))
+
+    def test_rejects_unknown_facility_type(self):
+        with self.assertRaises(InvalidProviderRecord):
+            provider_row(
+                {
+                    "name": "X",
+                    "address": "Y",
+                    "lat": 0,
+                    "lng": 0,
+                    "contact": "1",
+                    "facility_type": "spa",
+                    "ownership": "private",
+                    "stars": 3,
+                }
+            )
+
+
+@pytest.mark.integration
+class ImportProvidersTest(unittest.IsolatedAsyncioTestCase):
+    """Needs SQLite built with loadable extensions and mod_spatialite."""
+
+    async def test_upserts_rows_in_batches(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, "registry.csv")
+            path.write_text(CSV_REGISTRY)
+            engine = create_async_engine(
+                f"sqlite+aiosqlite:///{Path(directory, 'xcov19.db')}"
+            )
+            await setup_database(engine)
+            first = await import_providers(
+                engine, read_records(path), batch_size=1, transaction_rows=1
+            )
+            # Importing again updates the rows instead of duplicating them.
+            path.write_text(CSV_REGISTRY.replace("general|ent,4,12", "general,5,99"))
+            second = await import_providers(engine, read_records(path))
+            async with engine.connect() as conn:
+                rows = (await conn.execute(select(Provider.__table__))).all()
+            await engine.dispose()
+        self.assertEqual((2, 1, 1), (first.read, first.imported, first.rejected))
+        self.assertEqual(1, second.imported)
+        [row] = rows
+        self.assertEqual((28.61, 77.2), row.geopoint)
+        self.assertEqual(
+            (["general"], 5, 99), (row.specialties, row.stars, row.reviews)
+        )
@@ -0,0 +1,86 @@
+import tempfile
+import unittest
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.domain.models.patient import Patient
+from xcov19.infra import models
+from xcov19.infra.orphan_sweeper import OrphanSweeper
+from xcov19.infra.patient_store import persist_geolocation_queries
+from xcov19.infra.query_archive import (
+    JsonlQueryArchive,
+    QueryRetention,
+    SqliteQueryArchive,
+)
+from xcov19.tests.start_server import start_plain_sqlite_engine
+
+
+@pytest.mark.unit
+class QueryRetentionTest(unittest.IsolatedAsyncioTestCase):
+    async def test_archives_expired_queries_by_month(self):
+        for archive_type in (SqliteQueryArchive, JsonlQueryArchive):
+            with (
+                self.subTest(archive_type.__name__),
+                tempfile.TemporaryDirectory() as directory,
+            ):
+                await self.check_archival(archive_type(directory))
+
+    async def check_archival(self, archive):
+        created_at = {
+            "q1": datetime(2024, 1, 31, 23, 59),
+            "q2": datetime(2024, 2, 1),
+            "q3": datetime(2024, 2, 15),
+        }
+        async with start_plain_sqlite_engine() as engine:
+            session_factory = async_sessionmaker(engine, class_=AsyncSessionWrapper)
+            async with session_factory() as session:
+                await persist_geolocation_queries(
+                    session,
+                    [
+                        Patient("c1", "fever", geo_location=(1.0, 2.0), query_id="q1"),
+                        Patient("c2", "cough", geo_location=(3.0, 4.0), query_id="q2"),
+                        Patient("c2", "cold", geo_location=(3.0, 4.0), query_id="q3"),
+                        Patient("c3", "", geo_location=(5.0, 6.0), query_id="q4"),
+                    ],
+                )
+                await session.commit()
+            async with engine.begin() as conn:
+                for query_id, timestamp in created_at.items():
+                    await conn.execute(
+                        update(models.Query)
+                        .where(col(models.Query.query_id) == query_id)
+                        .values(created_at=timestamp)
+                    )
+            sweeper = OrphanSweeper(session_factory)
+            retention = QueryRetention(
+                session_factory, archive, chunk_size=2, sweeper=sweeper
+            )
+            self.assertEqual(3, await retention.archive_expired())
+            self.assertEqual(0, await retention.archive_expired())
+            self.assertEqual(["2024-02", "2024-01"], archive.months())
+            self.assertEqual(
+                (2, 2), (sweeper.patients_deleted, sweeper.locations_deleted)
+            )
+            async with session_factory() as session:
+                remaining = (await session.exec(select(models.Query.query_id))).all()
+            self.assertEqual(["q4"], remaining)
+            archived = await retention.get("q2")
+            assert archived is not None
+            self.assertEqual(
+                ("cough", "c2", (3.0, 4.0), created_at["q2"]),
+                (
+                    archived.query,
+                    archived.patient_id,
+                    (archived.latitude, archived.longitude),
+                    archived.created_at,
+                ),
+            )
+            kept = await retention.get("q4")
+            assert kept is not None
+            self.assertEqual("q4", kept.query_id)
+            self.assertIsNone(await retention.get("q5"))
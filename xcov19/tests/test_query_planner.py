@@ -0,0 +1,237 @@
+import random
+import sqlite3
+import unittest
+
+import pytest
+from sqlalchemy import and_, select
+from sqlalchemy.dialects import sqlite
+from sqlmodel import col
+
+from xcov19.domain.models.provider import (
+    Doctor,
+    FacilityEstablishment,
+    FacilityOwnership,
+    ProviderFilter,
+)
+from xcov19.dto import (
+    Address,
+    AnonymousId,
+    FacilityFilters,
+    GeoLocation,
+    LocationQueryJSON,
+    QueryId,
+)
+from xcov19.infra import models
+from xcov19.infra.query_planner import plan_search, search_view
+from xcov19.infra.repository import InMemoryProviderRepo, SqliteProviderRepo
+from xcov19.infra.snapshot import ProviderSnapshot, SnapshotView
+from xcov19.services.geolocation import nearby_facilities_lookup
+from xcov19.tests.test_spatial_index import dummy_provider
+from xcov19.utils.geo import haversine_km
+
+FACILITY_TYPES = list(FacilityEstablishment)
+OWNERSHIPS = list(FacilityOwnership)
+
+
+def random_provider(n: int, rng: random.Random):
+    provider = dummy_provider(
+        f"Provider {n}", rng.uniform(12.0, 13.0), rng.uniform(77.0, 78.0)
+    )
+    provider.facility_type = rng.choice(FACILITY_TYPES)
+    provider.ownership = rng.choice(OWNERSHIPS)
+    provider.stars = rng.randint(1, 5)
+    provider.specialties = rng.sample(["general", "ent", "cardiology"], 1)
+    if n % 50 == 0:
+        provider.specialties.append("oncology")
+    provider.available_doctors = [
+        Doctor("Dr. A", ["pathology"] if n % 7 == 0 else [], ["MBBS"], 5, n % 900)
+    ]
+    return provider
+
+
+def matches(provider, provider_filter: ProviderFilter) -> bool:
+    offered = {*provider.specialties} | {
+        specialty
+        for doctor in provider.available_doctors
+        for specialty in doctor.specialties
+    }
+    wanted = provider_filter.specialties
+    return (
+        (
+            not provider_filter.facility_types
+            or provider.facility_type in provider_filter.facility_types
+        )
+        and (
+            not provider_filter.ownerships
+            or provider.ownership in provider_filter.ownerships
+        )
+        and provider.stars >= (provider_filter.min_stars or 1)
+        and (
+            not wanted
+            or (
+                wanted <= offered
+                if provider_filter.match_all_specialties
+                else bool(wanted & offered)
+            )
+        )
+        and (
+            provider_filter.max_fee is None
+            or any(d.fee <= provider_filter.max_fee for d in provider.available_doctors)
+        )
+    )
+
+
+@pytest.mark.unit
+class QueryPlannerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = random.Random(7)
+        self.providers = {f"p{n}": random_provider(n, rng) for n in range(3000)}
+        self.snapshot = ProviderSnapshot.from_providers(
+            self.providers.items(), cell_size_km=2.0
+        )
+        self.center = (12.5, 77.5)
+
+    def test_picks_the_most_selective_index(self):
+        def driver(radius_km, provider_filter):
+            plan = plan_search(self.snapshot, self.center, radius_km, provider_filter)
+            return plan.driver, plan.attribute
+
+        rare = ProviderFilter(specialties=frozenset(["Oncology"]))
+        self.assertEqual(("specialty", None), driver(500.0, rare))
+        self.assertEqual(("spatial", None), driver(1.0, rare))
+        self.assertEqual(
+            ("attribute", "stars"), driver(500.0, ProviderFilter(min_stars=5))
+        )
+        self.assertEqual(("spatial", None), driver(500.0, None))
+
+    def test_filtered_search_matches_a_full_scan(self):
+        view = SnapshotView(self.snapshot)
+        for radius_km, provider_filter in [
+            (500.0, ProviderFilter(specialties=frozenset(["oncology", "pathology"]))),
+            (
+                30.0,
+                ProviderFilter(
+                    specialties=frozenset(["ent", "pathology"]),
+                    match_all_specialties=False,
+                    max_fee=300,
+                ),
+            ),
+            (
+                500.0,
+                ProviderFilter(
+                    facility_types=frozenset([FacilityEstablishment.LAB]),
+                    ownerships=frozenset(
+                        [FacilityOwnership.CHARITY, FacilityOwnership.PUBLIC]
+                    ),
+                    min_stars=4,
+                ),
+            ),
+        ]:
+            expected = sorted(
+                provider.name
+                for provider in self.providers.values()
+                if haversine_km(self.center, provider.geo_location) <= radius_km
+                and matches(provider, provider_filter)
+            )
+            hits = search_view(view, self.center, radius_km, provider_filter)
+            self.assertEqual(
+                expected,
+                sorted(
+                    snapshot.provider(position).name for snapshot, position, _ in hits
+                ),
+            )
+            distances = [distance for _, _, distance in hits]
+            self.assertEqual(sorted(distances), distances)
+
+    def test_blank_specialties_are_rejected(self):
+        with self.assertRaises(ValueError):
+            FacilityFilters(
+                specialties=["ent", " _- "],
+                min_stars=None,
+                max_distance_km=None,
+                max_fee=None,
+            )
+        filters = FacilityFilters(
+            specialties=["ent"], min_stars=None, max_distance_km=None, max_fee=None
+        )
+        self.assertEqual(["ent"], filters.specialties)
+
+    def test_location_query_filters_narrow_the_lookup(self):
+        repo = InMemoryProviderRepo()
+        lab, far_lab = (
+            dummy_provider("Lab", 0.01, 0.0),
+            dummy_provider("Far Lab", 0.2, 0.0),
+        )
+        lab.facility_type = far_lab.facility_type = FacilityEstablishment.LAB
+        repo.apply_changes(
+            [
+                ("clinic", dummy_provider("Clinic", 0.02, 0.0)),
+                ("lab", lab),
+                ("far lab", far_lab),
+            ]
+        )
+        query = LocationQueryJSON(
+            location=GeoLocation(lat=0, lng=0),
+            cust_id=AnonymousId(cust_id="cust"),
+            query_id=QueryId(query_id="query"),
+            filters=FacilityFilters(
+                facility_type=[FacilityEstablishment.LAB],
+                min_stars=None,
+                max_distance_km=5,
+                max_fee=None,
+            ),
+        )
+        result = nearby_facilities_lookup(repo)(Address(), query)
+        self.assertEqual(["Lab"], [facility.name for facility in result])
+
+
+@pytest.mark.unit
+class SqlFilterPushdownTest(unittest.TestCase):
+    def test_filter_clauses_select_matching_rows(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute(
+            "CREATE TABLE provider (provider_id, facility_type, ownership_type, "
+            "stars, specialties, available_doctors)"
+        )
+        conn.executemany(
+            "INSERT INTO provider VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                ("a", "lab", "private", 4, '["general medicine"]', "[]"),
+                (
+                    "b",
+                    "lab",
+                    "private",
+                    5,
+                    "[]",
+                    '[{"specialties": ["general medicine"], "fee": 150}]',
+                ),
+                ("c", "clinic", "private", 5, '["general medicine"]', "[]"),
+                ("d", "lab", "charity", 2, '["general medicine", "ent"]', "[]"),
+            ],
+        )
+
+        def provider_ids(provider_filter: ProviderFilter):
+            statement = select(col(models.Provider.provider_id)).where(
+                and_(*SqliteProviderRepo.filter_clauses(provider_filter))
+            )
+            sql = statement.compile(
+                dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}
+            )
+            return sorted(row[0] for row in conn.execute(str(sql)))
+
+        general = ProviderFilter(
+            facility_types=frozenset([FacilityEstablishment.LAB]),
+            specialties=frozenset(["General Medicine"]),
+        )
+        self.assertEqual(["a", "b", "d"], provider_ids(general))
+        self.assertEqual(
+            ["a", "b", "c"],
+            provider_ids(
+                ProviderFilter(
+                    ownerships=frozenset([FacilityOwnership.PRIVATE]),
+                    specialties=general.specialties,
+                    min_stars=3,
+                )
+            ),
+        )
+        self.assertEqual(["b"], provider_ids(ProviderFilter(max_fee=200)))
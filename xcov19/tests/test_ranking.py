@@ -0,0 +1,53 @@
+import unittest
+
+import pytest
+
+from xcov19.services.ranking import (
+    RankingWeights,
+    haversine_km_many,
+    rank_candidates,
+    specialty_match,
+)
+from xcov19.utils.geo import haversine_km
+
+ORIGIN = (12.97, 77.59)
+CANDIDATES = {
+    "lats": [12.97, 12.98, 13.05, 12.97],
+    "lngs": [77.60, 77.59, 77.59, 77.59],
+    "stars": [1, 5, 5, 5],
+    "reviews": [0, 500, 500, 5],
+    "specialties": [["general"], ["cardiology"], ["cardiology", "ent"], []],
+}
+
+
+@pytest.mark.unit
+class RankingTest(unittest.TestCase):
+    def test_ranks_candidates(self):
+        distances = haversine_km_many(ORIGIN, CANDIDATES["lats"], CANDIDATES["lngs"])
+        for lat, lng, distance in zip(
+            CANDIDATES["lats"], CANDIDATES["lngs"], distances
+        ):
+            self.assertAlmostEqual(haversine_km(ORIGIN, (lat, lng)), distance)
+        ranked = rank_candidates(ORIGIN, **CANDIDATES, limit=3)
+        self.assertEqual([1, 2, 3], [candidate.rank for candidate in ranked])
+        # Stars and reviews outweigh a kilometre, a 1 star facility next door
+        # ranks last.
+        self.assertEqual([1, 3, 0], [candidate.index for candidate in ranked])
+        wanted = rank_candidates(
+            ORIGIN,
+            **CANDIDATES,
+            wanted_specialties=["ent"],
+            weights=RankingWeights(distance=0.1, stars=0, reviews=0, specialty=1),
+            limit=1,
+        )
+        self.assertEqual(2, wanted[0].index)
+        self.assertAlmostEqual(distances[2] / 30 * 60, wanted[0].estimated_minutes, 1)
+        self.assertEqual([], rank_candidates(ORIGIN, [], [], [], [], []))
+
+    def test_specialty_match_scores_share_of_wanted_specialties(self):
+        self.assertEqual(
+            [0.0, 0.5, 1.0, 0.0],
+            specialty_match(CANDIDATES["specialties"], [" ENT", "Cardiology"]).tolist(),
+        )
+        self.assertEqual([1.0, 1.0], specialty_match([[], ["ent"]], []).tolist())
+        self.assertEqual([], specialty_match([], ["ent"]).tolist())
@@ -0,0 +1,64 @@
+import gzip
+import json
+import unittest
+
+import pytest
+from blacksheep import Request
+
+from xcov19.app.responses import JSONResponder, accepted_encodings
+from xcov19.infra.result_store import facilities_adapter
+from xcov19.tests.test_result_store import facilities_result
+
+
+def request(accept_encoding: bytes | None = None) -> Request:
+    headers = [(b"Accept-Encoding", accept_encoding)] if accept_encoding else []
+    return Request("GET", b"/geo/q1", headers)
+
+
+@pytest.mark.unit
+class JSONResponderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.results = [facilities_result(f"Facility {n}") for n in range(50)]
+        self.expected = [result.model_dump(mode="json") for result in self.results]
+
+    def test_parses_accept_encoding_quality_values(self):
+        self.assertEqual(
+            {"gzip": 1.0, "br": 0.5, "identity": 0.0},
+            accepted_encodings(b"gzip, br;q=0.5, identity;q=oops"),
+        )
+
+    def test_compresses_large_bodies_with_an_accepted_encoding(self):
+        responder = JSONResponder(min_bytes=1024)
+        response = responder.json(
+            request(b"deflate, gzip;q=0.8"), facilities_adapter, self.results
+        )
+        self.assertEqual(b"gzip", response.headers.get_first(b"Content-Encoding"))
+        self.assertEqual(b"Accept-Encoding", response.headers.get_first(b"Vary"))
+        assert response.content is not None
+        self.assertEqual(b"application/json", response.content.type)
+        self.assertEqual(
+            self.expected, json.loads(gzip.decompress(response.content.body))
+        )
+
+    def test_sends_identity_when_small_or_not_accepted(self):
+        responder = JSONResponder(min_bytes=1024)
+        for accept_encoding, results in [
+            (b"gzip", self.results[:1]),
+            (None, self.results),
+            (b"gzip;q=0, identity", self.results),
+        ]:
+            response = responder.json(
+                request(accept_encoding), facilities_adapter, results
+            )
+            self.assertIsNone(response.headers.get_first(b"Content-Encoding"))
+            assert response.content is not None
+            self.assertEqual(
+                self.expected[: len(results)], json.loads(response.content.body)
+            )
+
+    def test_ignores_unsupported_encodings(self):
+        responder = JSONResponder()
+        self.assertTrue(responder.accepts_gzip(request(b"br, gzip;q=0.5")))
+        self.assertTrue(responder.accepts_gzip(request(b"br, *")))
+        self.assertFalse(responder.accepts_gzip(request(b"br, deflate")))
+        self.assertFalse(responder.accepts_gzip(request(b"*, gzip;q=0")))
@@ -0,0 +1,98 @@
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.dto import Address, FacilitiesResult, GeoLocation
+from xcov19.infra.result_store import FacilitiesResultStore, facilities_adapter
+from xcov19.services.geolocation import SERIALIZATION_SECONDS
+from xcov19.tests.start_server import start_plain_sqlite_engine
+
+
+def facilities_result(name: str) -> FacilitiesResult:
+    return FacilitiesResult(
+        name=name,
+        address=Address(),
+        geolocation=GeoLocation(lat=1.0, lng=2.0),
+        contact="1234",
+        facility_type="hospital",
+        ownership="public",
+        specialties=["cardiology"],
+        stars=4,
+        reviews=10,
+        rank=1,
+        estimated_time=2.5,
+    )
+
+
+@pytest.mark.unit
+class FacilitiesResultStoreTest(unittest.IsolatedAsyncioTestCase):
+    async def test_results_are_served_from_memory_then_database(self):
+        async with start_plain_sqlite_engine() as engine:
+            session_factory = async_sessionmaker(engine, class_=AsyncSessionWrapper)
+            store = FacilitiesResultStore(session_factory)
+            results = [facilities_result("General Hospital")]
+            self.assertIsNone(await store.get("c1", "q1"))
+            await store.put("c1", "q1", results)
+            self.assertEqual(results, await store.get("c1", "q1"))
+            # A fresh store, as after a restart, reads the database tier.
+            restarted = FacilitiesResultStore(session_factory)
+            self.assertEqual(results, await restarted.get("c1", "q1"))
+            self.assertEqual(results, await restarted.get("c1", "q1"))
+            self.assertIsNone(await restarted.get("c2", "q1"))
+        self.assertEqual((1, 1), (store.hits, store.misses))
+        self.assertEqual((1, 1), (restarted.cache.hits, restarted.db_hits))
+        self.assertEqual(1, restarted.misses)
+
+    async def test_json_is_served_as_stored(self):
+        async with start_plain_sqlite_engine() as engine:
+            session_factory = async_sessionmaker(engine, class_=AsyncSessionWrapper)
+            results = [facilities_result("General Hospital")]
+            await FacilitiesResultStore(session_factory).put("c1", "q1", results)
+            restarted = FacilitiesResultStore(session_factory)
+            body = await restarted.get_json("c1", "q1")
+            self.assertEqual(facilities_adapter.dump_json(results), body)
+            self.assertIs(body, await restarted.get_json("c1", "q1"))
+        self.assertEqual((1, 1), (restarted.cache.hits, restarted.db_hits))
+
+    async def test_batches_are_stored_in_one_transaction(self):
+        async with start_plain_sqlite_engine() as engine:
+            commits = []
+            event.listen(engine.sync_engine, "commit", commits.append)
+            session_factory = async_sessionmaker(engine, class_=AsyncSessionWrapper)
+            store = FacilitiesResultStore(session_factory)
+            serializations = SERIALIZATION_SECONDS.count
+            await store.put("c1", "q1", [])
+            first, second = facilities_result("First"), facilities_result("Second")
+            await store.put_many([("c1", "q1", [first]), ("c2", "q2", [second])])
+            restarted = FacilitiesResultStore(session_factory)
+            self.assertEqual([first], await restarted.get("c1", "q1"))
+            self.assertEqual([second], await restarted.get("c2", "q2"))
+        self.assertEqual(2, len(commits))
+        self.assertEqual(serializations + 2, SERIALIZATION_SECONDS.count)
+
+    async def test_results_are_cached_only_once_committed(self):
+        async with start_plain_sqlite_engine() as engine:
+            session_factory = async_sessionmaker(engine, class_=AsyncSessionWrapper)
+            store = FacilitiesResultStore(session_factory)
+            failing_commit = AsyncMock(side_effect=OSError("disk I/O error"))
+            with patch.object(AsyncSessionWrapper, "commit", failing_commit):
+                with self.assertRaises(OSError):
+                    await store.put("c1", "q1", [facilities_result("Lost")])
+            self.assertIsNone(store.cache.get(("c1", "q1")))
+            self.assertIsNone(await store.get("c1", "q1"))
+
+    async def test_expired_results_are_evicted(self):
+        async with start_plain_sqlite_engine() as engine:
+            session_factory = async_sessionmaker(engine, class_=AsyncSessionWrapper)
+            store = FacilitiesResultStore(session_factory, ttl_seconds=0.05)
+            await store.put("c1", "q1", [])
+            self.assertEqual([], await store.get("c1", "q1"))
+            time.sleep(0.06)
+            self.assertIsNone(await store.get("c1", "q1"))
+            self.assertEqual(1, await store.evict_expired())
+            self.assertEqual(0, await store.evict_expired())
@@ -1,3 +1,4 @@
+import asyncio
 from collections.abc import Callable
 from typing import List
 import pytest
@@ -17,11 +18,21 @@ from xcov19.domain.repository_interface import IProviderRepository
 from xcov19.services.geolocation import (
     LocationQueryServiceInterface,
     GeolocationQueryService,
+    geolocation_service,
+)
+from xcov19.dto import (
+    Address,
+    AnonymousId,
+    LocationQueryJSON,
+    FacilitiesResult,
+    FacilityFilters,
+    GeoLocation,
+    QueryId,
 )
-from xcov19.dto import Address, LocationQueryJSON, FacilitiesResult, GeoLocation
 
 
 from xcov19.utils.mixins import InterfaceProtocolCheckMixin
+from xcov19.utils.single_flight import SingleFlight
 
 RANDOM_SEED = random.seed(1)
 
@@ -124,7 +135,7 @@ class GeoLocationServiceInterfaceTest(unittest.IsolatedAsyncioTestCase):
         dummy_geolocation_query_json: LocationQueryJSON,
         dummy_reverse_geo_lookup_svc: Callable[[LocationQueryJSON], dict],
         dummy_patient_query_lookup_svc: Callable[[Address, LocationQueryJSON], list],
-        stub_location_srvc: LocationQueryServiceInterface,
+        stub_location_srvc: type[LocationQueryServiceInterface],
     ):
         self.dummy_geolocation_query_json = dummy_geolocation_query_json
         self.dummy_reverse_geo_lookup_svc = dummy_reverse_geo_lookup_svc
@@ -279,3 +290,56 @@ class PatientQueryLookupSvcTest(unittest.IsolatedAsyncioTestCase):
         self.assertTrue(
             all(isinstance(provider, FacilitiesResult) for provider in providers)
         )
+
+
+@pytest.mark.unit
+class GeoLocationCoalescingTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.service = geolocation_service(coalescer=SingleFlight())
+        self.lookups = 0
+
+    async def reverse_geo_lookup_svc(self, query: LocationQueryJSON) -> dict:
+        return {}
+
+    async def patient_query_lookup_svc(
+        self, address: Address, query: LocationQueryJSON
+    ) -> List[FacilitiesResult]:
+        self.lookups += 1
+        await asyncio.sleep(0.01)
+        return stub_get_facilities_by_patient_query(address, query)
+
+    def query(
+        self, lat: float, lng: float, min_stars: int | None = None
+    ) -> LocationQueryJSON:
+        return LocationQueryJSON(
+            location=GeoLocation(lat=lat, lng=lng),
+            cust_id=AnonymousId(cust_id=f"cust {lat} {lng}"),
+            query_id=QueryId(query_id=f"query {lat} {lng}"),
+            filters=FacilityFilters(
+                min_stars=min_stars, max_distance_km=None, max_fee=None
+            ),
+        )
+
+    async def test_concurrent_queries_in_one_cell_share_a_lookup(self):
+        queries = [
+            self.query(12.97161, 77.59461),
+            self.query(12.97164, 77.59458),
+            self.query(12.97162, 77.59460),
+            self.query(12.97162, 77.59460, min_stars=4),
+            self.query(12.98, 77.6),
+        ]
+        results = await asyncio.gather(
+            *(
+                self.service.fetch_facilities(
+                    self.reverse_geo_lookup_svc, query, self.patient_query_lookup_svc
+                )
+                for query in queries
+            )
+        )
+        self.assertEqual(3, self.lookups)
+        self.assertIs(results[0], results[1])
+        self.assertIs(results[0], results[2])
+        coalescer = self.service.coalescer
+        assert coalescer is not None
+        self.assertEqual((5, 2), (coalescer.calls, coalescer.deduplicated))
+        self.assertEqual(0, len(coalescer))
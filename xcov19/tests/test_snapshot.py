@@ -0,0 +1,196 @@
+import unittest
+
+import pytest
+
+from xcov19.domain.models.provider import Doctor, ProviderFilter, normalize_specialty
+from xcov19.infra.repository import InMemoryProviderRepo
+from xcov19.infra.snapshot import ProviderSnapshot, SnapshotCandidates, SnapshotView
+from xcov19.infra.specialty_index import SpecialtyIndex
+from xcov19.tests.test_spatial_index import dummy_provider
+
+
+@pytest.mark.unit
+class SnapshotViewTest(unittest.TestCase):
+    def setUp(self) -> None:
+        provider = dummy_provider("Near Clinic", 0.01, 0.01)
+        provider.available_doctors = [Doctor("Dr. A", ["ent"], ["MBBS"], 5, 200)]
+        self.base = ProviderSnapshot.from_providers(
+            [
+                ("near", provider),
+                ("far", dummy_provider("Far Clinic", 0.05, 0.05)),
+            ]
+        )
+
+    def test_providers_round_trip_through_columns(self):
+        view = SnapshotView(self.base)
+        provider = view.get("near")
+        assert provider is not None
+        self.assertEqual("Near Clinic", provider.name)
+        self.assertEqual((0.01, 0.01), provider.geo_location)
+        self.assertEqual("Dr. A", provider.available_doctors[0].name)
+        self.assertIs(
+            self.base.specialties[0], self.base.specialties[1], "shared tuples"
+        )
+
+    def test_changes_shadow_the_base_snapshot(self):
+        view = SnapshotView(self.base).with_changes(
+            [
+                ("near", None),
+                ("far", dummy_provider("Moved Clinic", 0.02, 0.02)),
+                ("new", dummy_provider("New Clinic", 0.03, 0.03)),
+            ]
+        )
+        candidates = SnapshotCandidates(view.within_radius((0.0, 0.0), 10.0))
+        self.assertEqual(
+            ["Moved Clinic", "New Clinic"],
+            [candidates.provider(i).name for i in range(len(candidates))],
+        )
+        self.assertEqual(2, len(view))
+        self.assertIsNone(view.get("near"))
+        [(snapshot, position, _)] = view.nearest((0.0, 0.0), 1)
+        self.assertEqual("Moved Clinic", snapshot.provider(position).name)
+        # The published view is untouched by later changes.
+        published = SnapshotView(self.base).get("near")
+        assert published is not None
+        self.assertEqual("Near Clinic", published.name)
+
+    def test_segments_are_merged_and_superseded_rows_dropped(self):
+        view = SnapshotView(self.base)
+        for n in range(100):
+            view = view.with_changes(
+                [(f"p{n % 10}", dummy_provider(f"Clinic {n}", 1.0, n / 1000))]
+            )
+        self.assertLessEqual(len(view.segments), 2)
+        self.assertEqual(12, len(view))
+        provider = view.get("p5")
+        assert provider is not None
+        self.assertEqual("Clinic 95", provider.name)
+        names = sorted(
+            snapshot.provider(position).name
+            for snapshot, position, _ in view.within_radius((1.0, 0.05), 20.0)
+        )
+        self.assertEqual([f"Clinic {n}" for n in range(90, 100)], names)
+        self.assertEqual(
+            ["Clinic 90"],
+            [
+                snapshot.provider(position).name
+                for snapshot, position, _ in view.nearest((1.0, 0.09), 1)
+            ],
+        )
+
+    def test_many_changes_are_compacted_into_a_new_base(self):
+        view = SnapshotView(self.base).with_changes(
+            (f"p{n}", dummy_provider(f"Clinic {n}", 1.0, n / 1000)) for n in range(1100)
+        )
+        self.assertTrue(view.needs_compaction)
+        compacted = SnapshotView(view.compacted())
+        self.assertEqual({}, compacted.changes)
+        self.assertEqual(1102, len(compacted.base))
+        provider = compacted.get("far")
+        assert provider is not None
+        self.assertEqual("Far Clinic", provider.name)
+
+
+@pytest.mark.unit
+class SnapshotCompactionTest(unittest.IsolatedAsyncioTestCase):
+    async def test_compacts_off_the_event_loop_keeping_later_changes(self):
+        repo = InMemoryProviderRepo()
+        repo.apply_changes(
+            (f"p{n}", dummy_provider(f"Clinic {n}", 1.0, n / 1000)) for n in range(1100)
+        )
+        # Applied while the first 1100 changes are being compacted.
+        repo.upsert("p0", dummy_provider("Moved Clinic", 2.0, 0.0))
+        repo.remove("p1")
+        await repo.wait_compacted()
+        self.assertEqual(1100, len(repo.view.base))
+        self.assertEqual({"p0", "p1"}, set(repo.view.changes))
+        self.assertEqual(1099, len(repo))
+        provider = repo.get("p0")
+        assert provider is not None
+        self.assertEqual("Moved Clinic", provider.name)
+        self.assertIsNone(repo.get("p1"))
+
+
+@pytest.mark.unit
+class SpecialtyIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        def provider(name, lat, specialties, doctor_specialties=()):
+            provider = dummy_provider(name, lat, 0.0)
+            provider.specialties = list(specialties)
+            provider.available_doctors = [
+                Doctor("Dr. A", list(doctor_specialties), ["MBBS"], 5, 200)
+            ]
+            return provider
+
+        self.repo = InMemoryProviderRepo()
+        self.repo.apply_changes(
+            [
+                ("cardio", provider("Heart Care", 0.01, ["Cardiology"])),
+                ("ent", provider("ENT Clinic", 0.02, ["ENT"], ["general-medicine"])),
+                ("both", provider("Multi", 0.03, ["cardiology", "ent"])),
+                ("far", provider("Far Heart", 5.0, ["cardiology"])),
+            ]
+        )
+        # Enough changes to compact everything so far into the base snapshot.
+        self.repo.apply_changes(
+            (f"base{n}", provider("Base", 10.0, ["General Medicine"]))
+            for n in range(1024)
+        )
+
+    def names(self, providers):
+        return sorted({provider.name for provider in providers})
+
+    def test_normalizes_specialty_names(self):
+        self.assertEqual(
+            "general medicine", normalize_specialty(" General__-Medicine ")
+        )
+
+    def test_blank_specialties_match_nothing(self):
+        index = SpecialtyIndex()
+        index.add(0, ["ent"])
+        self.assertEqual([], index.matching([" "]))
+        self.assertFalse(index.matcher([" "])(0))
+        self.assertEqual([], self.repo.fetch_by_specialties([" "]))
+
+    def test_and_or_queries_include_doctor_specialties(self):
+        self.assertEqual(
+            ["Far Heart", "Heart Care", "Multi"],
+            self.names(self.repo.fetch_by_specialties(["CARDIOLOGY"])),
+        )
+        self.assertEqual(
+            ["Multi"], self.names(self.repo.fetch_by_specialties(["cardiology", "ent"]))
+        )
+        self.assertEqual(
+            ["Base", "ENT Clinic"],
+            self.names(self.repo.fetch_by_specialties(["general medicine"])),
+        )
+        self.assertEqual(
+            ["ENT Clinic", "Far Heart", "Heart Care", "Multi"],
+            self.names(
+                self.repo.fetch_by_specialties(["cardiology", "ent"], match_all=False)
+            ),
+        )
+
+    def test_intersects_with_geo_candidates_and_tracks_updates(self):
+        self.repo.upsert("ent", dummy_provider("Moved ENT", 0.02, 0.0))
+        self.repo.upsert("new", dummy_provider("New", 0.05, 0.0))
+        candidates = self.repo.fetch_candidates_within_radius(
+            (0.0, 0.0),
+            10.0,
+            ProviderFilter(
+                specialties=frozenset(["ent", "general"]), match_all_specialties=False
+            ),
+        )
+        self.assertEqual(
+            ["Moved ENT", "Multi", "New"],
+            [candidates.provider(i).name for i in range(len(candidates))],
+        )
+
+    def test_candidates_carry_doctor_specialties_for_ranking(self):
+        candidates = self.repo.fetch_candidates_within_radius(
+            (0.0, 0.0),
+            10.0,
+            ProviderFilter(specialties=frozenset(["general medicine"])),
+        )
+        self.assertEqual(["ENT Clinic"], [candidates.provider(0).name])
+        self.assertEqual([("ent", "general medicine")], candidates.specialties)
@@ -0,0 +1,80 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from xcov19.app.database import SessionFactory, setup_database, setup_spatialite
+from xcov19.infra.models import Provider
+from xcov19.infra.repository import (
+    InMemoryProviderRepo,
+    track_provider_changes,
+    untrack_provider_changes,
+)
+from xcov19.infra.snapshot_reloader import SnapshotReloader
+from xcov19.tests.data.synthetic import synthetic_provider_rows
+
+
+@pytest.mark.integration
+class SnapshotReloaderTest(unittest.IsolatedAsyncioTestCase):
+    """Needs SQLite built with loadable extensions and mod_spatialite."""
+
+    async def asyncSetUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        url = f"sqlite+aiosqlite:///{Path(self.directory.name, 'xcov19.db')}"
+        self.engine = create_async_engine(url)
+        await setup_database(self.engine)
+        # Stands in for the import CLI, writing with Core statements.
+        self.importer = create_async_engine(url)
+        setup_spatialite(self.importer)
+        self.rows = list(synthetic_provider_rows(150))
+        async with self.importer.begin() as conn:
+            await conn.execute(insert(Provider.__table__), self.rows[:100])
+        self.repo = InMemoryProviderRepo()
+        self.session_factory = SessionFactory(self.engine)()
+
+    async def asyncTearDown(self) -> None:
+        untrack_provider_changes(self.repo)
+        await self.importer.dispose()
+        await self.engine.dispose()
+        self.directory.cleanup()
+
+    async def test_reloads_after_writes_from_another_engine(self):
+        reloader = SnapshotReloader(self.repo, self.session_factory)
+        await reloader.reload()
+        self.assertEqual(100, len(self.repo))
+        self.assertFalse(await reloader.reload_if_changed())
+
+        first = self.rows[0]["provider_id"]
+        async with self.importer.begin() as conn:
+            await conn.execute(insert(Provider.__table__), self.rows[100:])
+            await conn.execute(
+                update(Provider.__table__)
+                .where(Provider.__table__.c.provider_id == first)
+                .values(name="Renamed Clinic")
+            )
+        self.assertTrue(await reloader.reload_if_changed())
+        self.assertEqual(150, len(self.repo))
+        renamed = self.repo.get(first)
+        assert renamed is not None
+        self.assertEqual("Renamed Clinic", renamed.name)
+        self.assertEqual(2, reloader.reloads)
+
+    async def test_tracks_orm_commits_until_untracked(self):
+        track_provider_changes(self.repo)
+        added, ignored = self.rows[100], self.rows[101]
+        async with self.session_factory() as session:
+            session.add(Provider(**added))
+            await session.commit()
+        self.assertEqual(1, len(self.repo))
+        provider = self.repo.get(added["provider_id"])
+        assert provider is not None
+        self.assertEqual(added["name"], provider.name)
+
+        untrack_provider_changes(self.repo)
+        async with self.session_factory() as session:
+            session.add(Provider(**ignored))
+            await session.commit()
+        self.assertIsNone(self.repo.get(ignored["provider_id"]))
@@ -0,0 +1,134 @@
+import math
+import random
+import unittest
+
+import pytest
+
+from xcov19.domain.models import GeoLocation as LatLng
+from xcov19.domain.models.provider import (
+    Contact,
+    FacilityEstablishment,
+    FacilityOwnership,
+    Provider,
+)
+from xcov19.dto import AnonymousId, Address, GeoLocation, LocationQueryJSON, QueryId
+from xcov19.infra.repository import InMemoryProviderRepo
+from xcov19.infra.spatial import GeoGridIndex
+from xcov19.services.geolocation import nearby_facilities_lookup
+from xcov19.utils.geo import EARTH_RADIUS_KM, haversine_km
+
+RANDOM_SEED = random.seed(1)
+
+
+def destination(center: LatLng, bearing_deg: float, distance_km: float) -> LatLng:
+    """The point distance_km from center along an initial bearing."""
+    lat, lng = map(math.radians, center)
+    bearing = math.radians(bearing_deg)
+    angle = distance_km / EARTH_RADIUS_KM
+    dest_lat = math.asin(
+        math.sin(lat) * math.cos(angle)
+        + math.cos(lat) * math.sin(angle) * math.cos(bearing)
+    )
+    dest_lng = lng + math.atan2(
+        math.sin(bearing) * math.sin(angle) * math.cos(lat),
+        math.cos(angle) - math.sin(lat) * math.sin(dest_lat),
+    )
+    return (math.degrees(dest_lat), (math.degrees(dest_lng) + 540.0) % 360.0 - 180.0)
+
+
+def dummy_provider(name: str, lat: float, lng: float) -> Provider:
+    return Provider(
+        name=name,
+        address="123 Test Street",
+        geo_location=(lat, lng),
+        contact=Contact("+1234567890"),
+        facility_type=FacilityEstablishment.CLINIC,
+        ownership=FacilityOwnership.PRIVATE,
+        specialties=["General"],
+        available_doctors=[],
+        stars=4,
+        reviews=10,
+    )
+
+
+@pytest.mark.unit
+class GeoGridIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.points = {
+            key: (random.uniform(12.0, 14.0), random.uniform(77.0, 79.0))
+            for key in range(2000)
+        }
+        self.index: GeoGridIndex[int] = GeoGridIndex(cell_size_km=2.0)
+        self.index.bulk_load(self.points.items())
+
+    def test_within_radius_matches_full_scan(self):
+        center = (13.0, 78.0)
+        expected = sorted(
+            key
+            for key, point in self.points.items()
+            if haversine_km(center, point) <= 15.0
+        )
+        result = self.index.within_radius(center, 15.0)
+        self.assertEqual(expected, sorted(key for key, _ in result))
+        distances = [distance for _, distance in result]
+        self.assertEqual(sorted(distances), distances)
+
+    def test_nearest_matches_full_scan(self):
+        center = (12.5, 78.5)
+        expected = sorted(
+            self.points, key=lambda key: haversine_km(center, self.points[key])
+        )[:5]
+        self.assertEqual(expected, [key for key, _ in self.index.nearest(center, 5)])
+
+    def test_upsert_moves_and_remove_drops_key(self):
+        self.index.upsert(0, (-33.9, 151.2))
+        nearest = self.index.nearest((-33.9, 151.2), 1)
+        self.assertEqual([0], [key for key, _ in nearest])
+        self.index.remove(0)
+        self.assertNotIn(0, self.index)
+        self.assertEqual(len(self.points) - 1, len(self.index))
+
+    def test_within_radius_across_antimeridian(self):
+        index: GeoGridIndex[str] = GeoGridIndex()
+        index.bulk_load([("east", (0.0, 179.99)), ("west", (0.0, -179.99))])
+        result = index.within_radius((0.0, 179.999), 5.0)
+        self.assertEqual({"east", "west"}, {key for key, _ in result})
+
+    def test_within_radius_finds_points_on_the_edge_of_the_circle(self):
+        for center in [(0.0, 0.0), (45.0, 10.0), (80.0, 0.0), (-75.0, 179.0)]:
+            index: GeoGridIndex[int] = GeoGridIndex()
+            index.bulk_load(
+                (bearing, destination(center, bearing, 499.9))
+                for bearing in range(0, 360, 5)
+            )
+            found = {key for key, _ in index.within_radius(center, 500.0)}
+            self.assertEqual(set(range(0, 360, 5)), found, center)
+        index = GeoGridIndex()
+        index.upsert(1, (80.85, 26.8))
+        self.assertEqual([1], [key for key, _ in index.within_radius((80, 0), 500)])
+
+
+@pytest.mark.unit
+class InMemoryProviderRepoTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.repo = InMemoryProviderRepo()
+        self.repo.upsert("near", dummy_provider("Near Clinic", 0.01, 0.01))
+        self.repo.upsert("far", dummy_provider("Far Clinic", 0.05, 0.05))
+        self.repo.upsert("away", dummy_provider("Away Clinic", 10.0, 10.0))
+        self.query = LocationQueryJSON(
+            location=GeoLocation(lat=0, lng=0),
+            cust_id=AnonymousId(cust_id="test_cust_id"),
+            query_id=QueryId(query_id="test_query_id"),
+        )
+
+    def test_nearby_facilities_are_ranked_by_distance(self):
+        lookup = nearby_facilities_lookup(self.repo, radius_km=10.0)
+        result = lookup(Address(), self.query)
+        self.assertEqual(["Near Clinic", "Far Clinic"], [r.name for r in result])
+        self.assertEqual([1, 2], [r.rank for r in result])
+        self.assertLess(result[0].estimated_time, result[1].estimated_time)
+
+    def test_remove_refreshes_index(self):
+        self.repo.remove("near")
+        nearest = self.repo.fetch_nearest((0.0, 0.0), 1)
+        self.assertEqual("Far Clinic", nearest[0][0].name)
@@ -0,0 +1,127 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from xcov19.app.database import SessionFactory, setup_database, setup_spatialite
+from xcov19.domain.models.provider import FacilityEstablishment, ProviderFilter
+from xcov19.infra.models import GEOPOINT_SRID, Provider, SQLModel
+from xcov19.infra.repository import SqliteProviderRepo
+from xcov19.infra.snapshot import load_snapshot
+from xcov19.tests.data.synthetic import synthetic_provider_rows
+from xcov19.tests.test_spatial_index import destination
+from xcov19.utils.geo import haversine_km
+
+CENTER = (12.9716, 77.5946)
+
+
+@pytest.mark.integration
+class SqliteProviderRepoTest(unittest.IsolatedAsyncioTestCase):
+    """Needs SQLite built with loadable extensions and mod_spatialite."""
+
+    async def asyncSetUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(
+            f"sqlite+aiosqlite:///{Path(self.directory.name, 'xcov19.db')}"
+        )
+        await setup_database(self.engine)
+        self.rows = list(synthetic_provider_rows(2000))
+        # Just inside the search circle, on every side of it.
+        for bearing in range(0, 360, 15):
+            self.rows.append(
+                {
+                    **self.rows[0],
+                    "provider_id": f"edge-{bearing}",
+                    "geopoint": destination(CENTER, bearing, 49.99),
+                }
+            )
+        async with self.engine.begin() as conn:
+            await conn.execute(insert(Provider.__table__), self.rows)
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+        self.directory.cleanup()
+
+    def expected(self, radius_km: float, keep=lambda row: True) -> list:
+        return sorted(
+            row["address"]
+            for row in self.rows
+            if haversine_km(CENTER, row["geopoint"]) <= radius_km and keep(row)
+        )
+
+    async def test_spatial_index_matches_full_scan(self):
+        async with SessionFactory(self.engine)()() as session:
+            for use_spatial_index in (True, False):
+                repo = SqliteProviderRepo(session, use_spatial_index)
+                matches = await repo.fetch_within_radius(CENTER, 50.0)
+                self.assertEqual(
+                    self.expected(50.0),
+                    sorted(provider.address for provider, _ in matches),
+                )
+
+    async def test_load_snapshot_decodes_every_geopoint(self):
+        async with SessionFactory(self.engine)()() as session:
+            snapshot = await load_snapshot(session, batch_size=300)
+        self.assertEqual(
+            sorted(tuple(row["geopoint"]) for row in self.rows),
+            sorted(
+                snapshot.provider(position).geo_location
+                for position in range(len(snapshot))
+            ),
+        )
+
+    async def test_filters_are_pushed_down(self):
+        provider_filter = ProviderFilter(
+            facility_types=frozenset([FacilityEstablishment.HOSPITAL]), min_stars=3
+        )
+        async with SessionFactory(self.engine)()() as session:
+            matches = await SqliteProviderRepo(session).fetch_within_radius(
+                CENTER, 50.0, provider_filter
+            )
+        self.assertEqual(
+            self.expected(
+                50.0,
+                lambda row: row["facility_type"] == FacilityEstablishment.HOSPITAL
+                and row["stars"] >= 3,
+            ),
+            sorted(provider.address for provider, _ in matches),
+        )
+
+
+@pytest.mark.integration
+class SpatialIndexMigrationTest(unittest.IsolatedAsyncioTestCase):
+    async def test_points_without_srid_are_migrated(self):
+        with tempfile.TemporaryDirectory() as directory:
+            url = f"sqlite+aiosqlite:///{Path(directory, 'xcov19.db')}"
+            legacy = create_async_engine(url)
+            setup_spatialite(legacy)
+            # Written the way databases predating the spatial index were.
+            row = next(synthetic_provider_rows(1))
+            async with legacy.begin() as conn:
+                await conn.execute(text("SELECT InitSpatialMetadata(1)"))
+                await conn.run_sync(SQLModel.metadata.create_all)
+                await conn.execute(
+                    text(
+                        "INSERT INTO provider (provider_id, name, address, geopoint, "
+                        "contact, facility_type, ownership_type, specialties, stars, "
+                        "reviews, available_doctors) VALUES (:id, 'a', 'b', "
+                        "GeomFromText('POINT(12.9 77.5)'), 1, 'hospital', "
+                        "'private', '[]', 1, 0, '[]')"
+                    ),
+                    {"id": row["provider_id"]},
+                )
+            await legacy.dispose()
+            engine = create_async_engine(url)
+            await setup_database(engine)
+            async with engine.connect() as conn:
+                srid = await conn.execute(text("SELECT SRID(geopoint) FROM provider"))
+                self.assertEqual(GEOPOINT_SRID, srid.scalar())
+                async with SessionFactory(engine)()() as session:
+                    matches = await SqliteProviderRepo(session).fetch_within_radius(
+                        (12.9, 77.5), 1.0
+                    )
+            await engine.dispose()
+        self.assertEqual(1, len(matches))
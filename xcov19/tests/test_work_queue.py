@@ -0,0 +1,317 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+
+import pytest
+from rodi import Container
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.app.workers import (
+    diagnosis_query_handler,
+    geolocation_query_handler,
+    location_query_from_job,
+)
+from xcov19.domain.models import GeoLocation
+from xcov19.domain.models.patient import Patient
+from xcov19.dto import Address, LocationQueryJSON
+from xcov19.infra.journal import SqliteJobJournal
+from xcov19.infra.patient_store import (
+    DIAGNOSIS_QUERY,
+    GEOLOCATION_QUERY,
+    patient_to_payload,
+)
+from xcov19.infra.repository import InMemoryProviderRepo
+from xcov19.infra.result_store import FacilitiesResultStore
+from xcov19.infra.write_buffer import WriteBehindBuffer
+from xcov19.services.geocoding import CachedReverseGeocoder, ReverseGeocoderBackend
+from xcov19.services.geolocation import (
+    LocationQueryServiceInterface,
+    geolocation_service,
+)
+from xcov19.tests.test_spatial_index import dummy_provider
+from xcov19.utils.executor import BoundedExecutor, LookupTimeoutError
+from xcov19.tests.start_server import start_plain_sqlite_engine
+from xcov19.utils.work_queue import Job, Priority, QueueFullError, WorkQueue
+
+
+class SlowJournal:
+    """Journal taking a while to append, without persisting anything."""
+
+    async def open(self) -> List[Job]:
+        return []
+
+    async def append(self, job: Job) -> None:
+        await asyncio.sleep(0.01)
+
+    async def complete(self, jobs: List[Job]) -> None:
+        pass
+
+    async def fail(self, jobs: List[Job]) -> None:
+        pass
+
+    async def retry(self, jobs: List[Job]) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class BrokenJournal(SlowJournal):
+    """Journal failing to record finished jobs, as a locked database would."""
+
+    async def append(self, job: Job) -> None:
+        pass
+
+    async def complete(self, jobs: List[Job]) -> None:
+        raise OSError("database is locked")
+
+
+@pytest.mark.unit
+class WorkQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.batches: List[List[str]] = []
+        self.retry_once: set[str] = set()
+
+        async def handle(jobs: List[Job]) -> List[Job]:
+            self.batches.append([job.payload["name"] for job in jobs])
+            retry = [job for job in jobs if job.payload["name"] in self.retry_once]
+            self.retry_once.difference_update(job.payload["name"] for job in retry)
+            return retry
+
+        self.handle = handle
+
+    async def test_batches_jobs_in_priority_order(self):
+        queue = WorkQueue({"test": self.handle}, workers=1, batch_size=10)
+        await queue.submit("test", {"name": "low"}, Priority.LOW)
+        await queue.submit("test", {"name": "high"}, Priority.HIGH)
+        await queue.submit("test", {"name": "normal"})
+        await queue.start()
+        await queue.stop(drain=True)
+        self.assertEqual([["high", "normal", "low"]], self.batches)
+
+    async def test_rejects_jobs_beyond_capacity(self):
+        queue = WorkQueue({"test": self.handle}, capacity=1)
+        await queue.submit("test", {"name": "first"})
+        with self.assertRaises(QueueFullError):
+            await queue.submit("test", {"name": "second"})
+
+    async def test_concurrent_submits_do_not_overfill_the_queue(self):
+        queue = WorkQueue({"test": self.handle}, capacity=3, journal=SlowJournal())
+        results = await asyncio.gather(
+            *(queue.submit("test", {"name": str(n)}) for n in range(5)),
+            return_exceptions=True,
+        )
+        self.assertEqual(3, sum(isinstance(result, Job) for result in results))
+        self.assertEqual(
+            2, sum(isinstance(result, QueueFullError) for result in results)
+        )
+        self.assertEqual(3, queue.depth)
+
+    async def test_retries_jobs_returned_by_handler(self):
+        self.retry_once.add("later")
+        queue = WorkQueue({"test": self.handle}, workers=1, retry_delay_seconds=0.01)
+        await queue.start()
+        await queue.submit("test", {"name": "later"})
+        await asyncio.sleep(0.1)
+        await queue.stop(drain=True)
+        self.assertEqual([["later"], ["later"]], self.batches)
+        self.assertEqual(1, queue.processed)
+
+    async def test_drain_waits_for_pending_retries(self):
+        self.retry_once.add("later")
+        queue = WorkQueue({"test": self.handle}, workers=1, retry_delay_seconds=0.05)
+        await queue.start()
+        await queue.submit("test", {"name": "later"})
+        await asyncio.sleep(0.01)
+        await queue.stop(drain=True)
+        self.assertEqual([["later"], ["later"]], self.batches)
+        self.assertEqual(1, queue.processed)
+
+    async def test_workers_survive_journal_errors(self):
+        queue = WorkQueue({"test": self.handle}, workers=1, journal=BrokenJournal())
+        await queue.start()
+        await queue.submit("test", {"name": "first"})
+        await asyncio.sleep(0.05)
+        await queue.submit("test", {"name": "second"})
+        await queue.stop(drain=True)
+        self.assertEqual([["first"], ["second"]], self.batches)
+        self.assertEqual(2, queue.processed)
+
+    async def test_journal_keeps_attempts_of_retried_jobs(self):
+        self.retry_once.add("later")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = str(Path(tmp_dir) / "jobs.db")
+            queue = WorkQueue(
+                {"test": self.handle},
+                retry_delay_seconds=60,
+                journal=SqliteJobJournal(path),
+            )
+            await queue.start()
+            await queue.submit("test", {"name": "later"})
+            await asyncio.sleep(0.05)
+            # Stopped before the retry is due, as by a restart.
+            await queue.stop(drain=False)
+            reopened = SqliteJobJournal(path)
+            [replayed] = await reopened.open()
+            await reopened.close()
+        self.assertEqual(("later", 1), (replayed.payload["name"], replayed.attempts))
+
+    async def test_journal_replays_unprocessed_jobs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = str(Path(tmp_dir) / "jobs.db")
+            journal = SqliteJobJournal(path)
+            self.assertEqual([], await journal.open())
+            queue = WorkQueue({"test": self.handle}, journal=journal)
+            job = await queue.submit("test", {"name": "accepted"})
+            await journal.close()
+
+            replay = WorkQueue({"test": self.handle}, journal=SqliteJobJournal(path))
+            await replay.start()
+            await replay.stop(drain=True)
+            self.assertEqual([["accepted"]], self.batches)
+            reopened = SqliteJobJournal(path)
+            self.assertEqual([], await reopened.open())
+            await reopened.close()
+            self.assertTrue(job.job_id)
+
+
+@pytest.mark.unit
+class LocationQueryFromJobTest(unittest.TestCase):
+    def test_rejects_jobs_without_location(self):
+        job = Job(GEOLOCATION_QUERY, {"cust_id": "c1", "query": "", "query_id": "q1"})
+        with self.assertRaises(ValueError):
+            location_query_from_job(job)
+
+    def test_builds_query_from_payload(self):
+        payload = {
+            "cust_id": "c1",
+            "query": "",
+            "query_id": "q1",
+            "geo_location": [1.0, 2.0],
+        }
+        query = location_query_from_job(Job(GEOLOCATION_QUERY, payload))
+        self.assertEqual((1.0, 2.0), (query.location.lat, query.location.lng))
+        self.assertEqual("q1", query.query_id.query_id)
+
+
+class CityBackend(ReverseGeocoderBackend):
+    async def reverse_many(self, geo_locations: List[GeoLocation]) -> List[dict]:
+        await asyncio.sleep(0)
+        return [{"city": "Bengaluru"} for _ in geo_locations]
+
+
+@pytest.mark.unit
+class GeolocationQueryHandlerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_batches_larger_than_the_executor_are_processed(self):
+        executor = BoundedExecutor(max_workers=1, queue_depth=1)
+        repo = InMemoryProviderRepo()
+        repo.apply_changes([("p1", dummy_provider("Clinic", 12.97, 77.59))])
+        async with start_plain_sqlite_engine() as engine:
+            session_factory = async_sessionmaker(engine, class_=AsyncSessionWrapper)
+            result_store = FacilitiesResultStore(session_factory)
+            write_buffer = WriteBehindBuffer(session_factory)
+            container = Container()
+            container.add_instance(write_buffer, WriteBehindBuffer)
+            container.add_instance(
+                CachedReverseGeocoder(CityBackend()), CachedReverseGeocoder
+            )
+            container.add_instance(result_store, FacilitiesResultStore)
+            container.add_instance(repo, InMemoryProviderRepo)
+            container.add_instance(executor, BoundedExecutor)
+            container.add_instance(
+                geolocation_service(executor), LocationQueryServiceInterface
+            )
+            handle = geolocation_query_handler(container)
+            # Ten times what the executor holds, each query in its own cell.
+            jobs = [
+                Job(
+                    GEOLOCATION_QUERY,
+                    patient_to_payload(
+                        Patient(
+                            f"c{n}",
+                            "",
+                            geo_location=(12.97 + n / 100, 77.59),
+                            query_id=f"q{n}",
+                        )
+                    ),
+                )
+                for n in range(10 * executor.capacity)
+            ]
+            self.assertEqual([], await handle(jobs))
+            stored = [
+                await result_store.get(f"c{n}", f"q{n}") for n in range(len(jobs))
+            ]
+            await write_buffer.stop()
+        executor.shutdown()
+        self.assertTrue(all(results is not None for results in stored))
+        self.assertEqual(["Clinic"], [facility.name for facility in stored[0] or []])
+
+    async def test_a_failing_job_is_retried_alone(self):
+        class FailingFirstQuery(LocationQueryServiceInterface[LocationQueryJSON]):
+            @classmethod
+            async def resolve_coordinates(cls, reverse_geo_lookup_svc, query):
+                return Address()
+
+            @classmethod
+            async def fetch_facilities(
+                cls, reverse_geo_lookup_svc, query, patient_query_lookup_svc
+            ):
+                if query.query_id.query_id == "q0":
+                    raise LookupTimeoutError("Lookup timed out.")
+                return []
+
+        async with start_plain_sqlite_engine() as engine:
+            session_factory = async_sessionmaker(engine, class_=AsyncSessionWrapper)
+            result_store = FacilitiesResultStore(session_factory)
+            write_buffer = WriteBehindBuffer(session_factory)
+            container = Container()
+            container.add_instance(write_buffer, WriteBehindBuffer)
+            container.add_instance(
+                CachedReverseGeocoder(CityBackend()), CachedReverseGeocoder
+            )
+            container.add_instance(result_store, FacilitiesResultStore)
+            container.add_instance(InMemoryProviderRepo(), InMemoryProviderRepo)
+            container.add_instance(FailingFirstQuery, LocationQueryServiceInterface)
+            handle = geolocation_query_handler(container)
+            jobs = [
+                Job(
+                    GEOLOCATION_QUERY,
+                    patient_to_payload(
+                        Patient(f"c{n}", "", geo_location=(n, n), query_id=f"q{n}")
+                    ),
+                )
+                for n in range(3)
+            ]
+            self.assertEqual([jobs[0]], await handle(jobs))
+            stored = [await result_store.get(f"c{n}", f"q{n}") for n in range(3)]
+            await write_buffer.stop()
+        self.assertEqual([None, [], []], stored)
+
+
+@pytest.mark.unit
+class DiagnosisQueryHandlerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_jobs_sharing_a_query_complete_together(self):
+        async with start_plain_sqlite_engine() as engine:
+            write_buffer = WriteBehindBuffer(
+                async_sessionmaker(engine, class_=AsyncSessionWrapper)
+            )
+            container = Container()
+            container.add_instance(write_buffer, WriteBehindBuffer)
+            handle = diagnosis_query_handler(container)
+            jobs = [
+                Job(
+                    DIAGNOSIS_QUERY,
+                    patient_to_payload(Patient("", query, query_id=query_id)),
+                )
+                for query, query_id in (("fever", "q1"), ("cough", "q1"), ("", "q2"))
+            ]
+            # No geolocation query stored yet, every job waits for its own.
+            self.assertEqual(jobs, await handle(jobs))
+            await write_buffer.persist_geolocation_queries(
+                [Patient("c1", "", geo_location=(1.0, 2.0), query_id="q1")]
+            )
+            self.assertEqual([jobs[2]], await handle(jobs))
+            await write_buffer.stop()
@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession as AsyncSessionWrapper
+
+from xcov19.domain.models.patient import Patient
+from xcov19.infra import models
+from xcov19.infra.location_cache import LocationCache
+from xcov19.infra.write_buffer import WriteBehindBuffer
+from xcov19.tests.start_server import start_plain_sqlite_engine
+
+
+@pytest.mark.unit
+class WriteBehindBufferTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_writes_share_one_transaction(self):
+        async with start_plain_sqlite_engine() as engine:
+            write_buffer = WriteBehindBuffer(
+                async_sessionmaker(engine, class_=AsyncSessionWrapper),
+                flush_interval_ms=50,
+            )
+            diagnosis, *_ = await asyncio.gather(
+                write_buffer.attach_diagnosis_queries(
+                    [
+                        Patient(cust_id="", query="fever", query_id="q1"),
+                        Patient(cust_id="", query="cough", query_id="q9"),
+                    ]
+                ),
+                write_buffer.persist_geolocation_queries(
+                    [Patient("c1", "", geo_location=(1.0, 2.0), query_id="q1")]
+                ),
+                write_buffer.persist_geolocation_queries(
+                    [Patient("c2", "", geo_location=(1.0, 2.0), query_id="q2")]
+                ),
+            )
+            self.assertEqual(["q9"], [patient.query_id for patient in diagnosis])
+            self.assertEqual(
+                (1, 4), (write_buffer.transactions, write_buffer.rows_written)
+            )
+
+            # Existing locations are reused, buffered rows are committed on stop.
+            write_buffer.flush_interval = 60.0
+            pending = asyncio.ensure_future(
+                write_buffer.persist_geolocation_queries(
+                    [Patient("c3", "", geo_location=(1.0, 2.0), query_id="q3")]
+                )
+            )
+            await asyncio.sleep(0)
+            await write_buffer.stop()
+            await pending
+            with self.assertRaises(RuntimeError):
+                await write_buffer.persist_geolocation_queries([])
+            async with AsyncSessionWrapper(engine) as session:
+                queries = (await session.exec(select(models.Query))).all()
+                locations = (await session.exec(select(models.Location))).all()
+        self.assertEqual(
+            {"q1": "fever", "q2": "", "q3": ""}, {q.query_id: q.query for q in queries}
+        )
+        self.assertEqual(1, len(locations))
+        self.assertEqual({locations[0].location_id}, {q.location_id for q in queries})
+
+    async def test_snapped_locations_are_reused_from_the_cache(self):
+        locations = LocationCache("decimal", precision=3)
+        async with start_plain_sqlite_engine() as engine:
+            write_buffer = WriteBehindBuffer(
+                async_sessionmaker(engine, class_=AsyncSessionWrapper),
+                locations=locations,
+            )
+            await write_buffer.persist_geolocation_queries(
+                [
+                    Patient("c1", "", geo_location=(12.97161, 77.5946), query_id="q1"),
+                    Patient("c2", "", geo_location=(12.97164, 77.5946), query_id="q2"),
+                ]
+            )
+            self.assertEqual((0, 1), (locations.hits, locations.misses))
+            await write_buffer.persist_geolocation_queries(
+                [Patient("c3", "", geo_location=(12.9715, 77.59455), query_id="q3")]
+            )
+            self.assertEqual((1, 1), (locations.hits, locations.misses))
+            await write_buffer.stop()
+            async with AsyncSessionWrapper(engine) as session:
+                queries = (await session.exec(select(models.Query))).all()
+                [location] = (await session.exec(select(models.Location))).all()
+        self.assertEqual((12.972, 77.595), (location.latitude, location.longitude))
+        self.assertEqual({location.location_id}, {q.location_id for q in queries})
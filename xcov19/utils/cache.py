@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple
+
+
+class TTLCache[K: Hashable, V]:
+    """Bounded LRU cache whose entries expire ttl_seconds after being set.
+
+    Keeps hit, miss and eviction counters for instrumentation. Not thread safe,
+    meant to be used from the event loop.
+    """
+
+    __slots__ = (
+        "maxsize",
+        "ttl_seconds",
+        "_clock",
+        "_data",
+        "hits",
+        "misses",
+        "evictions",
+    )
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl_seconds: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive.")
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._data: OrderedDict[K, Tuple[float, V]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        entry = self._data.get(key)  # type: ignore[arg-type]
+        return entry is not None and entry[0] > self._clock()
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: K) -> V | None:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        expires_at = (
+            float("inf")
+            if self.ttl_seconds is None
+            else self._clock() + self.ttl_seconds
+        )
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: K) -> V | None:
+        entry = self._data.pop(key, None)
+        return None if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self._data.clear()
@@ -0,0 +1,144 @@
+"""Runs blocking callables off the event loop with bounded concurrency."""
+
+import asyncio
+import functools
+import inspect
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Literal
+
+type ExecutorKind = Literal["thread", "process"]
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when a call is submitted while every worker and queue slot is taken."""
+
+    pass
+
+
+class LookupTimeoutError(TimeoutError):
+    """Raised when a lookup does not finish within its timeout."""
+
+    pass
+
+
+def picklable_by_reference(fn: Callable) -> bool:
+    """True for callables a process pool can send to its workers by name.
+
+    Local functions, lambdas and closures are not, and neither are callable
+    objects such as functools.partial over them.
+    """
+    fn = getattr(fn, "func", fn)
+    qualname = getattr(fn, "__qualname__", "")
+    return bool(qualname) and "<" not in qualname
+
+
+def is_async_callable(fn: Callable) -> bool:
+    """True for coroutine functions and objects with an async __call__."""
+    return inspect.iscoroutinefunction(fn) or inspect.iscoroutinefunction(
+        getattr(fn, "__call__", None)
+    )
+
+
+class BoundedExecutor:
+    """Thread or process pool accepting at most max_workers + queue_depth calls.
+
+    Calls beyond that fail fast with ExecutorSaturatedError instead of queueing
+    without bound, and each call is awaited for at most timeout_seconds. A slot
+    is only released once its call has actually finished, so timed out calls
+    still count against the bound while they keep a worker busy.
+
+    Process pools require picklable callables and arguments, local functions
+    and closures are rejected with a TypeError.
+    """
+
+    def __init__(
+        self,
+        kind: ExecutorKind = "thread",
+        max_workers: int = 4,
+        queue_depth: int = 64,
+        timeout_seconds: float | None = 5.0,
+    ) -> None:
+        self.kind = kind
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.timeout_seconds = timeout_seconds
+        self._pool: Executor = (
+            ProcessPoolExecutor(max_workers=max_workers)
+            if kind == "process"
+            else ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="xcov19-lookup"
+            )
+        )
+        self.in_flight = 0
+
+    @property
+    def capacity(self) -> int:
+        """Calls accepted at once, running or queued."""
+        return self.max_workers + self.queue_depth
+
+    def _release(self, future: asyncio.Future) -> None:
+        self.in_flight -= 1
+        # Retrieve the outcome of abandoned calls so it is not reported as lost.
+        if not future.cancelled():
+            future.exception()
+
+    async def run[R](
+        self, fn: Callable[..., R], *args: Any, timeout: float | None = None
+    ) -> R:
+        if self.kind == "process" and not picklable_by_reference(fn):
+            raise TypeError(
+                f"{fn!r} cannot run on a process pool, pass a module level function."
+            )
+        if self.in_flight >= self.capacity:
+            raise ExecutorSaturatedError(
+                f"Lookup executor saturated with {self.in_flight} calls in flight."
+            )
+        self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._pool, functools.partial(fn, *args))
+        except BaseException:
+            self.in_flight -= 1
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(future),
+                timeout=self.timeout_seconds if timeout is None else timeout,
+            )
+        except TimeoutError as error:
+            raise LookupTimeoutError(f"{fn!r} timed out.") from error
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+async def run_lookup[R](
+    executor: BoundedExecutor | None,
+    fn: Callable[..., R | Awaitable[R]],
+    *args: Any,
+) -> R:
+    """Calls a sync or async lookup service without blocking the event loop.
+
+    Async callables are awaited in place under the executor's timeout, sync
+    ones run on the executor, or inline when there is none.
+    """
+    timeout = executor.timeout_seconds if executor else None
+    if is_async_callable(fn):
+        return await _wait_for(fn, fn(*args), timeout)  # type: ignore[arg-type]
+    if executor is None:
+        result = fn(*args)
+    else:
+        result = await executor.run(fn, *args)
+    if inspect.isawaitable(result):
+        return await _wait_for(fn, result, timeout)
+    return result
+
+
+async def _wait_for[R](
+    fn: Callable, awaitable: Awaitable[R], timeout: float | None
+) -> R:
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except TimeoutError as error:
+        raise LookupTimeoutError(f"{fn!r} timed out.") from error
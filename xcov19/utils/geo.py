@@ -0,0 +1,104 @@
+"""Geodesic helpers shared by spatial indexes and repositories.
+
+All coordinates are (latitude, longitude) pairs in decimal degrees, matching
+`xcov19.domain.models.GeoLocation`.
+"""
+
+import math
+from typing import List, Tuple
+
+from xcov19.domain.models import GeoLocation
+
+EARTH_RADIUS_KM = 6371.0088
+# Length of a degree of latitude on the sphere haversine_km measures on.
+KM_PER_DEGREE_LAT = EARTH_RADIUS_KM * math.pi / 180.0
+# Relative slack keeping points right on the circle inside its bounding box
+# despite rounding.
+BOUNDING_BOX_SLACK = 1e-9
+# Average door-to-door speed used to estimate travel time to a facility.
+DEFAULT_TRAVEL_SPEED_KMPH = 30.0
+
+type LngRange = Tuple[float, float]
+
+
+def haversine_km(origin: GeoLocation, destination: GeoLocation) -> float:
+    """Great circle distance between two points in kilometres."""
+    lat1, lng1 = origin
+    lat2, lng2 = destination
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(
+    center: GeoLocation, radius_km: float
+) -> Tuple[float, float, List[LngRange]]:
+    """Returns (min_lat, max_lat, lng_ranges) enclosing a circle.
+
+    Longitude ranges are split in two when the box crosses the antimeridian and
+    widened to the full range when the circle covers a pole.
+
+    The longitude span is the widest of the circle, reached north or south of
+    the center's latitude, rather than its width along that latitude.
+    """
+    lat, lng = center
+    # Angular radius of the circle in radians.
+    angle = radius_km / EARTH_RADIUS_KM * (1 + BOUNDING_BOX_SLACK)
+    d_lat = math.degrees(angle)
+    min_lat = max(-90.0, lat - d_lat)
+    max_lat = min(90.0, lat + d_lat)
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    ratio = math.sin(angle) / math.cos(math.radians(lat))
+    if ratio >= 1.0:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    d_lng = math.degrees(math.asin(ratio))
+    min_lng, max_lng = lng - d_lng, lng + d_lng
+    if min_lng < -180.0:
+        return min_lat, max_lat, [(min_lng + 360.0, 180.0), (-180.0, max_lng)]
+    if max_lng > 180.0:
+        return min_lat, max_lat, [(min_lng, 180.0), (-180.0, max_lng - 360.0)]
+    return min_lat, max_lat, [(min_lng, max_lng)]
+
+
+def estimate_travel_minutes(
+    distance_km: float, speed_kmph: float = DEFAULT_TRAVEL_SPEED_KMPH
+) -> float:
+    """Estimated travel time in minutes for a distance at an average speed."""
+    return round(distance_km / speed_kmph * 60.0, 1)
+
+
+def snap_decimal(geo_location: GeoLocation, places: int) -> GeoLocation:
+    """Rounds a point to `places` decimal places, 4 is roughly 11m."""
+    lat, lng = geo_location
+    return (round(lat, places), round(lng, places))
+
+
+def snap_geohash(geo_location: GeoLocation, level: int) -> GeoLocation:
+    """Centre of the geohash cell of `level` characters containing a point.
+
+    Level 7 cells are about 150m x 150m, level 8 about 40m x 20m.
+    """
+    lat, lng = geo_location
+    min_lat, max_lat, min_lng, max_lng = -90.0, 90.0, -180.0, 180.0
+    # Geohash bits alternate between longitude and latitude, longitude first.
+    for bit in range(level * 5):
+        if bit % 2 == 0:
+            mid = (min_lng + max_lng) / 2
+            if lng >= mid:
+                min_lng = mid
+            else:
+                max_lng = mid
+        else:
+            mid = (min_lat + max_lat) / 2
+            if lat >= mid:
+                min_lat = mid
+            else:
+                max_lat = mid
+    return ((min_lat + max_lat) / 2, (min_lng + max_lng) / 2)
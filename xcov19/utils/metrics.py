@@ -0,0 +1,275 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Counters and histograms are updated in place, a bisect and a short locked
+increment per observation, so they can stay on in production. Callback
+metrics read values components already keep, like queue depths and cache
+hit counters, only when metrics are scraped.
+"""
+
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, ClassVar, Dict, Iterable, List, Sequence, Tuple
+
+type LabelValues = Tuple[str, ...]
+type Sample = Tuple[str, LabelValues, float]
+
+# Seconds, from sub-millisecond index lookups to slow requests.
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+CONTENT_TYPE = b"text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+class Metric(ABC):
+    kind: ClassVar[str]
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        """Yields (name suffix, label values, value) of every series."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        # Counter families are named after their _total series, as
+        # prometheus_client exposes them in the text format.
+        family = self.name + "_total" if self.kind == "counter" else self.name
+        lines = [f"# HELP {family} {self.help}", f"# TYPE {family} {self.kind}"]
+        for suffix, label_values, value in self.samples():
+            labelnames = self.labelnames
+            if suffix == "_bucket":
+                # The last label value of a bucket is its upper bound.
+                labelnames = (*labelnames, "le")
+            labels = ",".join(
+                f'{name}="{escape_label_value(label)}"'
+                for name, label in zip(labelnames, label_values)
+            )
+            series = (
+                f"{self.name}{suffix}{{{labels}}}" if labels else self.name + suffix
+            )
+            lines.append(f"{series} {format_value(value)}")
+        return lines
+
+
+class CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: "HistogramChild") -> None:
+        self._histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class HistogramChild:
+    __slots__ = ("_upper_bounds", "_counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]) -> None:
+        self._upper_bounds = upper_bounds
+        # Per bucket counts, the last one for values above every bound.
+        self._counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        """Context manager observing the seconds its block takes."""
+        return _Timer(self)
+
+    def cumulative_counts(self) -> List[int]:
+        with self._lock:
+            counts = list(self._counts)
+        total, cumulative = 0, []
+        for count in counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+
+class _LabelledMetric[C](Metric):
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._children: Dict[LabelValues, C] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _new_child(self) -> C:
+        raise NotImplementedError
+
+    def labels(self, *label_values: str) -> C:
+        """The series of label_values, created on first use."""
+        if (child := self._children.get(label_values)) is not None:
+            return child
+        if len(label_values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}.")
+        with self._lock:
+            return self._children.setdefault(label_values, self._new_child())
+
+
+class Counter(_LabelledMetric[CounterChild]):
+    kind = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterable[Sample]:
+        for label_values, child in list(self._children.items()):
+            yield "_total", label_values, child.value
+
+
+class Histogram(_LabelledMetric[HistogramChild]):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def samples(self) -> Iterable[Sample]:
+        bounds = [*map(format_value, self.buckets), "+Inf"]
+        for label_values, child in list(self._children.items()):
+            cumulative = child.cumulative_counts()
+            for bound, count in zip(bounds, cumulative):
+                yield "_bucket", (*label_values, bound), count
+            yield "_sum", label_values, child.sum
+            yield "_count", label_values, cumulative[-1]
+
+
+class CallbackMetric(Metric):
+    """Gauge or counter whose series are read from a callback when scraped.
+
+    The callback returns a value, or a value per tuple of label values.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        read: Callable[[], float | Dict[LabelValues, float]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.kind = kind  # type: ignore[misc]
+        self._read = read
+
+    def samples(self) -> Iterable[Sample]:
+        suffix = "_total" if self.kind == "counter" else ""
+        values = self._read()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in values.items():
+            yield suffix, label_values, value
+
+
+class MetricsRegistry:
+    """Metrics by name. Registering a name again replaces its metric."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register[M: Metric](self, metric: M) -> M:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str) -> None:
+        self._metrics.pop(name, None)
+
+    def get(self, name: str) -> Metric | None:
+        return self._metrics.get(name)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registry of the application's metrics.
+registry = MetricsRegistry()
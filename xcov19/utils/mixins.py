@@ -21,6 +21,9 @@ def match_signature(
                             """
         )
 
+    # Equal annotations match, including unions which have no __name__.
+    if param_type == subcls_param_type:
+        return True
     if ClassNameAttrGetter(param_type) != ClassNameAttrGetter(subcls_param_type):
         if (
             isinstance(param_type, TypeVar)
@@ -0,0 +1,171 @@
+"""cProfile capture of individual requests, kept for the slowest ones.
+
+Profiles are written off the event loop, as pstats files to load with
+`python -m pstats` or snakeviz, or as collapsed stacks for flamegraph.pl and
+speedscope. cProfile records caller and callee pairs rather than whole stacks,
+so collapsed output holds two frame stacks weighted by the callee's own time.
+
+A profile covers everything the event loop runs while its request is being
+handled, including other requests' coroutines, and only one request is
+profiled at a time.
+"""
+
+import asyncio
+import cProfile
+import heapq
+import itertools
+import os
+import pstats
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Literal, Set, Tuple
+
+type ProfileFormat = Literal["pstats", "collapsed"]
+type FunctionKey = Tuple[str, int, str]
+
+
+@dataclass(frozen=True, slots=True)
+class ProfileRecord:
+    method: str
+    path: str
+    status: int
+    duration_ms: float
+    captured_at: float
+    file: str
+
+
+def frame_name(function: FunctionKey) -> str:
+    filename, line, name = function
+    if filename == "~":
+        # Built-in functions, name is like "<built-in method time.sleep>".
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(stats: pstats.Stats) -> List[str]:
+    """caller;callee lines weighted by microseconds spent in the callee."""
+    lines = []
+    for function, (_, _, own_time, _, callers) in stats.stats.items():  # type: ignore[attr-defined]
+        if not callers:
+            if (weight := int(own_time * 1e6)) > 0:
+                lines.append(f"{frame_name(function)} {weight}")
+            continue
+        for caller, (_, _, own_time, _) in callers.items():
+            if (weight := int(own_time * 1e6)) > 0:
+                lines.append(f"{frame_name(caller)};{frame_name(function)} {weight}")
+    return lines
+
+
+class RequestProfiler:
+    """Decides which requests to profile and keeps the slowest profiles.
+
+    Profiles beyond the `keep` slowest are deleted from output_dir.
+    """
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        output_format: ProfileFormat = "pstats",
+        sample_rate: float = 0.0,
+        keep: int = 50,
+    ) -> None:
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.output_format = output_format
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self._profiling = False
+        self._slowest: List[Tuple[float, int, ProfileRecord]] = []
+        # Files of the records in _slowest.
+        self._kept: Set[str] = set()
+        self._sequence = itertools.count()
+        self._writes: Set[asyncio.Task] = set()
+        self.captured = 0
+        self.skipped = 0
+
+    def sampled(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self) -> cProfile.Profile | None:
+        """Starts a profile, or returns None while another one runs."""
+        if self._profiling:
+            self.skipped += 1
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler, e.g. a debugger, holds the profiling hook.
+            self.skipped += 1
+            return None
+        self._profiling = True
+        return profile
+
+    def finish(
+        self,
+        profile: cProfile.Profile,
+        method: str,
+        path: str,
+        status: int,
+        duration_seconds: float,
+    ) -> ProfileRecord | None:
+        """Stops a profile and saves it in the background if among the slowest."""
+        profile.disable()
+        self._profiling = False
+        self.captured += 1
+        duration_ms = duration_seconds * 1000
+        if len(self._slowest) >= self.keep and duration_ms <= self._slowest[0][0]:
+            return None
+        sequence = next(self._sequence)
+        suffix = "prof" if self.output_format == "pstats" else "collapsed"
+        record = ProfileRecord(
+            method=method,
+            path=path,
+            status=status,
+            duration_ms=round(duration_ms, 3),
+            captured_at=time.time(),
+            file=f"{int(time.time())}-{sequence}-{duration_ms:.0f}ms.{suffix}",
+        )
+        evicted = None
+        if len(self._slowest) >= self.keep:
+            _, _, evicted = heapq.heappushpop(
+                self._slowest, (duration_ms, sequence, record)
+            )
+            self._kept.discard(evicted.file)
+        else:
+            heapq.heappush(self._slowest, (duration_ms, sequence, record))
+        self._kept.add(record.file)
+        task = asyncio.get_running_loop().create_task(
+            asyncio.to_thread(self._save, profile, record, evicted)
+        )
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+        return record
+
+    def _save(
+        self,
+        profile: cProfile.Profile,
+        record: ProfileRecord,
+        evicted: ProfileRecord | None,
+    ) -> None:
+        path = self.output_dir / record.file
+        if self.output_format == "pstats":
+            profile.dump_stats(path)
+        else:
+            lines = collapsed_stacks(pstats.Stats(profile))
+            path.write_text("\n".join(lines) + "\n")
+        if evicted is not None:
+            (self.output_dir / evicted.file).unlink(missing_ok=True)
+        # Evicted by a slower request while being written.
+        if record.file not in self._kept:
+            path.unlink(missing_ok=True)
+
+    def slowest(self, limit: int | None = None) -> List[ProfileRecord]:
+        records = [record for _, _, record in sorted(self._slowest, reverse=True)]
+        return records[:limit]
+
+    async def drain(self) -> None:
+        """Waits for profiles still being written."""
+        await asyncio.gather(*self._writes, return_exceptions=True)
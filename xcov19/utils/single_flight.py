@@ -0,0 +1,53 @@
+"""Shares one in-flight call among concurrent callers asking for the same key."""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight[K: Hashable, V]:
+    """Coalesces concurrent calls with equal keys into one execution.
+
+    The first caller of a key starts the call as a task; callers arriving
+    while it runs await the same task and get the same result or exception.
+    Nothing is kept once the call completes, so a later caller starts afresh.
+    A cancelled caller does not cancel the shared call for the others.
+
+    Keeps call and execution counters for instrumentation. Not thread safe,
+    meant to be used from the event loop.
+    """
+
+    __slots__ = ("_in_flight", "calls", "executions")
+
+    def __init__(self) -> None:
+        self._in_flight: Dict[K, asyncio.Future[V]] = {}
+        self.calls = 0
+        self.executions = 0
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    @property
+    def deduplicated(self) -> int:
+        """Calls answered by another caller's execution."""
+        return self.calls - self.executions
+
+    @property
+    def dedup_ratio(self) -> float:
+        return self.deduplicated / self.calls if self.calls else 0.0
+
+    def _done(self, key: K, task: asyncio.Future[V]) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Retrieve the outcome in case every caller was cancelled meanwhile.
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key: K, fn: Callable[[], Awaitable[V]]) -> V:
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task)
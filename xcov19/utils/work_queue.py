@@ -0,0 +1,243 @@
+"""In-process asyncio work queue with priority lanes and batching workers.
+
+Jobs are routed by `kind` to a handler receiving a batch of jobs of that kind.
+A handler returns the jobs it could not process yet, which are retried with a
+delay until `max_attempts`. The queue is bounded: submitting to a full queue
+raises QueueFullError so callers can shed load (HTTP 429) instead of piling up
+work in memory. Retries are always requeued, as their jobs were accepted.
+With a journal, jobs are persisted before being acknowledged and replayed on
+start, so accepted work survives a restart. Attempts are journaled along with
+each retry, so replayed jobs keep counting towards `max_attempts`. Journal
+errors are logged without stopping the workers; a job whose completion was
+not journaled is replayed after a restart.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import enum
+import itertools
+import logging
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Protocol
+
+queue_logger = logging.getLogger(__name__)
+
+
+class Priority(enum.IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+@dataclass(slots=True)
+class Job:
+    kind: str
+    payload: dict
+    priority: Priority = Priority.NORMAL
+    attempts: int = 0
+    job_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+
+
+type JobHandler = Callable[[List[Job]], Awaitable[Iterable[Job] | None]]
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted to a queue at capacity."""
+
+    pass
+
+
+class JobJournal(Protocol):
+    async def open(self) -> List[Job]:
+        """Opens the journal and returns jobs still pending from a prior run."""
+        ...
+
+    async def append(self, job: Job) -> None: ...
+
+    async def complete(self, jobs: List[Job]) -> None: ...
+
+    async def retry(self, jobs: List[Job]) -> None:
+        """Records the attempts of jobs put back for another try."""
+        ...
+
+    async def fail(self, jobs: List[Job]) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class WorkQueue:
+    def __init__(
+        self,
+        handlers: Dict[str, JobHandler],
+        workers: int = 4,
+        capacity: int = 10_000,
+        batch_size: int = 64,
+        batch_wait_ms: float = 5.0,
+        max_attempts: int = 5,
+        retry_delay_seconds: float = 1.0,
+        journal: JobJournal | None = None,
+    ) -> None:
+        self._handlers = dict(handlers)
+        self._workers = workers
+        self._capacity = capacity
+        self._batch_size = batch_size
+        self._batch_wait = batch_wait_ms / 1000
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay_seconds
+        self._journal = journal
+        # Unbounded, capacity is enforced on submit so retries never wait.
+        self._queue: asyncio.PriorityQueue[tuple[int, int, Job]] = (
+            asyncio.PriorityQueue()
+        )
+        # Slots of submitted jobs still being journaled.
+        self._reserved = 0
+        self._sequence = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+        self._retries: set[asyncio.Task] = set()
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def add_handler(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    def _put(self, job: Job) -> None:
+        self._queue.put_nowait((job.priority, next(self._sequence), job))
+
+    async def submit(
+        self, kind: str, payload: dict, priority: Priority = Priority.NORMAL
+    ) -> Job:
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind {kind}.")
+        if self.depth + self._reserved >= self._capacity:
+            raise QueueFullError(f"Work queue is full with {self.depth} jobs.")
+        job = Job(kind=kind, payload=payload, priority=priority)
+        # Holds the job's slot while it is journaled, so concurrent submits
+        # cannot fill the queue in the meantime.
+        self._reserved += 1
+        try:
+            if self._journal is not None:
+                await self._journal.append(job)
+        finally:
+            self._reserved -= 1
+        self._put(job)
+        return job
+
+    async def start(self) -> None:
+        if self._journal is not None:
+            for job in await self._journal.open():
+                self._put(job)
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"work-queue-{n}")
+            for n in range(self._workers)
+        ]
+
+    async def stop(self, drain: bool = True) -> None:
+        """Stops workers, once the queue is empty when drain is set.
+
+        Draining also waits out pending retries, as they put their jobs back
+        on the queue.
+        """
+        if drain and self._tasks:
+            await self._queue.join()
+            while self._retries:
+                await asyncio.gather(*self._retries, return_exceptions=True)
+                await self._queue.join()
+        for task in (*self._tasks, *self._retries):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retries, return_exceptions=True)
+        self._tasks = []
+        if self._journal is not None:
+            await self._journal.close()
+
+    async def _next_batch(self) -> List[Job]:
+        """Waits for one job then collects more for up to batch_wait."""
+        _, _, job = await self._queue.get()
+        batch = [job]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._batch_wait
+        while len(batch) < self._batch_size:
+            if self._queue.empty():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    _, _, job = await asyncio.wait_for(self._queue.get(), remaining)
+                except TimeoutError:
+                    break
+            else:
+                _, _, job = self._queue.get_nowait()
+            batch.append(job)
+        return batch
+
+    async def _work(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                by_kind: Dict[str, List[Job]] = {}
+                for job in batch:
+                    by_kind.setdefault(job.kind, []).append(job)
+                for kind, jobs in by_kind.items():
+                    await self._run(kind, jobs)
+            except Exception:
+                # Keeps the worker alive for the next batches.
+                queue_logger.exception("Work queue batch failed.")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _run(self, kind: str, jobs: List[Job]) -> None:
+        try:
+            retry = list(await self._handlers[kind](jobs) or ())
+        except Exception:
+            queue_logger.exception(f"Handler for {kind} jobs failed.")
+            retry = jobs
+        retry_ids = {job.job_id for job in retry}
+        done = [job for job in jobs if job.job_id not in retry_ids]
+        for job in retry:
+            job.attempts += 1
+        exhausted = [job for job in retry if job.attempts >= self._max_attempts]
+        retry = [job for job in retry if job.attempts < self._max_attempts]
+        self.processed += len(done)
+        self.failed += len(exhausted)
+        if self._journal is not None:
+            await self._journal_outcomes(self._journal, done, exhausted, retry)
+        if retry:
+            task = asyncio.create_task(self._requeue(retry))
+            self._retries.add(task)
+            task.add_done_callback(self._retries.discard)
+
+    async def _journal_outcomes(
+        self,
+        journal: JobJournal,
+        done: List[Job],
+        exhausted: List[Job],
+        retry: List[Job],
+    ) -> None:
+        for record, jobs in (
+            (journal.complete, done),
+            (journal.fail, exhausted),
+            (journal.retry, retry),
+        ):
+            if not jobs:
+                continue
+            try:
+                await record(jobs)
+            except Exception:
+                queue_logger.exception(
+                    f"Journaling {len(jobs)} {record.__name__} jobs failed."
+                )
+
+    async def _requeue(self, jobs: List[Job]) -> None:
+        await asyncio.sleep(self._retry_delay * jobs[0].attempts)
+        for job in jobs:
+            self._put(job)